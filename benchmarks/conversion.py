@@ -0,0 +1,189 @@
+"""
+离线端到端转换基准：启动本地模拟服务 (benchmarks/mock_server.py)，用真实的
+NeteaseMusic / AppleMusic / Converter 转换 100、1k、10k 首歌的合成歌单。
+
+用法 (在仓库根目录):
+    python benchmarks/conversion.py [--sizes 100,1000,10000] [--concurrency 8]
+                                    [--latency-ms 50] [--jitter-ms 20] [--error-rate 0]
+                                    [--throttle-rate 0] [--retry-after 1] [--miss-rate 0.02] [--json]
+
+每个歌单在独立的子进程中、使用全新的数据目录 (没有搜索缓存和匹配记录) 转换，报告:
+    songs/s        歌单歌曲数 / 转换总耗时 (包含获取网易云歌曲、创建播放列表、写入和验证)
+    p50 / p99      单首歌曲的处理耗时 (搜索或专辑匹配，不含排队等待并发名额的时间)
+    peak RSS       子进程的峰值内存
+    429 / 5xx      模拟服务返回的限流和错误次数
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_server import MockUpstream, add_arguments, upstream_from_args  # noqa: E402
+
+RESULT_PREFIX = "RESULT "
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def peak_rss_bytes() -> int:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def song_latencies(trace: dict) -> list:
+    """每个搜索任务中 search 和 album_match span 的总耗时 (秒)"""
+    names = {e["tid"]: e["args"]["name"] for e in trace["traceEvents"] if e["name"] == "thread_name"}
+    totals = {}
+    for event in trace["traceEvents"]:
+        if event["ph"] == "X" and event["name"] in ("search", "album_match") \
+                and names.get(event["tid"], "").startswith("search-"):
+            totals[event["tid"]] = totals.get(event["tid"], 0.0) + event["dur"] / 1e6
+    return list(totals.values())
+
+
+async def run_one(base_url: str, size: int, concurrency: int) -> dict:
+    """在当前进程中转换一个歌单 (由子进程调用)"""
+    from mock_netease import MockNeteaseMusic
+    from Apple import apm
+    from Apple.http_pool import close_default_http_pool
+    from converter import Converter
+    import tracing
+
+    apm.LIBRARY_API_BASE = apm.CATALOG_API_BASE = base_url
+    netease_music = MockNeteaseMusic(base_url)
+    apple_music = apm.AppleMusic("user_token", "dev_token")
+    try:
+        await netease_music.login("benchmark")
+        await apple_music.login()
+        playlist = next(p for p in netease_music.created_playlists if p.track_count == size)
+        converter = Converter(netease_music, apple_music, search_concurrency=concurrency)
+
+        async def completed(success_songs, skipped_songs, failed_songs):
+            counts.update(success=len(success_songs), skipped=len(skipped_songs), failed=len(failed_songs))
+
+        counts = {"success": 0, "skipped": 0, "failed": 0}
+        tracer = tracing.Tracer(f"benchmark {size}")
+        started = time.perf_counter()
+        with tracing.activate(tracer):
+            result = await converter.convert_play_list_web(playlist, completed_callback=completed,
+                                                           target_playlist_name=f"benchmark {size}")
+        elapsed = time.perf_counter() - started
+    finally:
+        await netease_music.close()
+        await apple_music.close()
+        await close_default_http_pool()
+
+    latencies = song_latencies(tracer.to_chrome_trace())
+    return {
+        "size": size,
+        "elapsed": elapsed,
+        "songs_per_sec": size / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_bytes() / 1024 / 1024,
+        "result": result.get("status") or result.get("error"),
+        **counts,
+        "rate_limiter": apple_music.rate_limiter.stats(),
+        "http_pool": apple_music.http_pool.stats(),
+    }
+
+
+def run_child(base_url: str, size: int, concurrency: int, verbose: bool) -> dict:
+    """在新的子进程和空数据目录中转换一个歌单"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, PLAYLIST_CONVERTER_DATA_DIR=data_dir)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", base_url, "--size", str(size),
+             "--concurrency", str(concurrency)],
+            cwd=data_dir, env=env, stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL,
+            text=True, check=True)
+    line = next(line for line in reversed(proc.stdout.splitlines()) if line.startswith(RESULT_PREFIX))
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+async def fetch_stats(base_url: str) -> list:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/stats") as r:
+            return await r.json()
+
+
+def run_benchmark(args) -> list:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    upstream: MockUpstream = upstream_from_args(args, sizes)
+    results = []
+
+    async def main():
+        runner = await upstream.start()
+        try:
+            loop = asyncio.get_running_loop()
+            for size in sizes:
+                before = sum(upstream.requests.values())
+                throttled_before = sum(c for (_, _, status), c in upstream.requests.items() if status == 429)
+                errors_before = sum(c for (_, _, status), c in upstream.requests.items() if status >= 500)
+                # 子进程阻塞等待，模拟服务仍在本进程的事件循环中响应
+                result = await loop.run_in_executor(
+                    None, run_child, upstream.base_url, size, args.concurrency, args.verbose)
+                result["requests"] = sum(upstream.requests.values()) - before
+                result["throttled"] = sum(c for (_, _, s), c in upstream.requests.items() if s == 429) - throttled_before
+                result["errors"] = sum(c for (_, _, s), c in upstream.requests.items() if s >= 500) - errors_before
+                results.append(result)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+    return results
+
+
+def print_results(results: list):
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["songs", "time (s)", "songs/s", "p50 (ms)", "p99 (ms)", "peak RSS (MB)",
+                         "matched", "skipped", "failed", "requests", "429", "5xx"]
+    for r in results:
+        table.add_row([r["size"], f"{r['elapsed']:.1f}", f"{r['songs_per_sec']:.1f}", f"{r['p50_ms']:.0f}",
+                       f"{r['p99_ms']:.0f}", f"{r['peak_rss_mb']:.0f}", r["success"], r["skipped"], r["failed"],
+                       r["requests"], r["throttled"], r["errors"]])
+    print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="要转换的歌单大小，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=8, help="Converter 的 search_concurrency")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--verbose", action="store_true", help="显示转换过程的日志")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+        result = asyncio.run(run_one(args.child, args.size, args.concurrency))
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    results = run_benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+比较歌曲模型旧布局 (普通 dataclass) 和新布局 (slots + 驻留字符串) 的内存占用。
+
+用法 (在仓库根目录):
+    python benchmarks/memory_models.py [--tracks 50000] [--albums 2000]
+
+合成音乐库从 JSON 解析得到，与真实接口一样，每首歌的艺术家和专辑名都是独立的字符串对象。
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from Netease.netease_utils import NeteaseSong, NeteasePlaylist  # noqa: E402
+from Apple.apm_utils import AppleSong, ApplePlaylist  # noqa: E402
+
+
+# 旧布局：与改动前的模型相同
+@dataclass
+class LegacyNeteaseSong:
+    id: int
+    name: str
+    artists: list
+    album: str
+    duration: int = 0
+
+@dataclass
+class LegacyNeteasePlaylist:
+    name: str
+    id: int
+    creator_id: int
+    create_time: int
+    track_count: int = 0
+    update_time: int = 0
+    songs: List[LegacyNeteaseSong] = field(default_factory=list)
+    songs_loaded: bool = False
+
+@dataclass
+class LegacyAppleSong:
+    id: str
+    name: str
+    artist: str
+    album: str
+    duration: int = 0
+    album_id: str = ""
+
+@dataclass
+class LegacyApplePlaylist:
+    id: str
+    name: str
+    create_time: str
+    songs: List[LegacyAppleSong] = field(default_factory=list)
+
+
+def make_payload(tracks: int, albums: int, playlist_size: int = 500, seed: int = 0) -> str:
+    """生成一个网易云和 Apple Music 歌曲数量相同的合成音乐库 JSON"""
+    rng = random.Random(seed)
+    album_infos = [(f"Album {i} (Deluxe Edition)", f"Artist {i % (albums // 4 + 1)}", str(1000000 + i))
+                   for i in range(albums)]
+    songs = []
+    for i in range(tracks):
+        album, artist, album_id = album_infos[rng.randrange(albums)]
+        songs.append({"id": i, "name": f"Song Title {i}", "artist": artist, "album": album,
+                      "album_id": album_id, "duration": rng.randrange(120000, 360000)})
+    playlists = [songs[i:i + playlist_size] for i in range(0, tracks, playlist_size)]
+    return json.dumps(playlists)
+
+
+def build(payload: str, netease_song, netease_playlist, apple_song, apple_playlist) -> list:
+    library = []
+    for index, tracks in enumerate(json.loads(payload)):
+        ncm = netease_playlist(name=f"Playlist {index}", id=index, creator_id=1, create_time=0)
+        apm = apple_playlist(id=f"p.{index}", name=f"Playlist {index}", create_time="")
+        ncm.songs = [netease_song(id=t["id"], name=t["name"], artists=[t["artist"]], album=t["album"],
+                                  duration=t["duration"]) for t in tracks]
+        apm.songs = [apple_song(id=str(t["id"]), name=t["name"], artist=t["artist"], album=t["album"],
+                                duration=t["duration"], album_id=t["album_id"]) for t in tracks]
+        library.append((ncm, apm))
+    return library
+
+
+def measure(payload: str, *models) -> int:
+    tracemalloc.start()
+    library = build(payload, *models)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del library
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=50000)
+    parser.add_argument("--albums", type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = make_payload(args.tracks, args.albums)
+    legacy = measure(payload, LegacyNeteaseSong, LegacyNeteasePlaylist, LegacyAppleSong, LegacyApplePlaylist)
+    compact = measure(payload, NeteaseSong, NeteasePlaylist, AppleSong, ApplePlaylist)
+
+    print(f"{args.tracks} 首歌曲 (网易云 + Apple Music 各一份), {args.albums} 张专辑")
+    print(f"旧布局: {legacy / 1024 / 1024:8.2f} MiB  ({legacy / args.tracks:.0f} B/首)")
+    print(f"新布局: {compact / 1024 / 1024:8.2f} MiB  ({compact / args.tracks:.0f} B/首)")
+    print(f"节省:   {(1 - compact / legacy) * 100:8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
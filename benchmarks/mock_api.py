@@ -0,0 +1,120 @@
+"""
+启动连接模拟上游 (benchmarks/mock_server.py) 的网页服务，供 benchmarks/run_load.py 使用。
+
+用法:
+    python benchmarks/mock_api.py --upstream http://127.0.0.1:9000 [--port 0]
+
+与正式服务的区别:
+    - Apple Music 接口指向模拟上游，开发者令牌为固定值
+    - 网易云客户端替换为 MockNeteaseMusic
+    - WebSocket 消息附带发送时间 sent_at，用于计算消息延迟
+    - 增加 GET /bench/stats：事件循环延迟、当前 RSS 和会话数 (?reset=1 清空延迟样本)
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 事件循环延迟的采样间隔 (秒)
+LOOP_PROBE_INTERVAL = 0.05
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def create_app(upstream: str):
+    os.environ["APPLE_MUSIC_API_BASE"] = upstream
+    os.environ["APPLE_MUSIC_CATALOG_API_BASE"] = upstream
+
+    # 只在启动服务时修改导入路径，被 run_load.py 导入 (只用到 percentile) 时不影响调用者
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+    from starlette.websockets import WebSocket
+    from Netease import netease
+    from webpage.backend import api
+    from mock_netease import MockNeteaseMusic
+
+    netease.NeteaseMusic = lambda: MockNeteaseMusic(upstream)
+    api.get_dev_token = lambda: "dev_token"
+
+    send_json = WebSocket.send_json
+
+    async def send_json_with_time(self, data, mode="text"):
+        if isinstance(data, dict):
+            data = dict(data, sent_at=time.time())
+        await send_json(self, data, mode)
+
+    WebSocket.send_json = send_json_with_time
+
+    loop_lags = deque(maxlen=100000)
+
+    async def probe_loop():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            loop_lags.append(time.perf_counter() - started - LOOP_PROBE_INTERVAL)
+
+    @api.app.on_event("startup")
+    async def start_probe():
+        api.app.state.loop_probe = asyncio.create_task(probe_loop())
+
+    @api.app.get("/bench/stats")
+    async def bench_stats(reset: bool = False):
+        lags = list(loop_lags)
+        if reset:
+            loop_lags.clear()
+        return {
+            "sessions": len(api.sessions),
+            "rss_bytes": current_rss_bytes(),
+            "loop_lag_ms": {
+                "p50": percentile(lags, 0.5) * 1000,
+                "p99": percentile(lags, 0.99) * 1000,
+                "max": max(lags, default=0.0) * 1000,
+            },
+        }
+
+    return api.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upstream", required=True, help="模拟上游的地址")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    import socket
+    import uvicorn
+
+    app = create_app(args.upstream)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    # 先开始监听，服务启动前到达的连接在 backlog 中排队
+    sock.listen(2048)
+    print(f"listening on http://{args.host}:{sock.getsockname()[1]}", flush=True)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    server.run(sockets=[sock])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+连接 benchmarks/mock_server.py 的网易云客户端。
+
+pyncm 的请求是加密的，无法直接指向本地服务，所以这里替换 NeteaseMusic._call_api：
+同名接口改为向模拟服务发送明文请求，其余逻辑 (分批获取歌曲详情、快照、指标和追踪) 与真实客户端相同。
+"""
+import os
+import sys
+from typing import Optional
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from Netease.netease import NeteaseMusic  # noqa: E402
+from Netease.library_store import LibraryStore  # noqa: E402
+
+
+class MockNeteaseMusic(NeteaseMusic):
+    def __init__(self, base_url: str, library_store: Optional[LibraryStore] = None):
+        super().__init__(library_store=library_store)
+        self.base_url = base_url
+        self._http = aiohttp.ClientSession()
+
+    async def _call_api(self, endpoint: str, func, *args, **kwargs):
+        routes = {
+            "login": self._login,
+            "user_playlists": self._user_playlists,
+            "playlist_info": self._playlist_info,
+            "track_detail": self._track_detail,
+        }
+        return await super()._call_api(endpoint, routes[endpoint], *args, **kwargs)
+
+    async def _json(self, method: str, path: str, **kwargs) -> dict:
+        async with self._http.request(method, f"{self.base_url}{path}", **kwargs) as r:
+            if r.status != 200:
+                raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+            return await r.json()
+
+    # 真实接口收到的 session 参数 (本用户的 pyncm 会话) 在这里不需要
+
+    async def _login(self, MUSIC_U: str, session=None):
+        return await self._json("POST", "/netease/login", json={"MUSIC_U": MUSIC_U})
+
+    async def _user_playlists(self, uid: int, limit: int = 1000, session=None):
+        return await self._json("GET", f"/netease/user/{uid}/playlists")
+
+    async def _playlist_info(self, playlist_id: int, session=None):
+        return await self._json("GET", f"/netease/playlist/{playlist_id}")
+
+    async def _track_detail(self, ids, session=None):
+        return await self._json("POST", "/netease/song/detail", json={"ids": list(ids)})
+
+    async def login(self, music_id_or_path: str, prefetch: bool = False):
+        # 真实的 login 会把 music_id 写入当前目录，模拟客户端直接登录
+        res = await self._call_api("login", None, MUSIC_U=music_id_or_path)
+        self.uid = res['result']['content']['profile']['userId']
+        self.nickname = res['result']['content']['profile']['nickname']
+        await self.retrive_playlists()
+        if prefetch:
+            self.start_prefetch()
+
+    async def close(self):
+        await super().close()
+        await self._http.close()
@@ -0,0 +1,332 @@
+"""
+本地模拟的 Apple Music / 网易云接口，用于离线基准测试和压力测试。
+
+用法:
+    python benchmarks/mock_server.py [--port 0] [--latency-ms 50] [--jitter-ms 20]
+                                     [--error-rate 0] [--throttle-rate 0] [--retry-after 1]
+                                     [--miss-rate 0.02] [--ambiguous-rate 0] [--playlist-sizes 100,1000,10000]
+
+启动后在标准输出打印一行 "listening on http://127.0.0.1:<port>"。
+
+合成音乐库完全由歌曲的全局ID推导，不需要在服务端保存：
+    - 歌单 p (从 1 开始) 的第 i 首歌的全局ID为 p * 1000000 + i，歌名为 "Song <全局ID>"
+    - 每 ALBUM_SIZE 首连续歌曲属于同一张专辑，同一专辑的艺术家相同
+    - 按歌名搜索时返回正确的歌曲和两个干扰项；约 miss-rate 比例的歌曲搜不到，约 ambiguous-rate
+      比例的歌曲只返回专辑和时长都不同的同名歌曲 (分数不够自动匹配，需要手动选择)
+
+Apple Music 接口 (与 apm.py 使用的路径一致，LIBRARY 和 CATALOG 都指向本服务):
+    GET  /v1/me/storefront
+    GET  /v1/catalog/{storefront}/search?term=...
+    GET  /v1/catalog/{storefront}/albums/{id}
+    GET  /v1/me/library/playlists                   POST 创建
+    GET  /v1/me/library/playlists/{id}/tracks       POST 追加 / PUT 替换
+
+网易云接口 (明文 JSON，返回结构与 pyncm 相同，由 benchmarks/mock_netease.py 调用):
+    POST /netease/login                  {"MUSIC_U": ...}
+    GET  /netease/user/{uid}/playlists
+    GET  /netease/playlist/{id}
+    POST /netease/song/detail            {"ids": [...]}
+
+GET /stats 返回各接口的请求数和状态码统计，GET /health 不受延迟和错误注入影响。
+"""
+import re
+import zlib
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, List
+
+from aiohttp import web
+
+ALBUM_SIZE = 10
+SONG_ID_BASE = 1000000
+# 网易云歌单详情中直接带上的完整歌曲数量，其余只有 trackIds
+PLAYLIST_INFO_TRACKS = 20
+DEFAULT_PLAYLIST_SIZES = (100, 1000, 10000)
+
+_SONG_NAME = re.compile(r"^Song (\d+)")
+
+
+def song_of(gid: int) -> dict:
+    """由全局ID推导出一首合成歌曲"""
+    album_index = gid // ALBUM_SIZE
+    return {
+        "id": gid,
+        "name": f"Song {gid}",
+        "artist": f"Artist {album_index % 997}",
+        "album": f"Album {album_index}",
+        "album_id": str(SONG_ID_BASE + album_index),
+        "duration": 120000 + (gid * 7919) % 240000,
+    }
+
+
+def playlist_song_ids(playlist_id: int, size: int) -> List[int]:
+    return [playlist_id * SONG_ID_BASE + i for i in range(size)]
+
+
+class MockUpstream:
+    """
+    模拟服务及其状态 (用户创建的 Apple Music 播放列表保存在内存中)。
+
+    参数:
+        latency_ms / jitter_ms: 每个请求的平均延迟和均匀抖动 (毫秒)
+        error_rate: 返回 500 的比例
+        throttle_rate: 返回 429 (带 Retry-After) 的比例
+        retry_after: 429 响应的 Retry-After (秒)
+        miss_rate: 搜索不到的歌曲比例
+        ambiguous_rate: 需要手动选择的歌曲比例
+        playlist_sizes: 每个网易云用户拥有的歌单大小
+    """
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 20, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, miss_rate: float = 0.02,
+                 ambiguous_rate: float = 0.0, playlist_sizes=DEFAULT_PLAYLIST_SIZES, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.miss_rate = miss_rate
+        self.ambiguous_rate = ambiguous_rate
+        self.playlist_sizes = list(playlist_sizes)
+        self.random = random.Random(seed)
+
+        self.library: Dict[str, dict] = {}
+        self.requests: Counter = Counter()
+
+    # ---- 辅助方法 ----
+
+    @staticmethod
+    def _bucket(gid: int) -> float:
+        """把歌曲稳定地映射到 [0, 1)，同一首歌每次请求的表现相同"""
+        return zlib.crc32(str(gid).encode()) % 10000 / 10000
+
+    def _is_miss(self, gid: int) -> bool:
+        return self._bucket(gid) < self.miss_rate
+
+    def _is_ambiguous(self, gid: int) -> bool:
+        return self.miss_rate <= self._bucket(gid) < self.miss_rate + self.ambiguous_rate
+
+    @staticmethod
+    def _catalog_song(song: dict) -> dict:
+        return {
+            "id": str(song["id"]),
+            "type": "songs",
+            "attributes": {
+                "name": song["name"],
+                "artistName": song["artist"],
+                "albumName": song["album"],
+                "durationInMillis": song["duration"],
+                "url": f"https://music.apple.com/cn/album/mock/{song['album_id']}?i={song['id']}",
+            },
+        }
+
+    @staticmethod
+    def _netease_track(song: dict) -> dict:
+        return {"id": song["id"], "name": song["name"], "ar": [{"name": song["artist"]}],
+                "al": {"name": song["album"]}, "dt": song["duration"]}
+
+    def _user_playlists(self, uid: int) -> List[dict]:
+        # 每个用户的歌单ID不同，避免多个用户共用本地快照
+        return [{"name": f"Playlist {size}", "id": uid * 100 + index + 1, "userId": uid,
+                 "createTime": 1609459200000, "updateTime": 1609459200000, "trackCount": size}
+                for index, size in enumerate(self.playlist_sizes)]
+
+    def _playlist_size(self, playlist_id: int) -> int:
+        index = playlist_id % 100 - 1
+        return self.playlist_sizes[index] if 0 <= index < len(self.playlist_sizes) else 0
+
+    # ---- 中间件：延迟、错误和限流注入 ----
+
+    @web.middleware
+    async def inject_faults(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        if request.path in ("/health", "/stats"):
+            return await handler(request)
+        delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            response = web.json_response({"errors": [{"status": "429"}]}, status=429,
+                                         headers={"Retry-After": str(self.retry_after)})
+        elif roll < self.throttle_rate + self.error_rate:
+            response = web.json_response({"errors": [{"status": "500"}]}, status=500)
+        else:
+            response = await handler(request)
+        self.requests[(request.method, route, response.status)] += 1
+        return response
+
+    # ---- Apple Music ----
+
+    async def storefront(self, request):
+        return web.json_response({"data": [{"id": "cn", "type": "storefronts"}]})
+
+    async def search(self, request):
+        match = _SONG_NAME.match(request.query.get("term", ""))
+        if not match or self._is_miss(int(match.group(1))):
+            return web.json_response({"results": {}})
+        gid = int(match.group(1))
+        song = song_of(gid)
+        if self._is_ambiguous(gid):
+            versions = [dict(song, id=gid + SONG_ID_BASE * (3000 + i), album=f"Greatest Hits {i}",
+                             album_id=str(SONG_ID_BASE * 10 + i), duration=song["duration"] + 60000 * (i + 1))
+                        for i in range(3)]
+            return web.json_response({"results": {"songs": {"data": [self._catalog_song(s) for s in versions]}}})
+        decoys = [dict(song, id=gid + SONG_ID_BASE * 1000, name=f"{song['name']} (Live)"),
+                  dict(song_of(gid + 1), id=gid + 1 + SONG_ID_BASE * 2000)]
+        data = [self._catalog_song(s) for s in decoys[:1] + [song] + decoys[1:]]
+        return web.json_response({"results": {"songs": {"data": data}}})
+
+    async def album(self, request):
+        album_index = int(request.match_info["id"]) - SONG_ID_BASE
+        tracks = [self._catalog_song(song_of(album_index * ALBUM_SIZE + i)) for i in range(ALBUM_SIZE)]
+        return web.json_response({"data": [{"id": request.match_info["id"], "type": "albums",
+                                             "relationships": {"tracks": {"data": tracks}}}]})
+
+    async def list_playlists(self, request):
+        data = [{"id": pid, "type": "library-playlists", "attributes": {"name": p["name"], "dateAdded": ""}}
+                for pid, p in self.library.items()]
+        return web.json_response({"data": data})
+
+    async def create_playlist(self, request):
+        body = await request.json()
+        pid = f"p.mock{len(self.library) + 1}"
+        name = body.get("attributes", {}).get("name", "")
+        self.library[pid] = {"name": name, "tracks": []}
+        return web.json_response({"data": [{"id": pid, "type": "library-playlists",
+                                            "attributes": {"name": name}}]}, status=201)
+
+    async def get_tracks(self, request):
+        playlist = self.library.get(request.match_info["id"])
+        if playlist is None or not playlist["tracks"]:
+            return web.json_response({"errors": [{"status": "404"}]}, status=404)
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 100))
+        data = []
+        for cid in playlist["tracks"][offset:offset + limit]:
+            data.append({"id": f"i.{cid}", "type": "library-songs",
+                         "attributes": {"name": f"Track {cid}", "artistName": "", "albumName": "",
+                                        "playParams": {"catalogId": cid}}})
+        page = {"data": data}
+        if offset + limit < len(playlist["tracks"]):
+            page["next"] = f"/v1/me/library/playlists/{request.match_info['id']}/tracks?offset={offset + limit}"
+        return web.json_response(page)
+
+    async def add_tracks(self, request):
+        playlist = self.library.get(request.match_info["id"])
+        if playlist is None:
+            return web.json_response({"errors": [{"status": "404"}]}, status=404)
+        body = await request.json()
+        ids = [item["id"] for item in body.get("data", [])]
+        if request.method == "PUT":
+            playlist["tracks"] = ids
+        else:
+            playlist["tracks"].extend(ids)
+        return web.Response(status=204)
+
+    # ---- 网易云 ----
+
+    async def netease_login(self, request):
+        body = await request.json()
+        uid = zlib.crc32(str(body.get("MUSIC_U", "")).encode()) % 1000000 + 1
+        return web.json_response({"code": 200, "result": {"content": {"profile": {
+            "userId": uid, "nickname": f"user{uid}"}}}})
+
+    async def netease_user_playlists(self, request):
+        return web.json_response({"code": 200, "playlist": self._user_playlists(int(request.match_info["uid"]))})
+
+    async def netease_playlist(self, request):
+        playlist_id = int(request.match_info["id"])
+        ids = playlist_song_ids(playlist_id, self._playlist_size(playlist_id))
+        return web.json_response({"code": 200, "playlist": {
+            "id": playlist_id,
+            "trackIds": [{"id": gid} for gid in ids],
+            "tracks": [self._netease_track(song_of(gid)) for gid in ids[:PLAYLIST_INFO_TRACKS]],
+        }})
+
+    async def netease_song_detail(self, request):
+        body = await request.json()
+        return web.json_response({"code": 200, "songs": [self._netease_track(song_of(int(gid))) for gid in body["ids"]]})
+
+    # ---- 服务 ----
+
+    async def health(self, request):
+        return web.json_response({"status": "ok"})
+
+    async def stats(self, request):
+        return web.json_response([{"method": method, "route": route, "status": status, "count": count}
+                                  for (method, route, status), count in sorted(self.requests.items())])
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.inject_faults], client_max_size=16 * 1024 * 1024)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_get("/v1/me/storefront", self.storefront)
+        app.router.add_get("/v1/catalog/{storefront}/search", self.search)
+        app.router.add_get("/v1/catalog/{storefront}/albums/{id}", self.album)
+        app.router.add_get("/v1/me/library/playlists", self.list_playlists)
+        app.router.add_post("/v1/me/library/playlists", self.create_playlist)
+        app.router.add_get("/v1/me/library/playlists/{id}/tracks", self.get_tracks)
+        app.router.add_post("/v1/me/library/playlists/{id}/tracks", self.add_tracks)
+        app.router.add_put("/v1/me/library/playlists/{id}/tracks", self.add_tracks)
+        app.router.add_post("/netease/login", self.netease_login)
+        app.router.add_get("/netease/user/{uid}/playlists", self.netease_user_playlists)
+        app.router.add_get("/netease/playlist/{id}", self.netease_playlist)
+        app.router.add_post("/netease/song/detail", self.netease_song_detail)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """在当前事件循环中启动，返回 runner (调用 runner.cleanup() 停止)；实际地址在 self.base_url"""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        self.base_url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        return runner
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """模拟服务的参数，基准测试和压力测试脚本共用"""
+    parser.add_argument("--latency-ms", type=float, default=50, help="每个请求的平均延迟 (毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="延迟的均匀抖动 (毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After (秒)")
+    parser.add_argument("--miss-rate", type=float, default=0.02, help="搜索不到的歌曲比例")
+    parser.add_argument("--ambiguous-rate", type=float, default=0.0, help="需要手动选择的歌曲比例")
+
+
+def upstream_from_args(args, playlist_sizes=DEFAULT_PLAYLIST_SIZES) -> MockUpstream:
+    return MockUpstream(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                        throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                        miss_rate=args.miss_rate, ambiguous_rate=args.ambiguous_rate,
+                        playlist_sizes=playlist_sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--playlist-sizes", default=",".join(map(str, DEFAULT_PLAYLIST_SIZES)))
+    add_arguments(parser)
+    args = parser.parse_args()
+    upstream = upstream_from_args(args, [int(size) for size in args.playlist_sizes.split(",")])
+
+    async def serve():
+        runner = await upstream.start(args.host, args.port)
+        print(f"listening on {upstream.base_url}", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
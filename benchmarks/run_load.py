@@ -0,0 +1,249 @@
+"""
+网页服务的多用户压力测试。
+
+启动模拟上游 (benchmarks/mock_server.py) 和连接它的网页服务 (benchmarks/mock_api.py)，
+然后按并发级别模拟 N 个用户同时完成:
+    /api/login -> /ws/{session_id} -> /api/convert_playlist (提交后台任务) -> 收到手动选择时 /api/select_song
+    或 /api/skip_song -> 收到 completed 消息
+
+用法 (在仓库根目录):
+    python benchmarks/run_load.py [--levels 1,5,10,25] [--playlist-size 200] [--ambiguous-rate 0.05]
+                                   [--think-time 0.2] [--latency-ms 50] [--throttle-rate 0] [--json]
+
+每个并发级别报告:
+    login / convert / select    各接口的请求耗时 p50 / p99 (convert 只包含提交任务)
+    job                         从提交任务到收到 completed 消息的时间 p50 / p99
+    ws lag                      WebSocket 消息从服务端发送到客户端收到的延迟
+    loop lag                    服务端事件循环延迟 (每 50ms 采样一次)
+    RSS / per session           服务端当前内存，以及本级别新增会话平均占用的内存
+会话在服务端不会释放，所以内存是逐级累积的。
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_server import add_arguments  # noqa: E402
+from mock_api import percentile  # noqa: E402
+
+# 等待转换任务完成的最长时间 (秒)
+JOB_TIMEOUT = 600.0
+
+
+@dataclass
+class LevelStats:
+    users: int
+    elapsed: float = 0.0
+    login: List[float] = field(default_factory=list)
+    convert: List[float] = field(default_factory=list)
+    select: List[float] = field(default_factory=list)
+    job: List[float] = field(default_factory=list)
+    ws_lag: List[float] = field(default_factory=list)
+    manual_selections: int = 0
+    errors: List[str] = field(default_factory=list)
+    server: dict = field(default_factory=dict)
+    rss_per_session: float = 0.0
+
+
+async def start_process(*args, cwd=None, env=None, verbose=False) -> Tuple[asyncio.subprocess.Process, str]:
+    """启动子进程并等待它打印 "listening on <url>"，返回进程和地址；之后的输出被丢弃"""
+    proc = await asyncio.create_subprocess_exec(sys.executable, *args, cwd=cwd, env=env,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=None if verbose else asyncio.subprocess.DEVNULL)
+    while True:
+        line = await proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"子进程启动失败: {' '.join(args)}")
+        line = line.decode().strip()
+        if line.startswith("listening on "):
+            # 继续读取并丢弃输出，避免管道写满后子进程阻塞
+            proc.drain_task = asyncio.create_task(proc.stdout.read())
+            return proc, line[len("listening on "):]
+
+
+async def simulate_user(http: aiohttp.ClientSession, base_url: str, name: str,
+                        think_time: float, skip_ratio: float, stats: LevelStats):
+    started = time.perf_counter()
+    async with http.post(f"{base_url}/api/login", json={"neteaseToken": name, "appleToken": "apple"}) as r:
+        login = await r.json()
+    stats.login.append(time.perf_counter() - started)
+    if r.status != 200:
+        stats.errors.append(f"login {r.status}")
+        return
+    session_id = login["session_id"]
+    playlist = login["playlists"][0]
+
+    ws = await http.ws_connect(f"{base_url.replace('http', 'ws', 1)}/ws/{session_id}")
+
+    async def read_messages():
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            data = json.loads(msg.data)
+            if "sent_at" in data:
+                stats.ws_lag.append(time.time() - data["sent_at"])
+            if data["type"] == "manual_selection":
+                stats.manual_selections += 1
+                await asyncio.sleep(think_time)
+                select_started = time.perf_counter()
+                if data["matches"] and random.random() >= skip_ratio:
+                    await http.post(f"{base_url}/api/select_song",
+                                    json={"song_id": data["matches"][0]["id"], "session_id": session_id})
+                else:
+                    await http.post(f"{base_url}/api/skip_song", json={"session_id": session_id})
+                stats.select.append(time.perf_counter() - select_started)
+            elif data["type"] == "completed":
+                return True
+            elif data["type"] == "job" and data["status"] != "succeeded":
+                stats.errors.append(f"job {data['status']}: {data['error']}"[:200])
+                return False
+
+    reader = asyncio.create_task(read_messages())
+    try:
+        started = time.perf_counter()
+        async with http.post(f"{base_url}/api/convert_playlist",
+                             json={"playlist_id": playlist["id"], "session_id": session_id,
+                                   "target_playlist_name": f"load {name}", "mode": "new"}) as r:
+            result = await r.json()
+        stats.convert.append(time.perf_counter() - started)
+        if r.status != 200 or "job_id" not in result:
+            stats.errors.append(f"convert {r.status}: {result.get('detail', '')}"[:200])
+            return
+        try:
+            if await asyncio.wait_for(asyncio.shield(reader), JOB_TIMEOUT):
+                stats.job.append(time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            stats.errors.append(f"job {result['job_id']} timed out")
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await ws.close()
+
+
+async def run_level(http: aiohttp.ClientSession, base_url: str, level: int, index: int, args) -> LevelStats:
+    stats = LevelStats(users=level)
+    async with http.get(f"{base_url}/bench/stats", params={"reset": "true"}) as r:
+        before = await r.json()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(simulate_user(http, base_url, f"load-{index}-{i}", args.think_time, args.skip_ratio, stats)
+          for i in range(level)),
+        return_exceptions=True)
+    stats.elapsed = time.perf_counter() - started
+    stats.errors.extend(f"{type(e).__name__}: {e}" for e in results if isinstance(e, BaseException))
+    async with http.get(f"{base_url}/bench/stats") as r:
+        stats.server = await r.json()
+    new_sessions = stats.server["sessions"] - before["sessions"]
+    if new_sessions > 0:
+        stats.rss_per_session = (stats.server["rss_bytes"] - before["rss_bytes"]) / new_sessions
+    return stats
+
+
+def summarize(stats: LevelStats, playlist_size: int) -> dict:
+    ms = lambda values, q: percentile(values, q) * 1000  # noqa: E731
+    return {
+        "users": stats.users,
+        "elapsed_s": stats.elapsed,
+        "songs_per_sec": stats.users * playlist_size / stats.elapsed if stats.elapsed else 0.0,
+        "login_ms": {"p50": ms(stats.login, 0.5), "p99": ms(stats.login, 0.99)},
+        "convert_ms": {"p50": ms(stats.convert, 0.5), "p99": ms(stats.convert, 0.99)},
+        "select_ms": {"p50": ms(stats.select, 0.5), "p99": ms(stats.select, 0.99)},
+        "job_ms": {"p50": ms(stats.job, 0.5), "p99": ms(stats.job, 0.99)},
+        "ws_lag_ms": {"p50": ms(stats.ws_lag, 0.5), "p99": ms(stats.ws_lag, 0.99),
+                      "max": max(stats.ws_lag, default=0.0) * 1000},
+        "ws_messages": len(stats.ws_lag),
+        "manual_selections": stats.manual_selections,
+        "loop_lag_ms": stats.server.get("loop_lag_ms", {}),
+        "sessions": stats.server.get("sessions", 0),
+        "rss_mb": stats.server.get("rss_bytes", 0) / 1024 / 1024,
+        "rss_per_session_kb": stats.rss_per_session / 1024,
+        "errors": stats.errors,
+    }
+
+
+def print_results(results: List[dict]):
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["users", "songs/s", "login p50/p99", "convert p50/p99", "job p50/p99", "select p50/p99",
+                         "ws lag p50/p99", "loop lag p50/p99/max", "RSS (MB)", "per session (KB)", "errors"]
+    for r in results:
+        loop = r["loop_lag_ms"]
+        table.add_row([
+            r["users"], f"{r['songs_per_sec']:.1f}",
+            f"{r['login_ms']['p50']:.0f}/{r['login_ms']['p99']:.0f}",
+            f"{r['convert_ms']['p50']:.0f}/{r['convert_ms']['p99']:.0f}",
+            f"{r['job_ms']['p50']:.0f}/{r['job_ms']['p99']:.0f}",
+            f"{r['select_ms']['p50']:.0f}/{r['select_ms']['p99']:.0f}",
+            f"{r['ws_lag_ms']['p50']:.1f}/{r['ws_lag_ms']['p99']:.1f}",
+            f"{loop.get('p50', 0):.1f}/{loop.get('p99', 0):.1f}/{loop.get('max', 0):.1f}",
+            f"{r['rss_mb']:.0f}", f"{r['rss_per_session_kb']:.0f}", len(r["errors"]),
+        ])
+    print(table)
+    for r in results:
+        for error in r["errors"][:5]:
+            print(f"[{r['users']} users] {error}")
+
+
+async def run(args) -> List[dict]:
+    levels = [int(level) for level in args.levels.split(",")]
+    mock_args = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                 "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+                 "--retry-after", str(args.retry_after), "--miss-rate", str(args.miss_rate),
+                 "--ambiguous-rate", str(args.ambiguous_rate), "--playlist-sizes", str(args.playlist_size)]
+
+    processes = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, PLAYLIST_CONVERTER_DATA_DIR=os.path.join(work_dir, "data"))
+        try:
+            upstream_proc, upstream = await start_process(os.path.join(BENCH_DIR, "mock_server.py"), *mock_args)
+            processes.append(upstream_proc)
+            api_proc, base_url = await start_process(os.path.join(BENCH_DIR, "mock_api.py"), "--upstream", upstream,
+                                                     cwd=work_dir, env=env, verbose=args.verbose)
+            processes.append(api_proc)
+
+            results = []
+            connector = aiohttp.TCPConnector(limit=0)
+            timeout = aiohttp.ClientTimeout(total=None)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+                for index, level in enumerate(levels):
+                    stats = await run_level(http, base_url, level, index, args)
+                    results.append(summarize(stats, args.playlist_size))
+            return results
+        finally:
+            for proc in processes:
+                proc.terminate()
+                await proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,5,10,25", help="依次测试的并发用户数，逗号分隔")
+    parser.add_argument("--playlist-size", type=int, default=200, help="每个用户转换的歌单大小")
+    parser.add_argument("--think-time", type=float, default=0.2, help="用户手动选择前的等待时间 (秒)")
+    parser.add_argument("--skip-ratio", type=float, default=0.3, help="手动选择时跳过的比例")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--verbose", action="store_true", help="显示网页服务的日志")
+    add_arguments(parser)
+    parser.set_defaults(ambiguous_rate=0.05)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
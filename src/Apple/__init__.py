@@ -1 +1,3 @@
 from .apm import AppleMusic, ApplePlaylist, AppleSong
+from .search_cache import SearchCache, get_default_search_cache
+from .http_pool import HttpPool, get_default_http_pool, close_default_http_pool
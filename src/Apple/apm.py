@@ -1,9 +1,13 @@
+import os
 import json
 import aiohttp
 import asyncio
+import yarl
 from colorama import Fore, init
 from prettytable import PrettyTable
-from typing import List
+from typing import AsyncIterable, Iterable, List, Optional, Union
+from contextlib import asynccontextmanager
+from collections import Counter
 import time
 import aiohttp.log
 import logging
@@ -14,16 +18,56 @@ from .apm_utils import (
     contains_korean,
     AppleSong,
     ApplePlaylist,
+    AppleMusicAPIError,
+    PlaylistWriteReport,
+    PlaylistVerifyReport,
+    parse_album_id,
     print_json
 )
+from .search_cache import SearchCache, get_default_search_cache, normalize_term
+from .singleflight import SingleFlight
+from .rate_limiter import AdaptiveRateLimiter, parse_retry_after, backoff_delay
+from .http_pool import HttpPool, get_default_http_pool
+
+try:
+    import metrics
+    import tracing
+except ImportError:  # 以 src.Apple 的形式导入时 (例如运行测试)
+    from src import metrics, tracing
 
 init()
 
 logging.getLogger('aiohttp.client').setLevel(logging.DEBUG)
 
+# 进程内所有 AppleMusic 实例共享，合并相同 storefront 和搜索词的并发搜索
+_search_flight = SingleFlight()
+
+# 进程内所有 AppleMusic 实例发出的请求共用同一个限流器
+_default_rate_limiter = AdaptiveRateLimiter()
+metrics.UPSTREAM_IN_FLIGHT.set_function(lambda: _default_rate_limiter.in_flight)
+metrics.UPSTREAM_RATE_LIMIT.set_function(lambda: _default_rate_limiter.rate)
+
+# 这些方法可以安全地重试；其他方法只在 429 (请求未被处理) 时重试
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+MAX_RETRIES = 4
+
+# 写入播放列表时每批提交的歌曲数量和每批的重试次数
+DEFAULT_WRITE_CHUNK_SIZE = 100
+MAX_CHUNK_RETRIES = 2
+
+# 写入后验证的最大检查次数和首次等待时间 (秒)，之后每次等待时间翻倍
+VERIFY_MAX_ATTEMPTS = 5
+VERIFY_BASE_DELAY = 0.5
+
+# 资料库和目录接口的地址，可通过环境变量指向本地的模拟服务 (见 benchmarks/mock_server.py)
+LIBRARY_API_BASE = os.environ.get("APPLE_MUSIC_API_BASE", "https://api.music.apple.com")
+CATALOG_API_BASE = os.environ.get("APPLE_MUSIC_CATALOG_API_BASE", "https://amp-api.music.apple.com")
+LIBRARY_PAGE_LIMIT = 100
+
 
 class AppleMusic:
-    def __init__(self, user_token, dev_token):
+    def __init__(self, user_token, dev_token, search_cache: SearchCache = None,
+                 rate_limiter: AdaptiveRateLimiter = None, http_pool: HttpPool = None):
         self.user_token = user_token
         self.dev_token = dev_token
         self.header_with_user = {
@@ -40,14 +84,73 @@ class AppleMusic:
         }
 
         self.playlists: list[ApplePlaylist] = []
-        self.session = aiohttp.ClientSession()
         self.storefront = None
+        self.search_cache: SearchCache = search_cache or get_default_search_cache()
+        self.rate_limiter: AdaptiveRateLimiter = rate_limiter or _default_rate_limiter
+        # 连接池由进程内所有实例共享，令牌通过每个请求的请求头传入
+        self.http_pool: HttpPool = http_pool or get_default_http_pool()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http_pool.session
 
     async def close(self):
-        await self.session.close()
+        # 实例不再持有自己的连接；共享连接池由 close_default_http_pool() 在进程退出时关闭
+        pass
+
+    @asynccontextmanager
+    async def _request(self, method: str, url: str, **kwargs):
+        """
+        经过限流器发送请求，用法与 session.get(...) 相同: async with self._request("GET", url) as r。
+
+        429 和 5xx 会降低限流器的速率和并发，按 Retry-After 或带抖动的指数退避等待后重试
+        (非幂等请求只重试 429)。重试用尽后把最后一次的响应交给调用者处理。
+        """
+        retryable = method in IDEMPOTENT_METHODS
+        endpoint = f"{method} {metrics.endpoint_of(yarl.URL(url).path)}"
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                with tracing.span(endpoint, "apple", attempt=attempt) as span:
+                    response = await self.session.request(method, url, **kwargs)
+                    span.set(status=response.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.rate_limiter.release()
+                metrics.UPSTREAM_RESPONSES.inc(service="apple", endpoint=endpoint, status="error")
+                if not retryable or attempt >= MAX_RETRIES:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                self.rate_limiter.release()
+                raise
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, service="apple", endpoint=endpoint)
+            metrics.UPSTREAM_RESPONSES.inc(service="apple", endpoint=endpoint, status=response.status)
+
+            if response.status == 429 or response.status >= 500:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self.rate_limiter.on_throttle(retry_after)
+                if (retryable or response.status == 429) and attempt < MAX_RETRIES:
+                    response.release()
+                    self.rate_limiter.release()
+                    await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+                    attempt += 1
+                    continue
+            else:
+                self.rate_limiter.on_success()
+            break
+
+        try:
+            yield response
+        finally:
+            response.release()
+            self.rate_limiter.release()
 
     async def login(self):
-        async with self.session.get("https://api.music.apple.com/v1/me/library/playlists", headers=self.header_with_user) as r:
+        async with self._request("GET", f"{LIBRARY_API_BASE}/v1/me/library/playlists", headers=self.header_with_user) as r:
             if r.status == 200:
                 print(Fore.GREEN + "Apple Music Login Success" + Fore.RESET)
                 self.storefront = await self.get_user_storefront()
@@ -55,17 +158,20 @@ class AppleMusic:
                 print(Fore.RED + f"Apple Music Login Failed, Code: {r.status}" + Fore.RESET)
 
     async def retrive_playlists(self):
-        async with self.session.get("https://api.music.apple.com/v1/me/library/playlists", headers=self.header_with_user) as r:
-            if r.status == 200:
-                playlists = await r.json()
-                for playlist in playlists['data']:
-                    playlist_obj = ApplePlaylist(id=playlist['id'],
-                                                name=playlist['attributes']['name'],
-                                                create_time=playlist['attributes']['dateAdded'])
-                    if not any(p.id == playlist_obj.id for p in self.playlists):
-                        self.playlists.append(playlist_obj)
-            else:
-                print(Fore.RED + "Failed to get playlists" + Fore.RESET)
+        try:
+            async for playlist_obj in self.iter_playlists():
+                if not any(p.id == playlist_obj.id for p in self.playlists):
+                    self.playlists.append(playlist_obj)
+        except (AppleMusicAPIError, aiohttp.ClientError, asyncio.TimeoutError):
+            print(Fore.RED + "Failed to get playlists" + Fore.RESET)
+
+    async def iter_playlists(self):
+        """逐个产出资料库中的全部播放列表，自动翻页并预取下一页"""
+        url = f"{LIBRARY_API_BASE}/v1/me/library/playlists?limit={LIBRARY_PAGE_LIMIT}"
+        async for playlist in self._iter_resources(url):
+            yield ApplePlaylist(id=playlist['id'],
+                                name=playlist['attributes']['name'],
+                                create_time=playlist['attributes'].get('dateAdded', ""))
 
     def display_playlists(self):
         table = PrettyTable()
@@ -75,8 +181,8 @@ class AppleMusic:
         print(table)
         
     async def get_user_storefront(self):
-        url = "https://api.music.apple.com/v1/me/storefront"
-        async with self.session.get(url, headers=self.header_with_user) as r:
+        url = f"{LIBRARY_API_BASE}/v1/me/storefront"
+        async with self._request("GET", url, headers=self.header_with_user) as r:
             if r.status == 200:
                 storefront = await r.json()
                 return storefront['data'][0]['id']
@@ -88,19 +194,24 @@ class AppleMusic:
         if playlist.songs:
             return playlist.songs
 
-        async with self.session.get(f"https://api.music.apple.com/v1/me/library/playlists/{playlist.id}/tracks", headers=self.header_with_user) as r:
-            if r.status == 200:
-                songs = await r.json()
-                for song in songs['data']:
-                    song_obj = AppleSong(id=song['id'],
-                                    name=song['attributes']['name'],
-                                    artist=song['attributes']['artistName'],
-                                    album=song['attributes']['albumName'])
-                    playlist.songs.append(song_obj)
-            else:
-                print(Fore.RED + f"Failed to get songs, Code: {r.status}" + Fore.RESET)
+        try:
+            songs = [song async for song in self.iter_tracks(playlist)]
+        except (AppleMusicAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(Fore.RED + f"Failed to get songs, {str(e)}" + Fore.RESET)
+            return playlist.songs
+        playlist.songs.extend(songs)
         return playlist.songs
 
+    async def iter_tracks(self, playlist: ApplePlaylist):
+        """逐首产出播放列表中的全部歌曲，自动翻页并预取下一页"""
+        url = f"{LIBRARY_API_BASE}/v1/me/library/playlists/{playlist.id}/tracks?limit={LIBRARY_PAGE_LIMIT}"
+        async for song in self._iter_resources(url):
+            yield AppleSong(id=song['id'],
+                            name=song['attributes']['name'],
+                            artist=song['attributes']['artistName'],
+                            album=song['attributes']['albumName'],
+                            duration=song['attributes'].get('durationInMillis', 0))
+
     def display_songs(self, songs: list[AppleSong]):
         table = PrettyTable()
         table.field_names = ["No.", "ID", "Name", "Artist", "Album"]
@@ -108,7 +219,14 @@ class AppleMusic:
             table.add_row([i, song.id, song.name, song.artist, song.album])
         print(table)
 
-    async def new_playlist(self, name: str, description: str = ""):
+    async def new_playlist(self, name: str, description: str = "") -> Optional[ApplePlaylist]:
+        """
+        创建新的播放列表。
+
+        返回:
+            Optional[ApplePlaylist]: 从创建接口的 201 响应中解析出的播放列表；
+            创建失败或响应中没有播放列表信息时返回 None
+        """
         new_playlist = {
             "attributes": {
                 "name": name,
@@ -116,90 +234,263 @@ class AppleMusic:
             }
         }
 
-        async with self.session.post("https://api.music.apple.com/v1/me/library/playlists", headers=self.header_with_user, json=new_playlist) as r:
-            if r.status == 201:
-                print(Fore.GREEN + "New Playlist Created" + Fore.RESET)
-            else:
+        async with self._request("POST", f"{LIBRARY_API_BASE}/v1/me/library/playlists", headers=self.header_with_user, json=new_playlist) as r:
+            if r.status != 201:
                 print(Fore.RED + "Failed to create playlist" + Fore.RESET)
+                return None
+            print(Fore.GREEN + "New Playlist Created" + Fore.RESET)
+            try:
+                data = (await r.json(content_type=None)).get('data') or []
+            except (aiohttp.ClientError, ValueError, AttributeError):
+                return None
+
+        if not data:
+            return None
+        playlist_obj = ApplePlaylist(id=data[0]['id'],
+                                     name=data[0].get('attributes', {}).get('name', name),
+                                     create_time=data[0].get('attributes', {}).get('dateAdded', ""))
+        if not any(p.id == playlist_obj.id for p in self.playlists):
+            self.playlists.append(playlist_obj)
+        return playlist_obj
 
     async def delete_playlist(self, playlist: ApplePlaylist):
-        async with self.session.delete(f"https://amp-api.music.apple.com/v1/me/library/playlists/{playlist.id}", headers=self.header_with_user) as r:
+        async with self._request("DELETE", f"{CATALOG_API_BASE}/v1/me/library/playlists/{playlist.id}", headers=self.header_with_user) as r:
             if r.status == 204:
                 print(Fore.GREEN + "Playlist Deleted" + Fore.RESET)
             else:
                 print(Fore.RED + "Failed to delete playlist" + Fore.RESET)
 
     async def replace_songs_to_playlist(self, playlist: ApplePlaylist, songs: list[AppleSong]):
-        songs_body = [
-            {
-                "id": song.id,
-                "type": "songs"
-            }
-            for song in songs
-        ]
-        new_track = {
-            "data": songs_body
-        }
-
-        async with self.session.put(f"https://amp-api.music.apple.com/v1/me/library/playlists/{playlist.id}/tracks", headers=self.header_with_user, json=new_track) as r:
-            if r.status in [200, 204]:
-                print(Fore.GREEN + "Songs Added" + Fore.RESET)
-            else:
-                print(Fore.RED + "Failed to add songs" + Fore.RESET)
-
-    async def add_songs_to_playlist(self, playlist_id: str, songs: list[AppleSong]):
-        songs_body = [
-            {
-                "id": song.id,
-                "type": "songs"
-            }
-            for song in songs
-        ]
+        report = await self.write_songs(playlist.id, songs, replace=True)
+        if not report.failed:
+            print(Fore.GREEN + "Songs Added" + Fore.RESET)
+        else:
+            print(Fore.RED + "Failed to add songs" + Fore.RESET)
+        return report
+
+    async def write_songs(self, playlist_id: str,
+                          songs: Union[Iterable[AppleSong], AsyncIterable[AppleSong]],
+                          chunk_size: int = DEFAULT_WRITE_CHUNK_SIZE,
+                          replace: bool = False,
+                          max_chunk_retries: int = MAX_CHUNK_RETRIES,
+                          baseline: Optional[List[str]] = None,
+                          report: Optional[PlaylistWriteReport] = None) -> PlaylistWriteReport:
+        """
+        分批写入歌曲到播放列表。songs 可以是异步迭代器，边产生边写入，
+        每凑满 chunk_size 首提交一次，按顺序逐批提交以保证歌曲顺序。
+
+        参数:
+            playlist_id: str - 目标播放列表ID
+            songs - 要写入的歌曲，支持普通或异步迭代器
+            chunk_size: int - 每批写入的歌曲数量
+            replace: bool - 为 True 时第一批替换播放列表原有歌曲，后续批次追加
+            max_chunk_retries: int - 每批失败后的重试次数
+            baseline: 写入前播放列表的目录ID快照，用于判断失败的批次是否其实已经写入
+            report: 在这个报告上累计结果，调用者可以在写入过程中读取进度；默认新建
+
+        追加歌曲的 POST 不是幂等的：服务端可能已经写入却返回 5xx。重试前先读取播放列表，
+        有快照时比较 (当前 - 快照) 是否已包含本次写入的全部歌曲，没有快照时比较末尾的歌曲，
+        已经写入的批次不再重试。
+
+        返回:
+            PlaylistWriteReport: 写入结果，失败批次的歌曲在 failed 中，它们在写入顺序中的下标在 failed_indices 中
+        """
+        report = report if report is not None else PlaylistWriteReport()
+        chunk: List[AppleSong] = []
+        offset = 0  # 当前批次第一首歌曲的下标
+        written_ids: List[str] = []  # 本次已经写入的歌曲
+
+        async def flush():
+            nonlocal offset
+            start, offset = offset, offset + len(chunk)
+            # 第一批成功写入的歌曲替换原有内容，之后都是追加
+            use_replace = replace and report.written == 0
+            report.chunks += 1
+            with tracing.span("apple.write_chunk", "apple", songs=len(chunk), replace=use_replace):
+                for attempt in range(max_chunk_retries + 1):
+                    # 替换用的 PUT 是幂等的，可以直接重试；追加失败时先确认是否其实已经写入
+                    if await self._submit_tracks(playlist_id, chunk, use_replace) or (
+                            not use_replace and
+                            await self._chunk_landed(playlist_id, chunk, written_ids, [] if replace else baseline)):
+                        report.written += len(chunk)
+                        written_ids.extend(song.id for song in chunk)
+                        return
+                    if attempt < max_chunk_retries:
+                        await asyncio.sleep(backoff_delay(attempt))
+            print(Fore.RED + f"第 {report.chunks} 批歌曲写入失败 ({len(chunk)} 首)" + Fore.RESET)
+            report.failed_chunks += 1
+            report.failed.extend(chunk)
+            report.failed_indices.extend(range(start, offset))
+
+        if isinstance(songs, AsyncIterable):
+            async for song in songs:
+                chunk.append(song)
+                if len(chunk) >= chunk_size:
+                    await flush()
+                    chunk = []
+        else:
+            for song in songs:
+                chunk.append(song)
+                if len(chunk) >= chunk_size:
+                    await flush()
+                    chunk = []
+        if chunk:
+            await flush()
+        return report
+
+    async def _chunk_landed(self, playlist_id: str, chunk: List[AppleSong], written_ids: List[str],
+                            baseline: Optional[List[str]]) -> bool:
+        """读取播放列表，判断返回失败的一批歌曲是否其实已经写入"""
+        try:
+            present = await self.get_playlist_catalog_ids(playlist_id)
+        except (AppleMusicAPIError, aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        chunk_ids = [song.id for song in chunk]
+        if baseline is None:
+            return len(present) >= len(chunk_ids) and present[-len(chunk_ids):] == chunk_ids
+        added = Counter(present) - Counter(baseline)
+        expected = Counter(written_ids) + Counter(chunk_ids)
+        return all(added[song_id] >= count for song_id, count in expected.items())
+
+    async def _submit_tracks(self, playlist_id: str, songs: List[AppleSong], replace: bool = False) -> bool:
+        """提交一批歌曲，replace 为 True 时用 PUT 替换原有歌曲，否则用 POST 追加"""
         new_track = {
-            "data": songs_body
+            "data": [
+                {
+                    "id": song.id,
+                    "type": "songs"
+                }
+                for song in songs
+            ]
         }
-        print_json(new_track)
-
-        async with self.session.post(f"https://api.music.apple.com/v1/me/library/playlists/{playlist_id}/tracks", 
-                                   headers=self.header_with_user, 
-                                   json=new_track) as r:
-            response_text = await r.text()
-            if r.status in [200, 201, 204]:
-                print(Fore.GREEN + "Songs Added to Playlist:" + playlist_id + "status:" + str(r.status) + Fore.RESET)
-            else:
+        if replace:
+            method, url = "PUT", f"{CATALOG_API_BASE}/v1/me/library/playlists/{playlist_id}/tracks"
+        else:
+            method, url = "POST", f"{LIBRARY_API_BASE}/v1/me/library/playlists/{playlist_id}/tracks"
+        try:
+            async with self._request(method, url, headers=self.header_with_user, json=new_track) as r:
+                if r.status in [200, 201, 204]:
+                    return True
                 print(Fore.RED + f"Failed to add songs: {r.status}" + Fore.RESET)
-
-        # 验证添加结果，带重试
-        max_retries = 5
-        retry_delay = 1  # 秒
-        
-        for attempt in range(max_retries):
-            print(f"\n正在验证添加结果 (第 {attempt + 1} 次尝试)...")
-            await asyncio.sleep(retry_delay)  # 等待API后端更新
-            
-            async with self.session.get(f"https://api.music.apple.com/v1/me/library/playlists/{playlist_id}/tracks", headers=self.header_with_user) as r:
-                if r.status == 200:
-                    response = await r.json()
-                    # 检查新添加的歌曲是否在播放列表中
-                    added_song_names = {song.name for song in songs}
-                    playlist_song_names = {track['attributes']['name'] for track in response.get('data', [])}
-                    
-                    # 找出未成功添加的歌曲
-                    failed_songs = [song for song in songs if song.name not in playlist_song_names]
-                    
-                    if not failed_songs:  # 所有歌曲都添加成功
-                        print(Fore.GREEN + f"已成功验证所有歌曲添加到播放列表 {playlist_id}" + Fore.RESET)
-                        return
-                    
-                    if attempt == max_retries - 1:  # 最后一次尝试
-                        print(Fore.RED + f"以下歌曲未能成功添加到播放列表:" + Fore.RESET)
-                        for song in failed_songs:
-                            print(Fore.YELLOW + f"- {song.name} (ID: {song.id}) - 艺术家: {song.artist}" + Fore.RESET)
+                return False
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(Fore.RED + f"Failed to add songs: {str(e)}" + Fore.RESET)
+            return False
+
+    async def add_songs_to_playlist(self, playlist_id: str, songs: list[AppleSong]) -> PlaylistVerifyReport:
+        try:
+            baseline = await self.get_playlist_catalog_ids(playlist_id)
+        except (AppleMusicAPIError, aiohttp.ClientError, asyncio.TimeoutError):
+            baseline = None
+        report = await self.write_songs(playlist_id, songs, baseline=baseline)
+        if not report.failed:
+            print(Fore.GREEN + "Songs Added to Playlist:" + playlist_id + Fore.RESET)
+        return await self.verify_playlist_songs(playlist_id, songs, baseline=baseline)
+
+    async def _fetch_page(self, url: str) -> dict:
+        async with self._request("GET", url, headers=self.header_with_user) as r:
+            if r.status == 404:
+                # 空的资料库或播放列表会返回 404
+                return {}
+            if r.status != 200:
+                raise AppleMusicAPIError(r.status, f"读取失败: {url}")
+            return await r.json()
+
+    async def _iter_resources(self, url: str):
+        """
+        按 next 链接逐页读取资源列表，逐条产出 data 中的元素。
+        调用者处理当前页时，下一页已经在后台请求。
+        """
+        page_task = asyncio.create_task(self._fetch_page(url))
+        try:
+            while page_task is not None:
+                page = await page_task
+                next_path = page.get('next')
+                page_task = asyncio.create_task(self._fetch_page(f"{LIBRARY_API_BASE}{next_path}")) if next_path else None
+                for item in page.get('data', []):
+                    yield item
+        finally:
+            if page_task is not None and not page_task.done():
+                page_task.cancel()
+                await asyncio.gather(page_task, return_exceptions=True)
+
+    @staticmethod
+    def _catalog_id_of(track: dict) -> str:
+        """资料库歌曲的 ID 与目录ID不同，目录ID在 playParams.catalogId 中"""
+        play_params = track.get('attributes', {}).get('playParams', {})
+        return play_params.get('catalogId') or track['id']
+
+    async def get_playlist_catalog_ids(self, playlist_id: str) -> List[str]:
+        """读取播放列表全部分页，按顺序返回每首歌曲的目录ID"""
+        url = f"{LIBRARY_API_BASE}/v1/me/library/playlists/{playlist_id}/tracks?limit={LIBRARY_PAGE_LIMIT}"
+        return [self._catalog_id_of(track) async for track in self._iter_resources(url)]
+
+    async def verify_playlist_songs(self, playlist_id: str, songs: list[AppleSong],
+                                    max_attempts: int = VERIFY_MAX_ATTEMPTS,
+                                    base_delay: float = VERIFY_BASE_DELAY,
+                                    baseline: Optional[List[str]] = None) -> PlaylistVerifyReport:
+        """
+        验证歌曲已写入播放列表。
+
+        读取播放列表全部分页，按目录ID (重复歌曲按次数) 与 songs 比对；缺失时按指数退避
+        (base_delay, 2*base_delay, ...) 重新检查。给出 baseline (写入前播放列表的目录ID快照) 时
+        只比对 (当前 - 快照)，追加原本就在播放列表里的歌曲不会被误判为已写入。
+
+        资料库播放列表是最终一致的，较早的写入可能晚些才出现，所以最多只重新提交一次，
+        并且只提交连续两次读取都缺失的歌曲；之后的检查只读取不再提交，仍缺失的记入 missing。
+
+        返回:
+            PlaylistVerifyReport: 验证结果，checked 为 False 表示一直没能读取到播放列表；
+            同一目录ID出现多次时，缺失的按 songs 中靠后的计 (missing_indices)
+        """
+        report = PlaylistVerifyReport(expected=len(songs))
+        delay = base_delay
+        previous_missing: Optional[Counter] = None  # 上一次读取时缺失的目录ID
+
+        for attempt in range(1, max_attempts + 1):
+            with tracing.span("apple.verify_wait", "apple", attempt=attempt):
+                await asyncio.sleep(delay)  # 等待API后端更新
+            delay *= 2
+            report.attempts = attempt
+            try:
+                with tracing.span("apple.verify_read", "apple", attempt=attempt):
+                    present = Counter(await self.get_playlist_catalog_ids(playlist_id))
+                if baseline is not None:
+                    present -= Counter(baseline)
+            except (AppleMusicAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                report.error = str(e)
+                continue
+
+            report.checked = True
+            report.error = ""
+            missing = []
+            report.missing_indices = []
+            for index, song in enumerate(songs):
+                if present[song.id] > 0:
+                    present[song.id] -= 1
                 else:
-                    if attempt == max_retries - 1:  # 最后一次尝试
-                        print(Fore.RED + f"验证添加结果失败: {r.status}" + Fore.RESET)
-
-        print(Fore.RED + "达到最大重试次数，部分歌曲可能未成功添加" + Fore.RESET)
+                    missing.append(song)
+                    report.missing_indices.append(index)
+            report.missing = missing
+            report.present = len(songs) - len(missing)
+            if not missing:
+                break
+
+            # 第一次缺失可能只是后端尚未同步；连续两次读取都缺失的才重新提交，且只提交一次
+            missing_ids = Counter(song.id for song in missing)
+            if previous_missing is not None and not report.resubmitted and attempt < max_attempts:
+                still_missing = missing_ids & previous_missing
+                resubmit = []
+                for song in missing:
+                    if still_missing[song.id] > 0:
+                        still_missing[song.id] -= 1
+                        resubmit.append(song)
+                if resubmit and await self._submit_tracks(playlist_id, resubmit):
+                    report.resubmitted += len(resubmit)
+            previous_missing = missing_ids
+
+        report.ok = report.checked and not report.missing
+        return report
 
     async def stupid_search(self, song_name: str, artist: str, album: str) -> List[AppleSong]:
         country_code = self.storefront
@@ -210,21 +501,78 @@ class AppleMusic:
         # elif contains_korean(song_name):
         #     country_code = "kr"
 
-        search_url = f"https://amp-api.music.apple.com/v1/catalog/{country_code}/search?term={song_name}&types=songs&limit=25"
-        async with self.session.get(search_url, headers=self.header_without_user) as r:
+        cached = self.search_cache.get(country_code, song_name)
+        metrics.SEARCH_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        key = (country_code, normalize_term(song_name))
+        with tracing.span("apple.search", "apple", term=song_name):
+            songs = await _search_flight.do(key, lambda: self._search_catalog(country_code, song_name))
+        # 多个调用者共享同一份结果，各自拿到独立的列表
+        return list(songs)
+
+    async def _search_catalog(self, country_code: str, song_name: str) -> List[AppleSong]:
+        search_url = f"{CATALOG_API_BASE}/v1/catalog/{country_code}/search?term={song_name}&types=songs&limit=25"
+        async with self._request("GET", search_url, headers=self.header_without_user) as r:
             songs = []
             if r.status == 200:
                 search_result = await r.json()
-                if "songs" not in search_result['results']:
-                    return songs
-                for song in search_result['results']['songs']['data']:
-                    song_obj = AppleSong(id=song['id'],
-                                    name=song['attributes']['name'],
-                                    artist=song['attributes']['artistName'],
-                                    album=song['attributes']['albumName'])
-                    songs.append(song_obj)
+                for song in search_result['results'].get('songs', {}).get('data', []):
+                    songs.append(self._parse_catalog_song(song))
+                # 只缓存成功的响应，失败时下次仍会重新请求
+                self.search_cache.put(country_code, song_name, songs)
+            elif r.status == 429 or r.status >= 500:
+                # 被限流或服务端错误时不能当作"没有结果"，否则歌曲会被错误地标记为未匹配
+                raise AppleMusicAPIError(r.status, f"搜索失败: {song_name}")
             return songs
 
+    async def get_album_songs(self, album_id: str) -> List[AppleSong]:
+        """
+        获取目录专辑的全部曲目，结果与搜索结果共用缓存和请求合并。
+
+        参数:
+            album_id: str - 目录专辑ID (AppleSong.album_id)
+        """
+        country_code = self.storefront
+        cache_term = f"album:{album_id}"
+        cached = self.search_cache.get(country_code, cache_term)
+        metrics.SEARCH_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        songs = await _search_flight.do((country_code, cache_term),
+                                        lambda: self._fetch_album_songs(country_code, album_id))
+        return list(songs)
+
+    async def _fetch_album_songs(self, country_code: str, album_id: str) -> List[AppleSong]:
+        album_url = f"{CATALOG_API_BASE}/v1/catalog/{country_code}/albums/{album_id}"
+        async with self._request("GET", album_url, headers=self.header_without_user) as r:
+            songs = []
+            if r.status == 200:
+                album = await r.json()
+                for album_data in album.get('data', []):
+                    tracks = album_data.get('relationships', {}).get('tracks', {}).get('data', [])
+                    for song in tracks:
+                        if song.get('type') == 'songs':
+                            songs.append(self._parse_catalog_song(song, album_id))
+                self.search_cache.put(country_code, f"album:{album_id}", songs)
+            elif r.status == 429 or r.status >= 500:
+                raise AppleMusicAPIError(r.status, f"获取专辑失败: {album_id}")
+            else:
+                print(Fore.RED + f"Failed to get album {album_id}, Code: {r.status}" + Fore.RESET)
+            return songs
+
+    @staticmethod
+    def _parse_catalog_song(song: dict, album_id: str = "") -> AppleSong:
+        attributes = song['attributes']
+        return AppleSong(id=song['id'],
+                         name=attributes['name'],
+                         artist=attributes['artistName'],
+                         album=attributes['albumName'],
+                         duration=attributes.get('durationInMillis', 0),
+                         album_id=parse_album_id(attributes.get('url', "")) or album_id)
+
 
 async def main():
     with open("config.json", "r") as f:
@@ -1,5 +1,6 @@
 import re
 import os
+import sys
 import json
 
 from dataclasses import dataclass, field
@@ -25,6 +26,11 @@ def contains_korean(text):
     )
     return bool(korean_pattern.search(text))
 
+def parse_album_id(url: str) -> str:
+    """从目录歌曲链接 (https://music.apple.com/cn/album/xxx/123456?i=789) 中取出专辑ID"""
+    match = re.search(r'/album/(?:[^/?]+/)?(\d+)', url or "")
+    return match.group(1) if match else ""
+
 def print_json(json_str: str):
     pwd = os.getcwd()
     print(json.dumps(json_str, indent=4, ensure_ascii=False))
@@ -35,14 +41,54 @@ def print_json(json_str: str):
 
 
 
-@dataclass
+class AppleMusicAPIError(Exception):
+    """Apple Music 接口在重试后仍返回限流或服务端错误"""
+    def __init__(self, status: int, message: str = ""):
+        self.status = status
+        super().__init__(f"{message} (HTTP {status})" if message else f"HTTP {status}")
+
+
+def intern_text(text):
+    """驻留字符串：同一艺术家、专辑在整个音乐库中只保留一份"""
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+@dataclass(frozen=True, slots=True)
 class AppleSong:
+    """不可变的歌曲信息。艺术家、专辑名和专辑ID会被驻留"""
     id: str
     name: str
     artist: str
     album: str
+    duration: int = 0  # 毫秒，未知时为 0
+    album_id: str = ""  # 目录专辑ID，未知时为空
+
+    def __post_init__(self):
+        object.__setattr__(self, 'artist', intern_text(self.artist))
+        object.__setattr__(self, 'album', intern_text(self.album))
+        object.__setattr__(self, 'album_id', intern_text(self.album_id))
 
 @dataclass
+class PlaylistWriteReport:
+    written: int = 0
+    chunks: int = 0
+    failed_chunks: int = 0
+    failed: list[AppleSong] = field(default_factory=list)
+    failed_indices: list[int] = field(default_factory=list)  # 失败歌曲在写入顺序中的下标
+
+@dataclass
+class PlaylistVerifyReport:
+    ok: bool = False
+    checked: bool = False  # 是否成功读取过播放列表
+    attempts: int = 0
+    expected: int = 0
+    present: int = 0
+    resubmitted: int = 0
+    missing: list[AppleSong] = field(default_factory=list)
+    missing_indices: list[int] = field(default_factory=list)  # 缺失歌曲在 songs 中的下标
+    error: str = ""
+
+@dataclass(slots=True)
 class ApplePlaylist:
     id: str
     name: str
@@ -0,0 +1,139 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+try:
+    import metrics
+except ImportError:  # 以 src.Apple 的形式导入时 (例如运行测试)
+    from src import metrics
+
+# 连接池总上限和每个主机的上限；每主机上限与限流器的最大并发 (rate_limiter.MAX_CONCURRENCY) 一致
+POOL_LIMIT = 100
+POOL_LIMIT_PER_HOST = 32
+# 空闲连接保持时间和 DNS 缓存时间 (秒)
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+
+class HttpPool:
+    """
+    进程内共享的 aiohttp 连接池，所有 AppleMusic 实例复用同一组 keep-alive 连接，
+    避免每个用户各自建立 DNS 查询和 TLS 握手。
+
+    会话在第一次使用时创建并绑定到当前事件循环；事件循环变化 (例如测试中每个用例一个循环)
+    或调用 close() 后会重新创建。会话上不保存任何用户相关的状态，令牌等请求头由调用者逐个请求传入。
+    """
+
+    def __init__(self, limit: int = POOL_LIMIT, limit_per_host: int = POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = KEEPALIVE_TIMEOUT, dns_cache_ttl: int = DNS_CACHE_TTL):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.created = 0       # 新建的连接数
+        self.reused = 0        # 复用的连接数
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self.created += 1
+            metrics.HTTP_POOL_CONNECTIONS.inc(event="created")
+
+        async def on_connection_reuseconn(session, context, params):
+            self.reused += 1
+            metrics.HTTP_POOL_CONNECTIONS.inc(event="reused")
+
+        async def on_dns_cache_hit(session, context, params):
+            self.dns_hits += 1
+            metrics.DNS_CACHE_LOOKUPS.inc(result="hit")
+
+        async def on_dns_cache_miss(session, context, params):
+            self.dns_misses += 1
+            metrics.DNS_CACHE_LOOKUPS.inc(result="miss")
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """返回当前事件循环上的共享会话，必要时创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and (self._session.closed or self._loop is not loop):
+            self._discard()
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+            self._loop = loop
+        return self._session
+
+    def _discard(self):
+        """丢弃已关闭或属于其他事件循环的会话"""
+        session, loop, self._session, self._loop = self._session, self._loop, None, None
+        if session.closed:
+            return
+        if loop.is_closed():
+            # 连接已随旧事件循环一起关闭，只需让会话进入关闭状态
+            session.detach()
+        elif loop.is_running():
+            # 旧事件循环在其他线程中运行，交给它关闭会话
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # 旧事件循环已停止，提交给它的任务可能不会再运行；aiohttp 没有同步关闭的公开接口，
+            # 用连接器的内部方法关闭连接 (套接字在该循环再次运行或被回收时释放)，再让会话进入关闭状态
+            session.connector._close()
+            session.detach()
+
+    async def close(self):
+        """关闭共享会话和其中的所有连接，之后再使用会重新创建"""
+        session, self._session, self._loop = self._session, None, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    def stats(self) -> dict:
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        # aiohttp 没有公开当前连接数，从连接器的内部状态读取
+        in_use = len(getattr(connector, "_acquired", ())) if connector is not None else 0
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values()) if connector is not None else 0
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+            "created": self.created,
+            "reused": self.reused,
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+        }
+
+
+# 进程内所有 AppleMusic 实例默认共用的连接池
+_default_http_pool: Optional[HttpPool] = None
+
+
+def get_default_http_pool() -> HttpPool:
+    global _default_http_pool
+    if _default_http_pool is None:
+        _default_http_pool = HttpPool()
+        metrics.HTTP_POOL_IN_USE.set_function(lambda: _default_http_pool.stats()["in_use"])
+        metrics.HTTP_POOL_IDLE.set_function(lambda: _default_http_pool.stats()["idle"])
+    return _default_http_pool
+
+
+async def close_default_http_pool():
+    """关闭默认连接池 (进程退出或网页服务关闭时调用)"""
+    if _default_http_pool is not None:
+        await _default_http_pool.close()
@@ -0,0 +1,135 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+# 默认每秒请求数、突发容量和并发上限
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 20
+DEFAULT_CONCURRENCY = 8
+MIN_RATE = 1.0
+MAX_RATE = 50.0
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0  # 秒，同一批并发请求同时被限流时只减小一次
+
+# 重试退避参数 (秒)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """指数退避加全随机抖动：在 [0, min(cap, base * 2^attempt)] 中随机取值"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveRateLimiter:
+    """
+    令牌桶 + AIMD 并发控制。
+
+    每个请求需要一个令牌 (按 rate 每秒补充，最多积累 burst 个) 和一个并发名额
+    (同时进行的请求不超过 limit)。请求成功时 rate 和 limit 缓慢加性增长；
+    遇到 429 或 5xx 时乘性减半，并在 Retry-After 指定的时间内暂停发出新请求。
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 min_rate: float = MIN_RATE, max_rate: float = MAX_RATE,
+                 min_concurrency: int = MIN_CONCURRENCY, max_concurrency: int = MAX_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.limit = float(concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._token_lock = asyncio.Lock()
+        self._waiters: List[asyncio.Future] = []
+
+    async def acquire(self):
+        """等待一个并发名额和一个令牌，请求结束后必须调用 release()"""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+        try:
+            await self._take_token()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        """归还并发名额，唤醒等待者重新检查是否有空位"""
+        self.in_flight -= 1
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _take_token(self):
+        async with self._token_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        """加性增长：大约每完成 limit 个请求，并发上限加 1，速率加 1 次/秒"""
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self.rate = min(self.max_rate, self.rate + 1 / self.limit)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """乘性减小，并在 retry_after 秒内暂停所有新请求"""
+        now = time.monotonic()
+        self.throttled += 1
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self._last_decrease = now
+            self.limit = max(self.min_concurrency, self.limit * DECREASE_FACTOR)
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 2),
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "throttled": self.throttled,
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 2)),
+        }
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+from .apm_utils import AppleSong
+
+# 缓存数据库默认放在数据目录下，可通过环境变量 PLAYLIST_CONVERTER_DATA_DIR 修改
+DEFAULT_DATA_DIR = os.environ.get("PLAYLIST_CONVERTER_DATA_DIR", "data")
+DEFAULT_TTL = 7 * 24 * 3600  # 秒
+DEFAULT_MAX_ENTRIES = 50000
+# 命中时的访问时间先记在内存中，积累到这么多条、下次写入或关闭时再批量写回
+ACCESS_FLUSH_THRESHOLD = 1000
+
+
+def normalize_term(term: str) -> str:
+    """统一全角/半角、大小写和空白，使同一首歌的不同写法命中同一条缓存"""
+    term = unicodedata.normalize("NFKC", term).casefold()
+    return re.sub(r"\s+", " ", term).strip()
+
+
+class SearchCache:
+    """
+    Apple Music 目录搜索结果的持久化缓存 (SQLite)。
+
+    以 (storefront, 规范化后的搜索词) 为键，条目超过 ttl 秒后视为过期；
+    条目数超过 max_entries 时按最近访问时间淘汰 (LRU)。
+
+    命中只读数据库，不在事件循环线程上逐次提交；访问时间在写入新条目、积累到
+    ACCESS_FLUSH_THRESHOLD 条或关闭时批量写回，LRU 顺序只在淘汰前需要准确。
+    """
+
+    def __init__(self, db_path: str, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending_access: Dict[Tuple[str, str], float] = {}
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                storefront TEXT NOT NULL,
+                term TEXT NOT NULL,
+                songs TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (storefront, term)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, storefront: str, term: str) -> Optional[List[AppleSong]]:
+        """
+        读取缓存的搜索结果。
+
+        返回:
+            Optional[List[AppleSong]]: 命中时返回歌曲列表 (可能为空列表)，未命中或已过期返回 None
+        """
+        key = (storefront or "", normalize_term(term))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT songs, created_at FROM search_cache WHERE storefront = ? AND term = ?", key
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM search_cache WHERE storefront = ? AND term = ?", key)
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._pending_access[key] = now
+            if len(self._pending_access) >= ACCESS_FLUSH_THRESHOLD:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+        return [AppleSong(**song) for song in json.loads(row[0])]
+
+    def put(self, storefront: str, term: str, songs: List[AppleSong]):
+        """写入一次搜索结果，必要时淘汰最久未访问的条目"""
+        key = (storefront or "", normalize_term(term))
+        now = time.time()
+        payload = json.dumps([asdict(song) for song in songs], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (storefront, term, songs, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (*key, payload, now, now)
+            )
+            self._pending_access.pop(key, None)
+            self._flush_access()
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self):
+        """把内存中的访问时间写回数据库 (调用者持有锁并负责提交)"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE search_cache SET accessed_at = ? WHERE storefront = ? AND term = ?",
+                [(accessed_at, *key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE rowid IN "
+                "(SELECT rowid FROM search_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+            self._pending_access.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+
+_default_cache: Optional[SearchCache] = None
+
+
+def get_default_search_cache() -> SearchCache:
+    """进程内共享的默认搜索缓存，命令行、网页接口和转换器共用同一份"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SearchCache(os.path.join(DEFAULT_DATA_DIR, "search_cache.sqlite3"))
+    return _default_cache
@@ -1,5 +1,7 @@
 from .netease import NeteaseMusic, NeteasePlaylist, NeteaseSong
+from .client_pool import NeteaseClientPool, get_default_client_pool
 from pyncm_async import apis
 from pyncm_async.apis import login
 
-__all__ = ["NeteaseMusic", "NeteasePlaylist", "NeteaseSong", "apis", "login"]
\ No newline at end of file
+__all__ = ["NeteaseMusic", "NeteasePlaylist", "NeteaseSong", "NeteaseClientPool", "get_default_client_pool",
+           "apis", "login"]
\ No newline at end of file
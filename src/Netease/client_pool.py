@@ -0,0 +1,82 @@
+import asyncio
+import weakref
+from typing import List, Optional
+
+from pyncm_async import CreateNewSession
+
+try:
+    import metrics
+except ImportError:  # 以 src.Netease 的形式导入时 (例如运行测试)
+    from src import metrics
+
+# 进程内同时进行的网易云请求上限 (所有用户共享)
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class NeteaseClientPool:
+    """
+    为每个用户创建独立的 pyncm 会话 (各自的 Cookie 和登录状态)，并限制所有会话
+    同时进行的请求总数。
+
+    pyncm 的 LoginViaCookie 写入全局会话，多个用户同时登录会互相覆盖 Cookie；
+    NeteaseMusic 把 Cookie 写入这里创建的会话，并通过 session= 参数传给每个接口，不会修改全局会话。
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._waiters: List[asyncio.Future] = []
+        self._sessions = weakref.WeakSet()
+
+    def create_session(self):
+        """创建一个新的 pyncm 会话，用完后交给 close_session 关闭"""
+        session = CreateNewSession()
+        self._sessions.add(session)
+        return session
+
+    async def close_session(self, session):
+        self._sessions.discard(session)
+        # pyncm_async 的会话基于 httpx.AsyncClient，关闭时释放它持有的连接
+        aclose = getattr(session, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    async def acquire(self):
+        """等待一个请求名额，请求结束后必须调用 release()"""
+        while self.in_flight >= self.max_concurrency:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+# 进程内所有 NeteaseMusic 实例默认共用的会话池
+_default_client_pool: Optional[NeteaseClientPool] = None
+
+
+def get_default_client_pool() -> NeteaseClientPool:
+    global _default_client_pool
+    if _default_client_pool is None:
+        _default_client_pool = NeteaseClientPool()
+        metrics.NETEASE_SESSIONS.set_function(lambda: _default_client_pool.stats()["sessions"])
+        metrics.NETEASE_IN_FLIGHT.set_function(lambda: _default_client_pool.stats()["in_flight"])
+    return _default_client_pool
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from .netease_utils import NeteasePlaylist, NeteaseSong
+
+# 与搜索缓存、匹配记录共用数据目录，可通过环境变量 PLAYLIST_CONVERTER_DATA_DIR 修改
+DEFAULT_DATA_DIR = os.environ.get("PLAYLIST_CONVERTER_DATA_DIR", "data")
+
+
+class LibraryStore:
+    """
+    网易云音乐库的本地快照 (SQLite)。
+
+    歌单列表以 uid 为键保存；歌单中的歌曲以歌单ID为键保存，并记录保存时歌单的
+    更新时间和歌曲数量。两者都与网易云返回的一致时快照才有效，否则需要重新获取。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS netease_playlists (
+                uid INTEGER NOT NULL,
+                playlist_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                creator_id INTEGER NOT NULL,
+                create_time INTEGER NOT NULL,
+                update_time INTEGER NOT NULL,
+                track_count INTEGER NOT NULL,
+                PRIMARY KEY (uid, playlist_id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS netease_playlist_songs (
+                playlist_id INTEGER PRIMARY KEY,
+                update_time INTEGER NOT NULL,
+                track_count INTEGER NOT NULL,
+                songs TEXT NOT NULL,
+                saved_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def load_playlists(self, uid: int) -> List[NeteasePlaylist]:
+        """返回该用户上次保存的歌单列表 (不含歌曲)，按原顺序排列"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT playlist_id, name, creator_id, create_time, update_time, track_count "
+                "FROM netease_playlists WHERE uid = ? ORDER BY position",
+                (uid,)
+            ).fetchall()
+        return [NeteasePlaylist(name=name, id=playlist_id, creator_id=creator_id, create_time=create_time,
+                                update_time=update_time, track_count=track_count)
+                for playlist_id, name, creator_id, create_time, update_time, track_count in rows]
+
+    def save_playlists(self, uid: int, playlists: List[NeteasePlaylist]):
+        """用新的歌单列表替换该用户的快照，已删除的歌单一并移除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM netease_playlists WHERE uid = ?", (uid,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO netease_playlists "
+                "(uid, playlist_id, position, name, creator_id, create_time, update_time, track_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(uid, p.id, position, p.name, p.creator_id, p.create_time, p.update_time, p.track_count)
+                 for position, p in enumerate(playlists)]
+            )
+            self._conn.commit()
+
+    def snapshot_version(self, playlist_id: int) -> Optional[Tuple[int, int]]:
+        """返回已保存歌曲时歌单的 (更新时间, 歌曲数量)，没有快照时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT update_time, track_count FROM netease_playlist_songs WHERE playlist_id = ?",
+                (playlist_id,)
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def load_songs(self, playlist: NeteasePlaylist) -> Optional[List[NeteaseSong]]:
+        """
+        读取歌单的歌曲快照。
+
+        返回:
+            Optional[List[NeteaseSong]]: 快照与歌单当前的更新时间和歌曲数量一致时返回歌曲，否则返回 None
+        """
+        if not playlist.update_time:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT songs FROM netease_playlist_songs "
+                "WHERE playlist_id = ? AND update_time = ? AND track_count = ?",
+                (playlist.id, playlist.update_time, playlist.track_count)
+            ).fetchone()
+        if row is None:
+            return None
+        return [NeteaseSong(id=song_id, name=name, artists=artists, album=album, duration=duration)
+                for song_id, name, artists, album, duration in json.loads(row[0])]
+
+    def save_songs(self, playlist: NeteasePlaylist):
+        """保存歌单当前的歌曲；更新时间未知的歌单无法判断是否变化，不保存"""
+        if not playlist.update_time:
+            return
+        songs = json.dumps([[s.id, s.name, s.artists, s.album, s.duration] for s in playlist.songs],
+                           ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO netease_playlist_songs "
+                "(playlist_id, update_time, track_count, songs, saved_at) VALUES (?, ?, ?, ?, ?)",
+                (playlist.id, playlist.update_time, playlist.track_count, songs, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[LibraryStore] = None
+
+
+def get_default_library_store() -> LibraryStore:
+    """进程内共享的默认快照，所有用户会话共用"""
+    global _default_store
+    if _default_store is None:
+        _default_store = LibraryStore(os.path.join(DEFAULT_DATA_DIR, "netease_library.sqlite3"))
+    return _default_store
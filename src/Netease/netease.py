@@ -1,32 +1,59 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 import asyncio
+import time
 from colorama import Fore, init
 from prettytable import PrettyTable
 from pyncm_async import apis
 from pyncm_async.apis import login
 
 from .netease_utils import NeteasePlaylist, NeteaseSong
+from .library_store import LibraryStore, get_default_library_store
+from .client_pool import NeteaseClientPool, get_default_client_pool
+
+try:
+    import metrics
+    import tracing
+except ImportError:  # 以 src.Netease 的形式导入时 (例如运行测试)
+    from src import metrics, tracing
 
 # Initialize colorama
 init()
 
+# 获取歌曲详情时每批的歌曲数量和同时进行的请求数
+TRACK_DETAIL_BATCH_SIZE = 500
+TRACK_DETAIL_CONCURRENCY = 4
+
+# 后台预取时两个歌单之间的间隔 (秒)，让出网络给用户正在等待的请求
+PREFETCH_INTERVAL = 0.5
+
 
 class NeteaseMusic:
-    def __init__(self):
+    def __init__(self, library_store: Optional[LibraryStore] = None,
+                 client_pool: Optional[NeteaseClientPool] = None):
+        """
+        参数:
+            library_store: 音乐库快照，默认使用进程内共享的快照
+            client_pool: 创建本用户 pyncm 会话并限制总请求数的会话池，默认使用进程内共享的会话池
+        """
         self.uid = 0
         self.nickname = ""
 
         self.created_playlists: List[NeteasePlaylist] = []
         self.subscribed_playlists: List[NeteasePlaylist] = []
         self._session = None
+        self._song_locks: Dict[int, asyncio.Lock] = {}
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._library_store = library_store
+        self.client_pool: NeteaseClientPool = client_pool or get_default_client_pool()
     
-    async def login(self, music_id_or_path: str):
+    async def login(self, music_id_or_path: str, prefetch: bool = False):
         """
-        登录网易云音乐并获取所有歌单及其歌曲。
+        登录网易云音乐并获取歌单列表。歌单中的歌曲在第一次调用 get_songs 时才获取。
         
         参数:
             music_id_or_path: str - music_id或包含music_id的文件路径
+            prefetch: bool - 是否在后台逐个预取自建歌单的歌曲
         """
         # if music_id_or_path is a path
         if music_id_or_path.endswith("music_id"):
@@ -40,57 +67,174 @@ class NeteaseMusic:
                 f.write(music_id)
 
         music_u = music_id
-        res = await login.LoginViaCookie(MUSIC_U=music_u)
-        if res['code'] == 200:
+        # LoginViaCookie 会把 Cookie 写入 pyncm 的全局会话，这里直接写入本用户的会话，
+        # 再用本用户的会话查询登录状态
+        self.session.cookies.update({"MUSIC_U": music_u})
+        res = await self._call_api("login", login.GetCurrentLoginStatus)
+        if res.get('code') == 200 and res.get('profile'):
+            # 与 pyncm 的 WriteLoginInfo 一样把登录信息记录在会话上
+            self.session.login_info = {"tick": time.time(), "content": res, "success": True}
+            self.session.csrf_token = self.session.cookies.get("__csrf")
             print(Fore.GREEN + "Netease Music login success" + Fore.RESET)
-            self.uid = res['result']['content']['profile']['userId']
-            self.nickname = res['result']['content']['profile']['nickname']
+            self.uid = res['profile']['userId']
+            self.nickname = res['profile']['nickname']
             print(Fore.GREEN + f"uid: {self.uid}, nickname: {self.nickname}" + Fore.RESET)
             
-            # 登录成功后获取歌单（歌曲会在retrive_playlists中获取）
+            # 登录成功后只获取歌单信息，歌曲按需获取
             await self.retrive_playlists()
+            if prefetch:
+                self.start_prefetch()
         else:
             print(Fore.RED + "Netease Music login failed" + Fore.RESET)
             raise Exception("登录失败")
 
+    @property
+    def session(self):
+        """本用户独立的 pyncm 会话，保存登录 Cookie，不与其他用户共享"""
+        if self._session is None:
+            self._session = self.client_pool.create_session()
+        return self._session
+
+    @property
+    def library_store(self) -> LibraryStore:
+        if self._library_store is None:
+            self._library_store = get_default_library_store()
+        return self._library_store
+
     async def retrive_playlists(self):
-        """获取用户的歌单列表及其中的歌曲"""
-        playlists = await apis.user.GetUserPlaylists(self.uid, limit=1000)
-        print(Fore.BLUE + "正在获取歌单及歌曲..." + Fore.RESET)
-        
-        # 先收集所有创建的歌单
-        created_playlists = []
-        for playlist in playlists['playlist']:
-            playlist_obj: NeteasePlaylist = NeteasePlaylist(name=playlist['name'],
-                                                id=playlist['id'],
-                                                creator_id=playlist['userId'],
-                                                create_time=playlist['createTime'])
-            if playlist['userId'] == self.uid:
-                created_playlists.append(playlist_obj)
-                self.created_playlists.append(playlist_obj)
+        """
+        获取 (或刷新) 用户的歌单列表，包含歌曲数量，不包含歌曲。
+
+        重复调用会替换而不是追加歌单列表。更新时间和歌曲数量都没有变化的歌单保留
+        已加载的歌曲；其余歌单在 get_songs 时优先使用本地快照，快照过期才重新获取。
+        """
+        try:
+            playlists = await self._call_api("user_playlists", apis.user.GetUserPlaylists, self.uid, limit=1000)
+        except Exception as e:
+            snapshot = self.library_store.load_playlists(self.uid)
+            if not snapshot:
+                raise
+            print(Fore.YELLOW + f"获取歌单列表失败，使用本地快照: {str(e)}" + Fore.RESET)
+            playlist_objs = snapshot
+        else:
+            playlist_objs = [NeteasePlaylist(name=playlist['name'],
+                                             id=playlist['id'],
+                                             creator_id=playlist['userId'],
+                                             create_time=playlist['createTime'],
+                                             track_count=playlist.get('trackCount', 0),
+                                             update_time=playlist.get('updateTime', 0))
+                             for playlist in playlists['playlist']]
+            self.library_store.save_playlists(self.uid, playlist_objs)
+
+        loaded = {p.id: p for p in self.created_playlists + self.subscribed_playlists}
+        created, subscribed = [], []
+        changed = 0
+        for playlist_obj in playlist_objs:
+            previous = loaded.get(playlist_obj.id)
+            version = (playlist_obj.update_time, playlist_obj.track_count)
+            if previous is not None and previous.songs_loaded \
+                    and (previous.update_time, previous.track_count) == version:
+                playlist_obj.songs = previous.songs
+                playlist_obj.songs_loaded = True
+            elif not playlist_obj.update_time or self.library_store.snapshot_version(playlist_obj.id) != version:
+                changed += 1
+            if playlist_obj.creator_id == self.uid:
+                created.append(playlist_obj)
             else:
-                self.subscribed_playlists.append(playlist_obj)
-        
-        # 并行获取所有创建的歌单中的歌曲
-        if created_playlists:
-            tasks = [self.get_songs(playlist) for playlist in created_playlists]
-            await asyncio.gather(*tasks)
-            
-            # 打印结果
-            for playlist in created_playlists:
-                print(Fore.GREEN + f"已获取歌单 '{playlist.name}' 的 {len(playlist.songs)} 首歌曲" + Fore.RESET)
+                subscribed.append(playlist_obj)
+        self.created_playlists = created
+        self.subscribed_playlists = subscribed
+        print(Fore.GREEN + f"已获取 {len(self.created_playlists)} 个创建的歌单, "
+              f"{len(self.subscribed_playlists)} 个收藏的歌单, 其中 {changed} 个需要重新获取歌曲" + Fore.RESET)
+
+    def start_prefetch(self):
+        """在后台逐个获取自建歌单的歌曲，不影响按需调用 get_songs"""
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.create_task(self._prefetch_songs())
+
+    async def _prefetch_songs(self):
+        for playlist in list(self.created_playlists):
+            if playlist.songs_loaded:
+                continue
+            try:
+                await self.get_songs(playlist)
+            except Exception as e:
+                print(Fore.YELLOW + f"预取歌单 '{playlist.name}' 失败: {str(e)}" + Fore.RESET)
+            await asyncio.sleep(PREFETCH_INTERVAL)
 
     async def get_songs(self, playlist: NeteasePlaylist):
-        if playlist.songs:
+        """
+        获取歌单中的全部歌曲。
+
+        GetPlaylistInfo 返回的 tracks 对大歌单是截断的，而 trackIds 是完整的；
+        缺少详情的歌曲按 TRACK_DETAIL_BATCH_SIZE 分批、最多 TRACK_DETAIL_CONCURRENCY 个请求
+        并发获取详情，最后按 trackIds 的顺序拼接。
+        """
+        if playlist.songs_loaded or playlist.songs:
             return
-        
-        songs = await apis.playlist.GetPlaylistInfo(playlist.id)
-        for song in songs['playlist']['tracks']:
-            song_obj = NeteaseSong(id=song['id'],
-                            name=song['name'],
-                            artists=[artist['name'] for artist in song['ar']],
-                            album=song['al']['name'])
-            playlist.songs.append(song_obj)
+
+        # 同一歌单同时被多处请求 (例如后台预取和转换) 时只获取一次
+        lock = self._song_locks.setdefault(playlist.id, asyncio.Lock())
+        async with lock:
+            if not playlist.songs_loaded:
+                await self._load_songs(playlist)
+
+    async def _load_songs(self, playlist: NeteasePlaylist):
+        # 歌单自上次保存后没有变化时直接使用本地快照
+        songs = self.library_store.load_songs(playlist)
+        if songs is not None:
+            playlist.songs = songs
+            playlist.songs_loaded = True
+            return
+
+        info = await self._call_api("playlist_info", apis.playlist.GetPlaylistInfo, playlist.id)
+        track_ids = [track['id'] for track in info['playlist'].get('trackIds', [])]
+        tracks = {track['id']: track for track in info['playlist'].get('tracks', [])}
+        if not track_ids:
+            track_ids = list(tracks)
+
+        missing_ids = [track_id for track_id in track_ids if track_id not in tracks]
+        batches = [missing_ids[i:i + TRACK_DETAIL_BATCH_SIZE]
+                   for i in range(0, len(missing_ids), TRACK_DETAIL_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(TRACK_DETAIL_CONCURRENCY)
+
+        async def fetch_details(batch: List[int]):
+            async with semaphore:
+                details = await self._call_api("track_detail", apis.track.GetTrackDetail, batch)
+            for track in details.get('songs', []):
+                tracks[track['id']] = track
+
+        await asyncio.gather(*(fetch_details(batch) for batch in batches))
+
+        # 已下架等原因拿不到详情的歌曲直接跳过
+        playlist.songs = [self._parse_track(tracks[track_id]) for track_id in track_ids if track_id in tracks]
+        playlist.songs_loaded = True
+        self.library_store.save_songs(playlist)
+
+    async def _call_api(self, endpoint: str, func, *args, **kwargs):
+        """使用本用户的会话调用 pyncm 接口，等待会话池的请求名额，并记录耗时和返回的 code"""
+        await self.client_pool.acquire()
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"netease.{endpoint}", "netease"):
+                res = await func(*args, session=self.session, **kwargs)
+        except Exception:
+            metrics.UPSTREAM_RESPONSES.inc(service="netease", endpoint=endpoint, status="error")
+            raise
+        finally:
+            self.client_pool.release()
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, service="netease", endpoint=endpoint)
+        status = res.get('code', 200) if isinstance(res, dict) else 200
+        metrics.UPSTREAM_RESPONSES.inc(service="netease", endpoint=endpoint, status=status)
+        return res
+
+    @staticmethod
+    def _parse_track(song: dict) -> NeteaseSong:
+        return NeteaseSong(id=song['id'],
+                           name=song['name'],
+                           artists=[artist['name'] for artist in song['ar']],
+                           album=song['al']['name'],
+                           duration=song.get('dt', 0))
     
     def show_songs(self, songs: List[NeteaseSong]):
         table = PrettyTable()
@@ -114,8 +258,12 @@ class NeteaseMusic:
 
     async def close(self):
         """关闭并清理资源"""
-        # 如果有其他需要清理的资源，也在这里处理
-        pass
+        if self._prefetch_task is not None and not self._prefetch_task.done():
+            self._prefetch_task.cancel()
+            await asyncio.gather(self._prefetch_task, return_exceptions=True)
+        if self._session is not None:
+            session, self._session = self._session, None
+            await self.client_pool.close_session(session)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
+import sys
 import json
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Tuple
 from datetime import datetime
 
 def print_json(json_str: str):
@@ -9,20 +10,33 @@ def print_json(json_str: str):
     with open("test.json", "w", encoding="utf-8") as f:
         f.write(json.dumps(json_str, indent=4, ensure_ascii=False))
 
-@dataclass
+def intern_text(text):
+    """驻留字符串：同一艺术家、专辑在整个音乐库中只保留一份"""
+    return sys.intern(text) if isinstance(text, str) else text
+
+@dataclass(frozen=True, slots=True)
 class NeteaseSong:
+    """不可变的歌曲信息。艺术家和专辑名会被驻留，artists 统一保存为元组"""
     id: int
     name: str
-    artists: list[str]
+    artists: Tuple[str, ...]
     album: str
+    duration: int = 0  # 毫秒，未知时为 0
+
+    def __post_init__(self):
+        object.__setattr__(self, 'artists', tuple(intern_text(artist) for artist in self.artists))
+        object.__setattr__(self, 'album', intern_text(self.album))
 
-@dataclass
+@dataclass(slots=True)
 class NeteasePlaylist:
     name: str
     id: int
     creator_id: int
     create_time: int
+    track_count: int = 0  # 网易云返回的歌曲数量，歌曲未加载时也可用
+    update_time: int = 0  # 网易云返回的歌单更新时间 (毫秒)，用于判断本地快照是否过期
     songs: List[NeteaseSong] = field(default_factory=list)
+    songs_loaded: bool = False
 
     def print_playlist(self):
         create_time_human_readable = datetime.fromtimestamp(self.create_time).strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+try:
+    from Apple.apm_utils import AppleSong
+except ImportError:  # 以 src.checkpoint_store 的形式导入时 (例如运行测试)
+    from src.Apple.apm_utils import AppleSong
+
+# 与匹配记录共用数据目录，可通过环境变量 PLAYLIST_CONVERTER_DATA_DIR 修改
+DEFAULT_DATA_DIR = os.environ.get("PLAYLIST_CONVERTER_DATA_DIR", "data")
+
+# 每首歌曲的处理结果
+ENTRY_MATCHED = "matched"
+ENTRY_SKIPPED = "skipped"
+ENTRY_FAILED = "failed"
+ENTRY_IGNORED = "ignored"  # 已处理但不出现在结果中 (例如选择了不在候选列表中的歌曲)
+
+
+def song_ids_digest(song_ids: List[int]) -> str:
+    """歌单歌曲ID序列的摘要，歌单内容或顺序变化后旧的断点不再可用"""
+    return hashlib.sha1(",".join(map(str, song_ids)).encode()).hexdigest()
+
+
+@dataclass
+class ConversionCheckpoint:
+    """
+    一次网页转换的断点。entries 按歌单顺序保存已处理歌曲的结果，
+    第 i 项对应歌单第 i 首歌曲，所以 len(entries) 就是下次继续的位置。
+
+    mode 是请求的写入模式 ("append" 或 "override")；覆盖模式在第一次写入成功前
+    replace_done 为 False，继续时仍然用第一批歌曲替换播放列表原有的歌曲。
+    baseline 是第一次写入前目标播放列表中的目录ID，继续时只把之后新增的歌曲
+    当作本次转换写入的歌曲；为 None 表示未知 (旧版本的断点)。
+    """
+    key: str
+    source_playlist_id: int
+    source_playlist_name: str
+    songs_digest: str
+    total: int
+    target_playlist_id: str = ""
+    entries: List[dict] = field(default_factory=list)
+    mode: str = "append"
+    replace_done: bool = False
+    baseline: Optional[List[str]] = None
+    updated_at: float = 0.0
+
+    @property
+    def processed(self) -> int:
+        return len(self.entries)
+
+    def add(self, status: str, result: Optional[dict] = None, song: Optional[AppleSong] = None):
+        """
+        记录下一首歌曲的处理结果。
+
+        参数:
+            status: ENTRY_MATCHED / ENTRY_SKIPPED / ENTRY_FAILED / ENTRY_IGNORED
+            result: 发给网页的结果条目 (successSongs / skippedSongs / failedSongs 中的一项)
+            song: 匹配到的 Apple Music 歌曲
+        """
+        entry = {"status": status, "result": result}
+        if song is not None:
+            entry["song"] = asdict(song)
+        self.entries.append(entry)
+
+    @staticmethod
+    def song_of(entry: dict) -> Optional[AppleSong]:
+        song = entry.get("song")
+        return AppleSong(**song) if song else None
+
+
+class CheckpointStore:
+    """
+    网页转换的断点 (SQLite)。转换过程中定期保存，服务重启或连接断开后可以从断点继续，
+    不需要重新搜索和重新手动选择已处理的歌曲。转换成功后删除。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversion_checkpoints (
+                key TEXT PRIMARY KEY,
+                source_playlist_id INTEGER NOT NULL,
+                source_playlist_name TEXT NOT NULL,
+                songs_digest TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                target_playlist_id TEXT NOT NULL,
+                processed INTEGER NOT NULL,
+                entries TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """旧版本的表没有写入模式和写入前的快照，补上这几列 (旧断点按追加模式、快照未知继续)"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversion_checkpoints)")}
+        if "mode" not in columns:
+            self._conn.execute("ALTER TABLE conversion_checkpoints ADD COLUMN mode TEXT NOT NULL DEFAULT 'append'")
+        if "replace_done" not in columns:
+            self._conn.execute("ALTER TABLE conversion_checkpoints "
+                               "ADD COLUMN replace_done INTEGER NOT NULL DEFAULT 0")
+        if "baseline" not in columns:
+            self._conn.execute("ALTER TABLE conversion_checkpoints ADD COLUMN baseline TEXT")
+
+    def load(self, key: str) -> Optional[ConversionCheckpoint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, source_playlist_id, source_playlist_name, songs_digest, total, "
+                "target_playlist_id, entries, mode, replace_done, baseline, updated_at "
+                "FROM conversion_checkpoints WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        key, source_id, source_name, digest, total, target_id, entries, mode, replace_done, baseline, updated_at = row
+        return ConversionCheckpoint(key=key, source_playlist_id=source_id, source_playlist_name=source_name,
+                                    songs_digest=digest, total=total, target_playlist_id=target_id,
+                                    entries=json.loads(entries), mode=mode, replace_done=bool(replace_done),
+                                    baseline=json.loads(baseline) if baseline is not None else None,
+                                    updated_at=updated_at)
+
+    def list(self, key_prefix: str) -> List[dict]:
+        """列出键以 key_prefix 开头的断点的进度 (不读取每首歌曲的结果)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_playlist_id, source_playlist_name, target_playlist_id, processed, total, updated_at "
+                "FROM conversion_checkpoints WHERE substr(key, 1, ?) = ? ORDER BY updated_at DESC",
+                (len(key_prefix), key_prefix)
+            ).fetchall()
+        return [{"playlist_id": source_id, "playlist_name": source_name, "target_playlist_id": target_id,
+                 "processed": processed, "total": total, "updated_at": updated_at}
+                for source_id, source_name, target_id, processed, total, updated_at in rows]
+
+    def save(self, checkpoint: ConversionCheckpoint):
+        checkpoint.updated_at = time.time()
+        entries = json.dumps(checkpoint.entries, ensure_ascii=False, separators=(",", ":"))
+        baseline = json.dumps(checkpoint.baseline, separators=(",", ":")) if checkpoint.baseline is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversion_checkpoints "
+                "(key, source_playlist_id, source_playlist_name, songs_digest, total, target_playlist_id, "
+                "processed, entries, mode, replace_done, baseline, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (checkpoint.key, checkpoint.source_playlist_id, checkpoint.source_playlist_name,
+                 checkpoint.songs_digest, checkpoint.total, checkpoint.target_playlist_id,
+                 checkpoint.processed, entries, checkpoint.mode, int(checkpoint.replace_done), baseline,
+                 checkpoint.updated_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM conversion_checkpoints WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[CheckpointStore] = None
+
+
+def get_default_checkpoint_store() -> CheckpointStore:
+    """进程内共享的默认断点存储"""
+    global _default_store
+    if _default_store is None:
+        _default_store = CheckpointStore(os.path.join(DEFAULT_DATA_DIR, "checkpoints.sqlite3"))
+    return _default_store
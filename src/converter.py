@@ -1,7 +1,26 @@
-from Apple import apm
-from Netease import netease
+try:
+    from Apple import apm
+    from Apple.http_pool import close_default_http_pool
+    from Netease import netease
+    from match_store import MatchStore, get_default_match_store, MATCH_SOURCE_AUTO, MATCH_SOURCE_MANUAL
+    from matcher import SongMatcher, normalize_title, normalize_artists
+    from checkpoint_store import (CheckpointStore, ConversionCheckpoint, get_default_checkpoint_store,
+                                  song_ids_digest, ENTRY_MATCHED, ENTRY_SKIPPED, ENTRY_FAILED, ENTRY_IGNORED)
+    import metrics
+    import tracing
+    import jobs
+except ImportError:  # 以 src.converter 的形式导入时 (例如运行测试)
+    from src.Apple import apm
+    from src.Apple.http_pool import close_default_http_pool
+    from src.Netease import netease
+    from src.match_store import MatchStore, get_default_match_store, MATCH_SOURCE_AUTO, MATCH_SOURCE_MANUAL
+    from src.matcher import SongMatcher, normalize_title, normalize_artists
+    from src.checkpoint_store import (CheckpointStore, ConversionCheckpoint, get_default_checkpoint_store,
+                                      song_ids_digest, ENTRY_MATCHED, ENTRY_SKIPPED, ENTRY_FAILED, ENTRY_IGNORED)
+    from src import metrics, tracing, jobs
 
-from typing import Tuple, List, Optional
+from typing import Dict, Tuple, List, Optional
+from collections import Counter
 import json
 import logging
 from prettytable import PrettyTable
@@ -21,9 +40,25 @@ from rich.layout import Layout
 
 import traceback
 import time
+import weakref
 
 console = Console()
 
+# 同时进行中的 Apple Music 搜索请求数量上限
+DEFAULT_SEARCH_CONCURRENCY = 8
+
+# 创建接口没有返回播放列表时，轮询资料库的次数和初始间隔 (秒，每次翻倍)
+PLAYLIST_POLL_ATTEMPTS = 5
+PLAYLIST_POLL_BASE_DELAY = 0.5
+
+# 网页转换保存断点的间隔：每处理这么多首歌曲或经过这么多秒保存一次，手动选择后立即保存
+CHECKPOINT_INTERVAL_SONGS = 100
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+
+# 正在进行的转换的写入队列，用于统计等待写入的歌曲数
+_write_queues: "weakref.WeakSet[asyncio.Queue]" = weakref.WeakSet()
+metrics.WRITE_QUEUE_DEPTH.set_function(lambda: sum(queue.qsize() for queue in _write_queues))
+
 def get_choice(prompt: str, max_choice: int, allow_empty: bool = True):
     def is_choice_valid(choice: str, max_choice: int):
         if choice == "" and allow_empty:
@@ -66,9 +101,17 @@ def print_song_list(song_list: list[apm.AppleSong]):
 
 # 从网易云音乐搜索歌曲并匹配到Apple Music
 class Converter:
-    def __init__(self, netease_music: netease.NeteaseMusic, apple_music: apm.AppleMusic):
+    def __init__(self, netease_music: netease.NeteaseMusic, apple_music: apm.AppleMusic,
+                 search_concurrency: int = DEFAULT_SEARCH_CONCURRENCY,
+                 match_store: MatchStore = None,
+                 matcher: SongMatcher = None,
+                 checkpoint_store: CheckpointStore = None):
         self.netease_music: netease.NeteaseMusic = netease_music
         self.apple_music: apm.AppleMusic = apple_music
+        self.search_concurrency = max(1, search_concurrency)
+        self.match_store: MatchStore = match_store or get_default_match_store()
+        self.matcher: SongMatcher = matcher or SongMatcher()
+        self.checkpoint_store: CheckpointStore = checkpoint_store or get_default_checkpoint_store()
 
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.setLevel(logging.INFO)
@@ -99,6 +142,11 @@ class Converter:
         返回:
             Tuple[bool, list[AppleSong]]: (是否完全匹配, 匹配结果列表)
         """
+        # 之前已经匹配过的歌曲直接使用记录，不再搜索
+        known = self.match_store.get(from_song.id, self.apple_music.storefront)
+        if known is not None:
+            return True, [known.song]
+
         song_name = from_song.name
         song_artist = from_song.artists[0]
         song_album = from_song.album
@@ -108,26 +156,29 @@ class Converter:
         # if results is []
         if not results:
             return False, []
+
+        # 为所有候选打分，达到自动接受阈值的直接匹配，其余按分数排序交给手动选择
+        ranked = self.matcher.score(from_song, results)
+        accepted, candidates = self.matcher.classify(ranked)
+        if accepted:
+            self.remember_match(from_song, candidates[0].song, MATCH_SOURCE_AUTO, candidates[0].score)
+        return accepted, [candidate.song for candidate in candidates]
+
+    def remember_match(self, from_song: netease.NeteaseSong, apple_song: apm.AppleSong,
+                       source: str, confidence: float = 1.0):
+        """
+        记录网易云歌曲与 Apple Music 歌曲的匹配结果，之后转换时直接复用。
         
-        match_list = []
-
-        for apm_song in results:
-            # if name, album, artist, 2 out of 3 are the same, then we consider it as the same song
-            match_count = 0
-            if apm_song.name == song_name:
-                match_count += 1
-            if apm_song.artist == song_artist:
-                match_count += 1
-            if apm_song.album == song_album:
-                match_count += 1
-
-            if match_count >= 2:
-                match_list.append(apm_song)
-            
-        if not match_list:
-            return False, results
-        else:
-            return True, match_list
+        参数:
+            from_song (NeteaseSong): 网易云音乐歌曲
+            apple_song (AppleSong): 选中的 Apple Music 歌曲
+            source (str): 匹配来源，MATCH_SOURCE_AUTO 或 MATCH_SOURCE_MANUAL
+            confidence (float): 匹配置信度 (0~1)
+        """
+        try:
+            self.match_store.put(from_song.id, self.apple_music.storefront, apple_song, source, confidence)
+        except Exception as e:
+            self.logger.warning(f"保存匹配记录失败: {from_song.name}: {str(e)}")
     
 
     async def convert_play_list(self, from_playlist: netease.NeteasePlaylist, 
@@ -167,29 +218,46 @@ class Converter:
             return new_playlist.name, new_playlist
         
         new_playlist_name = get_text_input("请输入新播放列表的名称: ")
-        # 记录创建前的播放列表数量
-        await self.apple_music.retrive_playlists()
-        original_playlist_count = len(self.apple_music.playlists)
-        
-        await self.apple_music.new_playlist(new_playlist_name)
+        playlist = await self._create_playlist(new_playlist_name)
+        return new_playlist_name, playlist
+
+    async def _create_playlist(self, playlist_name: str) -> apm.ApplePlaylist:
+        """
+        创建新的 Apple Music 播放列表。
+
+        优先使用创建接口返回的播放列表；接口没有返回时才轮询资料库，按指数退避等待，
+        并且只接受创建前不存在的同名播放列表。创建前先读取一次资料库作为快照
+        (self.apple_music.playlists 在网页转换中没有加载过，不能作为快照)，
+        读取失败时不按名称查找，避免写入用户已有的同名播放列表。
+
+        参数:
+            playlist_name: str - 新播放列表的名称
+
+        返回:
+            ApplePlaylist: 新创建的播放列表对象
+        """
+        try:
+            known_ids = {playlist.id async for playlist in self.apple_music.iter_playlists()}
+        except Exception as e:
+            self.logger.warning(f"读取资料库播放列表失败，创建失败时不按名称查找: {str(e)}")
+            known_ids = None
+
+        playlist = await self.apple_music.new_playlist(playlist_name)
+        if playlist is not None:
+            self.logger.info(f"创建新播放列表: {playlist_name}, ID: {playlist.id}")
+            return playlist
+        if known_ids is None:
+            raise Exception(f"创建播放列表失败: {playlist_name}")
 
-        # 添加重试逻辑和超时保护
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries:
+        for attempt in range(PLAYLIST_POLL_ATTEMPTS):
+            await asyncio.sleep(PLAYLIST_POLL_BASE_DELAY * (2 ** attempt))
             await self.apple_music.retrive_playlists()
-            # 检查是否有新的播放列表被创建
-            if len(self.apple_music.playlists) > original_playlist_count:
-                # 遍历所有播放列表找到新创建的
-                for playlist in self.apple_music.playlists:
-                    if playlist.name == new_playlist_name:
-                        self.logger.info(f"创建新播放列表: {new_playlist_name}, ID: {playlist.id}")
-                        return new_playlist_name, playlist
-            
-            retry_count += 1
-            await asyncio.sleep(2)  # 添加短暂延迟
-        
-        raise Exception(f"创建播放列表失败: {new_playlist_name}")
+            for playlist in self.apple_music.playlists:
+                if playlist.name == playlist_name and playlist.id not in known_ids:
+                    self.logger.info(f"创建新播放列表: {playlist_name}, ID: {playlist.id}")
+                    return playlist
+
+        raise Exception(f"创建播放列表失败: {playlist_name}")
 
     async def _process_playlist_conversion(self, 
                                         from_playlist: netease.NeteasePlaylist, 
@@ -232,28 +300,132 @@ class Converter:
                               songs: List[netease.NeteaseSong],
                               progress_callback = None) -> List[Tuple[int, netease.NeteaseSong, bool, List[apm.AppleSong]]]:
         """
-        异步搜索所有歌曲并显示进度。
+        并发搜索所有歌曲并显示进度，结果保持歌单顺序。
+        单首歌曲搜索出错 (例如重试后仍被限流) 不影响其他歌曲，它的匹配列表为 None。
         """
-        results = []
         total = len(songs)
-        
-        for i, song in enumerate(songs):
+        completed = 0
+        search_tasks = self._schedule_searches(songs)
+
+        async def collect(i: int, song: netease.NeteaseSong):
+            nonlocal completed
+            try:
+                success, match_list = await search_tasks[i]
+            except Exception as e:
+                self.logger.error(f"搜索歌曲出错: {song.name}: {str(e)}")
+                metrics.SONGS_PROCESSED.inc(result="failed")
+                success, match_list = False, None
+            completed += 1
             if progress_callback:
-                progress = int((i / total) * 100)
                 song_info = {
                     "name": song.name,
                     "artist": song.artists[0],
                     "album": song.album
                 }
-                await progress_callback(progress, song_info)
-                
-            success, match_list = await self.search_song_in_apm(song)
-            results.append((i, song, success, match_list))
+                await progress_callback(int((completed / total) * 100), song_info)
+            return i, song, success, match_list
+
+        try:
+            results = await asyncio.gather(*(collect(i, song) for i, song in enumerate(songs)))
+        finally:
+            await self._cancel_tasks(search_tasks)
 
         if progress_callback:
             await progress_callback(100, {"name": "完成", "artist": "", "album": ""})
 
-        return sorted(results, key=lambda x: x[0])
+        return list(results)
+
+    def _schedule_searches(self, songs: List[netease.NeteaseSong]) -> List[asyncio.Task]:
+        """
+        为每首歌曲创建搜索任务，同时进行中的搜索不超过 search_concurrency 个。
+        
+        同一专辑 (且第一艺术家相同) 的多首歌曲只搜索其中第一首，匹配成功后获取一次
+        该 Apple Music 专辑的曲目，其余歌曲在本地与曲目列表匹配；本地匹配不上的再单独搜索。
+        
+        参数:
+            songs (List[NeteaseSong]): 要搜索的歌曲
+            
+        返回:
+            List[asyncio.Task]: 与 songs 一一对应的搜索任务，结果为 search_song_in_apm 的返回值
+        """
+        semaphore = asyncio.Semaphore(self.search_concurrency)
+        leaders = self._plan_album_groups(songs)
+
+        async def search_with_limit(song: netease.NeteaseSong):
+            async with semaphore:
+                with tracing.span("search", song=song.name):
+                    return await self.search_song_in_apm(song)
+
+        async def search_sibling(song: netease.NeteaseSong, leader_task: asyncio.Task):
+            known = self.match_store.get(song.id, self.apple_music.storefront)
+            if known is not None:
+                return True, [known.song]
+            try:
+                # shield: 当前任务被取消时不影响同组其他歌曲等待的首曲搜索
+                leader_success, leader_matches = await asyncio.shield(leader_task)
+            except Exception:
+                leader_success, leader_matches = False, []
+
+            album_id = leader_matches[0].album_id if leader_success else ""
+            if album_id:
+                async with semaphore:
+                    with tracing.span("album_match", song=song.name, album_id=album_id):
+                        album_songs = await self.apple_music.get_album_songs(album_id)
+                accepted, candidates = self.matcher.classify(self.matcher.score(song, album_songs))
+                if accepted:
+                    self.remember_match(song, candidates[0].song, MATCH_SOURCE_AUTO, candidates[0].score)
+                    return True, [candidate.song for candidate in candidates]
+
+            return await search_with_limit(song)
+
+        tasks = []
+        for i, song in enumerate(songs):
+            leader = leaders.get(i, i)
+            if leader == i:
+                tasks.append(asyncio.create_task(search_with_limit(song), name=f"search-{i}"))
+            else:
+                tasks.append(asyncio.create_task(search_sibling(song, tasks[leader]), name=f"search-{i}"))
+        return tasks
+
+    @staticmethod
+    def _plan_album_groups(songs: List[netease.NeteaseSong]) -> Dict[int, int]:
+        """
+        按 (专辑, 第一艺术家) 将歌曲分组。
+        
+        返回:
+            Dict[int, int]: 歌曲下标 -> 同组第一首歌曲的下标，只包含多于一首歌曲的组
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, song in enumerate(songs):
+            album = normalize_title(song.album).core
+            if not album or not song.artists:
+                continue
+            groups.setdefault((album, normalize_artists(song.artists[0]).core), []).append(i)
+
+        leaders = {}
+        for indices in groups.values():
+            if len(indices) > 1:
+                for i in indices:
+                    leaders[i] = indices[0]
+        return leaders
+
+    @staticmethod
+    async def _iter_queue(queue: asyncio.Queue):
+        """逐个取出队列中的元素，遇到 None 结束"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            yield item
+
+    @staticmethod
+    async def _cancel_tasks(tasks: List[asyncio.Task]):
+        """取消尚未完成的任务，并回收所有任务的异常，避免未处理异常的警告。"""
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     def _process_search_results(self, 
                               search_results: List[Tuple[int, netease.NeteaseSong, bool, List[apm.AppleSong]]], 
@@ -262,7 +434,7 @@ class Converter:
         处理搜索结果，将自动匹配和需要手动选择的歌曲分开。
         
         参数:
-            search_results (List[Tuple]): 歌曲搜索结果
+            search_results (List[Tuple]): 歌曲搜索结果，匹配列表为 None 的歌曲搜索失败，不进入手动选择
             skip (bool): 是否跳过需要手动选择的歌曲
             
         返回:
@@ -275,6 +447,8 @@ class Converter:
             if success:
                 self.logger.info(f"找到歌曲: {original_song.name}")
                 song_results[idx] = match_list[0]
+            elif match_list is None:
+                self.logger.error(f"搜索失败，跳过: {original_song.name}")
             elif not match_list:
                 self.logger.warning(f"未找到匹配: {original_song.name}")
                 if not skip:
@@ -387,6 +561,9 @@ class Converter:
         else:
             song_results[idx] = await self._handle_manual_search(choice_prompt)
 
+        if song_results[idx] is not None:
+            self.remember_match(original_song, song_results[idx], MATCH_SOURCE_MANUAL)
+
     async def _finalize_playlist(self, playlist: apm.ApplePlaylist, songs: List[apm.AppleSong]):
         """
         完成播放列表创建，显示结果并添加歌曲。
@@ -461,11 +638,9 @@ class Converter:
         返回:
             ApplePlaylist: 目标播放列表对象
         """
-        # 获取现有播放列表
-        await self.apple_music.retrive_playlists()
-        
         # 如果提供了目标播放列表ID，尝试查找现有播放列表
         if target_playlist_id:
+            await self.apple_music.retrive_playlists()
             for playlist in self.apple_music.playlists:
                 if playlist.id == target_playlist_id:
                     self.logger.info(f"找到目标播放列表: {playlist.name}, ID: {playlist.id}")
@@ -475,21 +650,7 @@ class Converter:
         # 如果没有提供ID，创建新播放列表
         playlist_name = target_playlist_name or f"网易云导入_{int(time.time())}"
         self.logger.info(f"创建新播放列表: {playlist_name}")
-        await self.apple_music.new_playlist(playlist_name)
-        
-        # 等待歌单创建完成
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries:
-            await self.apple_music.retrive_playlists()
-            for playlist in self.apple_music.playlists:
-                if playlist.name == playlist_name:
-                    self.logger.info(f"创建新播放列表成功: {playlist_name}, ID: {playlist.id}")
-                    return playlist
-            retry_count += 1
-            await asyncio.sleep(2)
-        
-        raise Exception(f"创建播放列表失败: {playlist_name}")
+        return await self._create_playlist(playlist_name)
 
     async def convert_play_list_web(self, source_playlist: netease.NeteasePlaylist, 
                                     progress_callback=None, 
@@ -497,9 +658,13 @@ class Converter:
                                     manual_selection_callback=None, 
                                     manual_selection_queue=None, 
                                     target_playlist_id=None, 
-                                    target_playlist_name=None, mode="append"):
+                                    target_playlist_name=None, mode="append",
+                                    checkpoint_key: str = None, resume: bool = False):
         """
         网页版歌单转换方法
+        checkpoint_key: 断点的键，不为空时定期把已处理歌曲的结果和目标播放列表保存到断点存储，转换成功后删除
+        resume: 为 True 且存在可用的断点时，沿用断点的目标播放列表和写入模式，从第一首未处理的歌曲继续，
+                已选择但还不在播放列表中的歌曲重新写入；覆盖模式在第一次写入成功前中断的，继续时仍然替换原有歌曲
         progress_callback: 进度回调函数, 参数1： progress: int, 参数2： current_song: dict, 参数3： result: dict = None
         current_song: {"name": str, "artist": str, "album": str}
         
@@ -516,11 +681,39 @@ class Converter:
         skipped_match: {name: str, artist: str, album: str}
         failed_match: {name: str, artist: str, album: str, reason: str}
         """
+        search_tasks = []
+        writer_task = None
+        live_write_report = None
+        checkpoint = None
+        started = time.monotonic()
+
+        def sync_replace_done():
+            # 覆盖模式的第一批写入成功后，继续时改为追加
+            if checkpoint.mode == "override" and live_write_report is not None and live_write_report.written:
+                checkpoint.replace_done = True
+
+        status = "failed"
+        metrics.ACTIVE_CONVERSIONS.inc()
         try:
             # 获取播放列表中的歌曲
-            await self.netease_music.get_songs(source_playlist)
+            with tracing.span("netease.get_songs", playlist=source_playlist.name):
+                await self.netease_music.get_songs(source_playlist)
             total_songs = len(source_playlist.songs)
             self.logger.info(f"找到播放列表: {source_playlist.name}, 包含 {total_songs} 首歌曲")
+
+            digest = song_ids_digest([song.id for song in source_playlist.songs])
+            checkpoint = None
+            if checkpoint_key and resume:
+                checkpoint = self.checkpoint_store.load(checkpoint_key)
+                if checkpoint is not None and (checkpoint.songs_digest != digest or not checkpoint.target_playlist_id):
+                    self.logger.warning(f"歌单 {source_playlist.name} 已变化，断点失效，从头开始转换")
+                    checkpoint = None
+            resumed = checkpoint is not None
+            if checkpoint is None:
+                checkpoint = ConversionCheckpoint(key=checkpoint_key or "", source_playlist_id=source_playlist.id,
+                                                  source_playlist_name=source_playlist.name,
+                                                  songs_digest=digest, total=total_songs)
+            start = checkpoint.processed
             
             # 发送初始进度状态
             if progress_callback:
@@ -533,28 +726,158 @@ class Converter:
                     },
                     {   # result
                         "type": "progress",
-                        "message": f"开始转换播放列表: {source_playlist.name}, 共 {total_songs} 首歌曲"
+                        "message": f"从第 {start + 1} 首继续转换播放列表: {source_playlist.name}, 共 {total_songs} 首歌曲"
+                        if resumed else f"开始转换播放列表: {source_playlist.name}, 共 {total_songs} 首歌曲"
                     }
                 )
 
-            self.logger.info("开始转换播放列表...")
+            self.logger.info(f"从断点继续转换播放列表, 已处理 {start} 首..." if resumed else "开始转换播放列表...")
+
+            # 先在后台并发搜索所有未处理的歌曲，下面按歌单顺序逐首取结果
+            search_tasks = self._schedule_searches(source_playlist.songs[start:])
             
-            # 设置目标播放列表
-            target_playlist = await self._setup_target_playlist_web(
-                target_playlist_id=target_playlist_id,
-                target_playlist_name=target_playlist_name
-            )
+            # 设置目标播放列表；继续转换时沿用断点中的播放列表和写入模式
+            with tracing.span("setup_target_playlist"):
+                if resumed:
+                    target_playlist = await self._setup_target_playlist_web(
+                        target_playlist_id=checkpoint.target_playlist_id
+                    )
+                    mode = checkpoint.mode
+                else:
+                    target_playlist = await self._setup_target_playlist_web(
+                        target_playlist_id=target_playlist_id,
+                        target_playlist_name=target_playlist_name
+                    )
+                    checkpoint.target_playlist_id = target_playlist.id
+                    checkpoint.mode = mode
+
+            # 第一次写入前播放列表中的目录ID，验证时只比对之后新增的歌曲；覆盖模式和新建的播放列表为空
+            if mode == "override" or (not resumed and not target_playlist_id):
+                baseline = []
+            elif resumed:
+                baseline = checkpoint.baseline
+            else:
+                with tracing.span("snapshot_target_playlist"):
+                    baseline = await self.apple_music.get_playlist_catalog_ids(target_playlist.id)
+            checkpoint.baseline = baseline
+            # 覆盖模式在第一批歌曲写入成功前一直替换原有歌曲
+            replace = mode == "override" and not checkpoint.replace_done
 
             converted_count = 0
             skip_count = 0
             error_count = 0
             selected_songs = []
+            selected_sources = []
             
             success_songs = []
             skipped_songs = []
             failed_songs = []
 
-            for song in source_playlist.songs:
+            # 恢复断点中已处理歌曲的结果
+            for song, entry in zip(source_playlist.songs, checkpoint.entries):
+                if entry["status"] == ENTRY_MATCHED:
+                    selected_songs.append(checkpoint.song_of(entry))
+                    selected_sources.append((song, entry["result"]))
+                    success_songs.append(entry["result"])
+                elif entry["status"] == ENTRY_SKIPPED:
+                    skip_count += 1
+                    skipped_songs.append(entry["result"])
+                elif entry["status"] == ENTRY_FAILED:
+                    error_count += 1
+                    failed_songs.append(entry["result"])
+                    continue
+                converted_count += 1
+
+            # 与写入队列一一对应的来源 (网易云歌曲, 结果条目)，写入失败时按下标找回来源
+            queued_sources = []
+            requeue = []
+            # 写入任务判断失败的批次是否已经写入时使用的快照
+            write_baseline = baseline
+            if resumed and selected_songs:
+                if replace:
+                    # 覆盖模式还没有写入成功过，播放列表中仍是原有歌曲，已选择的歌曲全部重新写入
+                    requeue = list(zip(selected_songs, selected_sources))
+                else:
+                    # 已选择的歌曲中，按目录ID (重复歌曲按次数) 不在本次转换新增的歌曲中的重新写入
+                    write_baseline = await self.apple_music.get_playlist_catalog_ids(target_playlist.id)
+                    present = Counter(write_baseline) - Counter(baseline or [])
+                    for selected_song, source in zip(selected_songs, selected_sources):
+                        if present[selected_song.id] > 0:
+                            present[selected_song.id] -= 1
+                        else:
+                            requeue.append((selected_song, source))
+
+            # 匹配到的歌曲边转换边分批写入目标播放列表
+            write_queue: asyncio.Queue = asyncio.Queue()
+            _write_queues.add(write_queue)
+            live_write_report = apm.PlaylistWriteReport()  # 写入过程中读取，用于记录覆盖是否已完成
+            writer_task = asyncio.create_task(self.apple_music.write_songs(
+                target_playlist.id,
+                self._iter_queue(write_queue),
+                replace=replace,
+                baseline=write_baseline,
+                report=live_write_report
+            ), name="playlist-writer")
+
+            async def enqueue(selected_song: apm.AppleSong, source: Tuple[netease.NeteaseSong, dict]):
+                queued_sources.append(source)
+                await write_queue.put(selected_song)
+
+            for selected_song, source in requeue:
+                await enqueue(selected_song, source)
+
+            last_saved_index = start
+            last_saved_at = time.monotonic()
+            save_now = not resumed
+
+            def save_checkpoint():
+                nonlocal last_saved_index, last_saved_at
+                sync_replace_done()
+                if checkpoint_key:
+                    self.checkpoint_store.save(checkpoint)
+                last_saved_index = checkpoint.processed
+                last_saved_at = time.monotonic()
+
+            async def select(song: netease.NeteaseSong, selected_song: apm.AppleSong):
+                success_entry = {
+                    "originalName": song.name,
+                    "originalArtist": ", ".join(song.artists),
+                    "matchedName": selected_song.name,
+                    "matchedArtist": selected_song.artist,
+                    "matchedAlbum": selected_song.album
+                }
+                selected_songs.append(selected_song)
+                selected_sources.append((song, success_entry))
+                success_songs.append(success_entry)
+                checkpoint.add(ENTRY_MATCHED, success_entry, selected_song)
+                await enqueue(selected_song, (song, success_entry))
+
+            def skip(song: netease.NeteaseSong):
+                skipped_entry = {
+                    "name": song.name,
+                    "artist": ", ".join(song.artists),
+                    "album": song.album
+                }
+                skipped_songs.append(skipped_entry)
+                checkpoint.add(ENTRY_SKIPPED, skipped_entry)
+
+            def fail(index: int, song: netease.NeteaseSong, reason: str):
+                failed_entry = {
+                    "name": song.name,
+                    "artist": ", ".join(song.artists),
+                    "album": song.album,
+                    "reason": reason
+                }
+                failed_songs.append(failed_entry)
+                # 歌曲已记录结果后才出错时 (例如进度回调失败) 不重复记录
+                if checkpoint.processed == index:
+                    checkpoint.add(ENTRY_FAILED, failed_entry)
+
+            for index, song in enumerate(source_playlist.songs[start:], start=start):
+                if save_now or index - last_saved_index >= CHECKPOINT_INTERVAL_SONGS \
+                        or time.monotonic() - last_saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+                    save_checkpoint()
+                    save_now = False
                 try:
                     # 更新当前处理的歌曲信息
                     if progress_callback:
@@ -571,13 +894,15 @@ class Converter:
                             }
                         )
 
-                    # 搜索歌曲并检查匹配度
-                    success, matches = await self.search_song_in_apm(song)
+                    # 等待该歌曲的搜索结果并检查匹配度
+                    with tracing.span("wait_search", index=index):
+                        success, matches = await search_tasks[index - start]
                     
                     if success:  # 找到匹配度足够高的歌曲
                         self.logger.info(f"找到匹配歌曲: {song.name}")
                         selected_song = matches[0]  # 自动选择第一个匹配度高的歌曲
-                        selected_songs.append(selected_song)
+                        await select(song, selected_song)
+                        metrics.SONGS_PROCESSED.inc(result="auto")
                         if progress_callback:
                             await progress_callback(
                                 int((converted_count / total_songs) * 100),
@@ -597,13 +922,6 @@ class Converter:
                                 }
                             )
                         converted_count += 1
-                        success_songs.append({
-                            "originalName": song.name,
-                            "originalArtist": ", ".join(song.artists),
-                            "matchedName": selected_song.name,
-                            "matchedArtist": selected_song.artist,
-                            "matchedAlbum": selected_song.album
-                        })
                         continue
 
                     # 如果没有找到匹配度足够高的歌曲，但有搜索结果
@@ -622,8 +940,12 @@ class Converter:
                             } for m in matches]
                             await manual_selection_callback(song_info, send_matches)
                             
-                            # 等待用户选择
-                            selected_id = await manual_selection_queue.get()
+                            # 等待用户选择，等待期间不占用后台任务的并发名额
+                            with metrics.MANUAL_SELECTION_WAIT.time(), tracing.span("manual_selection", song=song.name):
+                                async with jobs.waiting_for_input():
+                                    selected_id = await manual_selection_queue.get()
+                            # 手动选择的结果在处理下一首歌曲前保存
+                            save_now = True
                             
                             if selected_id is None:  # 用户选择跳过
                                 if progress_callback:
@@ -640,17 +962,16 @@ class Converter:
                                         }
                                     )
                                 skip_count += 1
-                                skipped_songs.append({
-                                    "name": song.name,
-                                    "artist": ", ".join(song.artists),
-                                    "album": song.album
-                                })
+                                metrics.SONGS_PROCESSED.inc(result="skipped")
+                                skip(song)
                                 continue
                             
                             # 用户选择了一个匹配
                             selected_song = next((s for s in matches if s.id == selected_id), None)
                             if selected_song:
-                                selected_songs.append(selected_song)
+                                self.remember_match(song, selected_song, MATCH_SOURCE_MANUAL)
+                                await select(song, selected_song)
+                                metrics.SONGS_PROCESSED.inc(result="manual")
                                 if progress_callback:
                                     await progress_callback(
                                         int((converted_count / total_songs) * 100),
@@ -670,13 +991,10 @@ class Converter:
                                         }
                                     )
                                 converted_count += 1
-                                success_songs.append({
-                                    "originalName": song.name,
-                                    "originalArtist": ", ".join(song.artists),
-                                    "matchedName": selected_song.name,
-                                    "matchedArtist": selected_song.artist,
-                                    "matchedAlbum": selected_song.album
-                                })
+                            else:
+                                checkpoint.add(ENTRY_IGNORED)
+                        else:
+                            checkpoint.add(ENTRY_IGNORED)
                     else:
                         self.logger.warning(f"未找到匹配的歌曲: {song.name} - {', '.join(song.artists)}")
                         if progress_callback:
@@ -693,11 +1011,8 @@ class Converter:
                                 }
                             )
                         skip_count += 1
-                        skipped_songs.append({
-                            "name": song.name,
-                            "artist": ", ".join(song.artists),
-                            "album": song.album
-                        })
+                        metrics.SONGS_PROCESSED.inc(result="skipped")
+                        skip(song)
                     converted_count += 1
 
                 except asyncio.TimeoutError:
@@ -716,12 +1031,8 @@ class Converter:
                             }
                         )
                     error_count += 1
-                    failed_songs.append({
-                        "name": song.name,
-                        "artist": ", ".join(song.artists),
-                        "album": song.album,
-                        "reason": "搜索超时"
-                    })
+                    metrics.SONGS_PROCESSED.inc(result="failed")
+                    fail(index, song, "搜索超时")
                     continue
                 except Exception as e:
                     self.logger.error(f"搜索歌曲出错: {str(e)}\n{traceback.format_exc()}")
@@ -739,21 +1050,39 @@ class Converter:
                             }
                         )
                     error_count += 1
-                    failed_songs.append({
-                        "name": song.name,
-                        "artist": ", ".join(song.artists),
-                        "album": song.album,
-                        "reason": str(e)
-                    })
+                    metrics.SONGS_PROCESSED.inc(result="failed")
+                    fail(index, song, str(e))
                     continue
 
-            # 批量添加歌曲到播放列表
+            save_checkpoint()
+            # 通知写入任务歌曲已全部产生，等待剩余批次写完
+            await write_queue.put(None)
             if selected_songs:
                 try:
-                    if mode == "override":
-                        await self.apple_music.replace_songs_to_playlist(target_playlist, selected_songs)
-                    else:  # append mode
-                        await self.apple_music.add_songs_to_playlist(target_playlist.id, selected_songs)
+                    with tracing.span("write_drain"):
+                        write_report = await writer_task
+                    # 按目录ID核对播放列表，写入失败的歌曲会在验证时重新提交
+                    with tracing.span("verify", songs=len(selected_songs)):
+                        verify_report = await self.apple_music.verify_playlist_songs(target_playlist.id, selected_songs,
+                                                                                     baseline=baseline)
+                    self.logger.info(f"播放列表验证: {verify_report.present}/{verify_report.expected} 首已写入, "
+                                     f"重新提交 {verify_report.resubmitted} 首, 检查 {verify_report.attempts} 次")
+                    # 按下标找回未写入歌曲的来源；匹配到同一首 Apple Music 歌曲的不同来源各自计算
+                    if verify_report.checked:
+                        unwritten = [selected_sources[i] for i in verify_report.missing_indices]
+                    else:
+                        unwritten = [queued_sources[i] for i in write_report.failed_indices]
+                    if unwritten:
+                        for song, success_entry in unwritten:
+                            success_songs.remove(success_entry)
+                            failed_songs.append({
+                                "name": song.name,
+                                "artist": ", ".join(song.artists),
+                                "album": song.album,
+                                "reason": "写入播放列表失败"
+                            })
+                        metrics.SONGS_WRITE_FAILED.inc(len(unwritten))
+                        self.logger.error(f"{len(unwritten)} 首歌曲写入播放列表失败")
                     
                     # 发送完成进度
                     if progress_callback:
@@ -766,7 +1095,7 @@ class Converter:
                             },
                             {
                                 "type": "progress",
-                                "message": f"成功添加 {len(selected_songs)} 首歌曲到播放列表"
+                                "message": f"成功添加 {len(selected_songs) - len(unwritten)} 首歌曲到播放列表"
                             }
                         )
                     
@@ -777,10 +1106,11 @@ class Converter:
                         failed_songs
                     )
                     
+                    status = "success"
                     return {
                         "status": "success",
                         "playlist_id": target_playlist.id,
-                        "added_count": len(selected_songs)
+                        "added_count": len(selected_songs) - len(unwritten)
                     }
                 except Exception as e:
                     self.logger.error(f"添加歌曲到播放列表失败: {str(e)}")
@@ -812,7 +1142,11 @@ class Converter:
                             "message": "没有找到任何匹配的歌曲"
                         }
                     )
+                status = "empty"
                 return {"error": "没有找到任何匹配的歌曲"}
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
         except Exception as e:
             self.logger.error(f"转换播放列表失败: {str(e)}\n{traceback.format_exc()}")
             if progress_callback:
@@ -829,6 +1163,245 @@ class Converter:
                     }
                 )
             return {"error": f"转换播放列表失败: {str(e)}"}
+        finally:
+            await self._cancel_tasks(search_tasks)
+            if writer_task is not None:
+                await self._cancel_tasks([writer_task])
+            if checkpoint_key and checkpoint is not None and checkpoint.target_playlist_id:
+                # 成功或没有可写入的歌曲时不再需要断点；失败或取消时保存进度，之后可以继续
+                if status in ("success", "empty"):
+                    self.checkpoint_store.delete(checkpoint_key)
+                else:
+                    sync_replace_done()
+                    self.checkpoint_store.save(checkpoint)
+            metrics.ACTIVE_CONVERSIONS.dec()
+            metrics.CONVERSIONS.inc(status=status)
+            metrics.CONVERSION_DURATION.observe(time.monotonic() - started)
+
+    @staticmethod
+    def _unique_songs(playlists: List[netease.NeteasePlaylist]) -> List[netease.NeteaseSong]:
+        """所有歌单中的歌曲按歌曲ID去重，保持第一次出现的顺序"""
+        unique: Dict[int, netease.NeteaseSong] = {}
+        for playlist in playlists:
+            for song in playlist.songs:
+                unique.setdefault(song.id, song)
+        return list(unique.values())
+
+    async def convert_library_web(self, source_playlists: List[netease.NeteasePlaylist],
+                                  progress_callback=None,
+                                  completed_callback=None,
+                                  manual_selection_callback=None,
+                                  manual_selection_queue=None,
+                                  target_name_prefix: str = ""):
+        """
+        网页版批量转换多个歌单 (例如全部创建的歌单)。
+
+        先把所有歌单的歌曲按歌曲ID去重，每首歌曲只搜索一次、只手动选择一次，
+        然后为每个歌单新建一个 Apple Music 播放列表并按原顺序写入，
+        同一首歌曲在所有歌单中使用同一个匹配结果。
+
+        target_name_prefix: 新建播放列表名称的前缀，名称为 前缀 + 网易云歌单名
+        progress_callback / manual_selection_callback / completed_callback 与 convert_play_list_web 相同，
+        completed_callback 中每首歌曲 (按歌曲ID) 恰好出现在成功、跳过、失败中的一个列表里：
+        写入任一歌单失败的歌曲记为失败 (原因列出这些歌单)，没有 manual_selection_callback 时
+        需要手动选择的歌曲也记为失败
+
+        返回:
+            dict: {"status": "success", "total_songs": int, "unique_songs": int,
+                   "playlists": [{"source_playlist_id", "name", "playlist_id", "added_count"}]}
+        """
+        search_tasks = []
+        started = time.monotonic()
+        status = "failed"
+        metrics.ACTIVE_CONVERSIONS.inc()
+        try:
+            # 并发获取所有歌单的歌曲 (网易云会话池限制同时进行的请求数)
+            with tracing.span("netease.get_songs", playlists=len(source_playlists)):
+                await asyncio.gather(*(self.netease_music.get_songs(playlist) for playlist in source_playlists))
+            total_songs = sum(len(playlist.songs) for playlist in source_playlists)
+            unique_songs = self._unique_songs(source_playlists)
+            self.logger.info(f"批量转换 {len(source_playlists)} 个歌单, 共 {total_songs} 首歌曲, "
+                             f"去重后 {len(unique_songs)} 首")
+
+            async def report(progress: int, song: Optional[netease.NeteaseSong], message: str,
+                             matched_song: Optional[apm.AppleSong] = None):
+                if not progress_callback:
+                    return
+                current_song = {"name": song.name, "artist": ", ".join(song.artists), "album": song.album} \
+                    if song is not None else {"name": message, "artist": "", "album": ""}
+                result = {"type": "progress", "message": message}
+                if matched_song is not None:
+                    result["matched_song"] = {
+                        "name": matched_song.name,
+                        "artist": matched_song.artist,
+                        "album": matched_song.album
+                    }
+                await progress_callback(progress, current_song, result)
+
+            await report(0, None, f"开始转换 {len(source_playlists)} 个歌单, 共 {total_songs} 首歌曲, "
+                                  f"去重后需要匹配 {len(unique_songs)} 首")
+
+            # 每首不重复的歌曲只搜索一次；匹配阶段占总进度的 90%，写入阶段占剩余的 10%
+            search_tasks = self._schedule_searches(unique_songs)
+            # 每首歌曲的结果只记录一处：匹配到的在 decisions，出错的在 failed_reasons，其余都算跳过
+            decisions: Dict[int, apm.AppleSong] = {}
+            failed_reasons: Dict[int, str] = {}
+            # 写入失败的歌曲ID -> 写入失败的歌单名
+            write_failures: Dict[int, List[str]] = {}
+
+            def song_entry(song: netease.NeteaseSong) -> dict:
+                return {"name": song.name, "artist": ", ".join(song.artists), "album": song.album}
+
+            for index, song in enumerate(unique_songs):
+                progress = int(index / len(unique_songs) * 90)
+                try:
+                    await report(progress, song, "正在搜索匹配歌曲...")
+                    with tracing.span("wait_search", index=index):
+                        success, matches = await search_tasks[index]
+
+                    if success:
+                        self.logger.info(f"找到匹配歌曲: {song.name}")
+                        decisions[song.id] = matches[0]
+                        await report(progress, song, "找到匹配歌曲", matches[0])
+                        metrics.SONGS_PROCESSED.inc(result="auto")
+                    elif not matches:
+                        self.logger.warning(f"未找到匹配的歌曲: {song.name} - {', '.join(song.artists)}")
+                        await report(progress, song, "未找到匹配歌曲")
+                        metrics.SONGS_PROCESSED.inc(result="skipped")
+                    elif not manual_selection_callback:
+                        # 没有人可以手动选择，匹配度不够的歌曲记为失败而不是默默丢弃
+                        failed_reasons[song.id] = "匹配度不足，需要手动选择"
+                        await report(progress, song, "匹配度不足")
+                        metrics.SONGS_PROCESSED.inc(result="failed")
+                    else:
+                        send_matches = [{
+                            "id": m.id,
+                            "name": m.name,
+                            "artist": m.artist,
+                            "album": m.album
+                        } for m in matches]
+                        await manual_selection_callback(song_entry(song), send_matches)
+                        with metrics.MANUAL_SELECTION_WAIT.time(), tracing.span("manual_selection", song=song.name):
+                            async with jobs.waiting_for_input():
+                                selected_id = await manual_selection_queue.get()
+                        selected_song = next((s for s in matches if s.id == selected_id), None)
+                        if selected_song is not None:
+                            self.remember_match(song, selected_song, MATCH_SOURCE_MANUAL)
+                            decisions[song.id] = selected_song
+                            await report(progress, song, "找到匹配歌曲", selected_song)
+                            metrics.SONGS_PROCESSED.inc(result="manual")
+                        else:
+                            await report(progress, song, "用户跳过")
+                            metrics.SONGS_PROCESSED.inc(result="skipped")
+                except Exception as e:
+                    reason = "搜索超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+                    self.logger.error(f"搜索歌曲出错: {song.name}: {reason}")
+                    failed_reasons[song.id] = reason
+                    await report(progress, song, f"处理失败: {reason}")
+                    metrics.SONGS_PROCESSED.inc(result="failed")
+
+            # 为每个歌单新建播放列表，写入该歌单中匹配到的歌曲
+            playlist_results = []
+            failed_playlists = []  # 写入失败的歌单名
+            for index, source_playlist in enumerate(source_playlists):
+                sources = [song for song in source_playlist.songs if song.id in decisions]
+                selected_songs = [decisions[song.id] for song in sources]
+                await report(90 + int(index / len(source_playlists) * 10), None,
+                             f"正在写入播放列表: {source_playlist.name} ({len(selected_songs)} 首)")
+                if not selected_songs:
+                    self.logger.warning(f"歌单 {source_playlist.name} 没有匹配到任何歌曲，不创建播放列表")
+                    continue
+
+                try:
+                    with tracing.span("write_playlist", playlist=source_playlist.name, songs=len(selected_songs)):
+                        target_playlist = await self._create_playlist(f"{target_name_prefix}{source_playlist.name}")
+                        # 新建的播放列表写入前为空
+                        write_report = await self.apple_music.write_songs(target_playlist.id, selected_songs,
+                                                                          baseline=[])
+                        verify_report = await self.apple_music.verify_playlist_songs(target_playlist.id,
+                                                                                     selected_songs, baseline=[])
+                except Exception as e:
+                    # 一个歌单写入失败不影响其他歌单
+                    self.logger.error(f"写入播放列表 {source_playlist.name} 失败: {str(e)}")
+                    for song in sources:
+                        write_failures.setdefault(song.id, []).append(source_playlist.name)
+                    failed_playlists.append(source_playlist.name)
+                    metrics.SONGS_WRITE_FAILED.inc(len(selected_songs))
+                    continue
+                # sources 与写入的歌曲一一对应，按下标找回未写入歌曲的来源
+                unwritten = [sources[i] for i in
+                             (verify_report.missing_indices if verify_report.checked else write_report.failed_indices)]
+                if unwritten:
+                    for song in unwritten:
+                        write_failures.setdefault(song.id, []).append(source_playlist.name)
+                    metrics.SONGS_WRITE_FAILED.inc(len(unwritten))
+                    self.logger.error(f"{len(unwritten)} 首歌曲写入播放列表 {source_playlist.name} 失败")
+                playlist_results.append({
+                    "source_playlist_id": source_playlist.id,
+                    "name": target_playlist.name,
+                    "playlist_id": target_playlist.id,
+                    "added_count": len(selected_songs) - len(unwritten)
+                })
+
+            # 每首歌曲恰好出现在一个列表中：任一歌单写入失败的匹配歌曲记为失败
+            success_songs = []
+            skipped_songs = []
+            failed_songs = []
+            for song in unique_songs:
+                selected_song = decisions.get(song.id)
+                if song.id in write_failures:
+                    failed_songs.append({**song_entry(song),
+                                         "reason": f"写入播放列表失败: {', '.join(write_failures[song.id])}"})
+                elif selected_song is not None:
+                    success_songs.append({
+                        "originalName": song.name,
+                        "originalArtist": ", ".join(song.artists),
+                        "matchedName": selected_song.name,
+                        "matchedArtist": selected_song.artist,
+                        "matchedAlbum": selected_song.album
+                    })
+                elif song.id in failed_reasons:
+                    failed_songs.append({**song_entry(song), "reason": failed_reasons[song.id]})
+                else:
+                    skipped_songs.append(song_entry(song))
+
+            if not playlist_results and failed_playlists:
+                # 有匹配的歌曲但所有歌单都写入失败，仍然发送每首歌曲的结果
+                error = f"写入播放列表失败: {', '.join(failed_playlists)}"
+                await report(100, None, error)
+                if completed_callback:
+                    await completed_callback(success_songs, skipped_songs, failed_songs)
+                return {"error": error}
+
+            if not playlist_results:
+                await report(100, None, "没有找到任何匹配的歌曲")
+                status = "empty"
+                return {"error": "没有找到任何匹配的歌曲"}
+
+            await report(100, None, f"成功创建 {len(playlist_results)} 个播放列表")
+            if completed_callback:
+                await completed_callback(success_songs, skipped_songs, failed_songs)
+            status = "success"
+            return {
+                "status": "success",
+                "total_songs": total_songs,
+                "unique_songs": len(unique_songs),
+                "playlists": playlist_results
+            }
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            self.logger.error(f"批量转换歌单失败: {str(e)}\n{traceback.format_exc()}")
+            if progress_callback:
+                await progress_callback(100, {"name": "错误", "artist": "", "album": ""},
+                                        {"type": "progress", "message": f"批量转换歌单失败: {str(e)}"})
+            return {"error": f"批量转换歌单失败: {str(e)}"}
+        finally:
+            await self._cancel_tasks(search_tasks)
+            metrics.ACTIVE_CONVERSIONS.dec()
+            metrics.CONVERSIONS.inc(status=status)
+            metrics.CONVERSION_DURATION.observe(time.monotonic() - started)
 
 
 
@@ -868,6 +1441,7 @@ if __name__ == '__main__':
                     await apple_music.close()
                 except AttributeError:
                     pass  # 如果没有 close 方法，就忽略
+            await close_default_http_pool()
 
     # 使用 try-finally 来确保即使发生异常也能正确清理
     try:
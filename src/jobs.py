@@ -0,0 +1,241 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# 同时运行的任务数 (所有用户共享，可通过环境变量修改) 和保留的已结束任务数；
+# 等待用户操作 (waiting_for_input) 的任务不占名额
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("PLAYLIST_CONVERTER_MAX_JOBS", "4"))
+DEFAULT_MAX_FINISHED = 1000
+
+logger = logging.getLogger(__name__)
+
+_current_job: contextvars.ContextVar[Optional[Tuple["JobManager", "Job"]]] = \
+    contextvars.ContextVar("playlist_converter_job", default=None)
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    owner: str
+    description: str = ""
+    status: str = JOB_QUEUED
+    progress: int = 0
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    tracer: Any = field(default=None, repr=False)  # 开启 trace 时记录该任务的 tracing.Tracer
+    _func: Optional[Callable[["Job"], Awaitable[Any]]] = field(default=None, repr=False)
+    _on_finished: Optional[Callable[["Job"], Awaitable[None]]] = field(default=None, repr=False)
+    _context: Optional[contextvars.Context] = field(default=None, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _holds_slot: bool = field(default=False, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "has_trace": self.tracer is not None,
+        }
+
+
+class JobManager:
+    """
+    后台任务：提交后立即返回任务ID，任务在后台按提交顺序运行，同时运行的任务数不超过
+    max_concurrency，超出的任务排队等待。任务在 waiting_for_input() 中等待用户操作时
+    让出名额，之后优先于排队中的任务重新获得名额。
+
+    取消运行中的任务会取消它的 asyncio 任务，任务不再发起新的请求；与其他任务共享的搜索
+    (singleflight) 不会中止，完成后结果仍写入缓存供其他调用者使用。
+    取消排队中的任务直接把它标记为已取消。
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_finished: int = DEFAULT_MAX_FINISHED):
+        self.max_concurrency = max_concurrency
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Deque[Job] = deque()
+        self._resume_waiters: Deque[Tuple[asyncio.Future, Job]] = deque()
+        self._running = 0  # 占用名额的任务数
+
+    def submit(self, func: Callable[[Job], Awaitable[Any]], kind: str, owner: str, description: str = "",
+               on_finished: Optional[Callable[[Job], Awaitable[None]]] = None, tracer: Any = None) -> Job:
+        """
+        提交一个任务。
+
+        参数:
+            func: 接收 Job 的协程函数，可以更新 job.progress；返回值保存为 job.result，抛出异常则任务失败
+            kind: 任务类型，例如 "convert_playlist"
+            owner: 任务所属的会话ID
+            description: 任务说明，例如歌单名
+            on_finished: 任务结束 (成功、失败或取消) 后调用的协程函数
+            tracer: 记录该任务耗时分布的 tracing.Tracer，任务结束后仍随任务保留
+        返回:
+            Job: 已排队的任务
+        """
+        job = Job(id=uuid.uuid4().hex, kind=kind, owner=owner, description=description, tracer=tracer,
+                  _func=func, _on_finished=on_finished, _context=contextvars.copy_context())
+        self._jobs[job.id] = job
+        self._queue.append(job)
+        self._schedule()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, owner: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def active(self, owner: str) -> List[Job]:
+        """该会话排队中和运行中的任务"""
+        return [job for job in self.list(owner) if not job.finished]
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务并等待它结束，返回任务；任务不存在时返回 None"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is None:
+            self._queue.remove(job)
+            await self._finish(job, JOB_CANCELLED)
+        else:
+            job._task.cancel()
+            await asyncio.gather(job._task, return_exceptions=True)
+            if not job.finished:
+                # 任务在 _run 开始执行前就被取消 (例如提交后立即取消)，_run 的 finally 没有执行
+                self._release_slot(job)
+                await self._finish(job, JOB_CANCELLED)
+        return job
+
+    async def shutdown(self):
+        """取消所有未结束的任务 (服务关闭时调用)"""
+        for job in list(self._jobs.values()):
+            await self.cancel(job.id)
+
+    def _schedule(self):
+        loop = asyncio.get_running_loop()
+        while self._running < self.max_concurrency:
+            # 等待用户操作后继续的任务优先于排队中的任务
+            if self._resume_waiters:
+                waiter, job = self._resume_waiters.popleft()
+                if waiter.done():
+                    continue
+                self._take_slot(job)
+                waiter.set_result(None)
+            elif self._queue:
+                job = self._queue.popleft()
+                self._take_slot(job)
+                job._task = loop.create_task(self._run(job), name=f"job-{job.id[:8]}", context=job._context)
+            else:
+                break
+
+    def _take_slot(self, job: Job):
+        self._running += 1
+        job._holds_slot = True
+
+    def _release_slot(self, job: Job):
+        if job._holds_slot:
+            job._holds_slot = False
+            self._running -= 1
+            self._schedule()
+
+    async def _reacquire_slot(self, job: Job):
+        """等待用户操作结束后重新获得名额"""
+        if self._running < self.max_concurrency and not self._resume_waiters:
+            self._take_slot(job)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._resume_waiters.append((waiter, job))
+        # 取消时 waiter 随之取消，_schedule 会跳过它；已经分到的名额由 _run 结束时释放
+        await waiter
+
+    async def _run(self, job: Job):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        _current_job.set((self, job))
+        status = JOB_FAILED
+        try:
+            job.result = await job._func(job)
+            status = JOB_SUCCEEDED
+        except asyncio.CancelledError:
+            status = JOB_CANCELLED
+        except Exception as e:
+            logger.exception(f"任务 {job.id} ({job.kind}) 失败")
+            job.error = str(e)
+        finally:
+            self._release_slot(job)
+            await self._finish(job, status)
+
+    async def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        if job.status == JOB_SUCCEEDED:
+            job.progress = 100
+        job._func = job._context = None
+        self._trim()
+        if job._on_finished is not None:
+            try:
+                await job._on_finished(job)
+            except Exception:
+                logger.exception(f"任务 {job.id} 的结束回调失败")
+
+    def _trim(self):
+        """只保留最近 max_finished 个已结束的任务"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "running": self._running,
+            "waiting_for_input": sum(1 for job in self._jobs.values()
+                                     if job.status == JOB_RUNNING and not job._holds_slot),
+            "max_concurrency": self.max_concurrency,
+            "jobs": len(self._jobs),
+        }
+
+
+@asynccontextmanager
+async def waiting_for_input():
+    """
+    在 async with 块内等待用户操作 (例如手动选择)，期间当前任务让出并发名额，
+    正常结束后重新获得名额再继续；不在 JobManager 的任务中运行时什么也不做。
+    """
+    current = _current_job.get()
+    if current is None:
+        yield
+        return
+    manager, job = current
+    manager._release_slot(job)
+    yield
+    # 块内抛出异常 (包括取消) 时不再等待名额，任务随之结束
+    await manager._reacquire_slot(job)
@@ -0,0 +1,138 @@
+import os
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from Apple.apm_utils import AppleSong
+except ImportError:  # 以 src.match_store 的形式导入时 (例如运行测试)
+    from src.Apple.apm_utils import AppleSong
+
+# 与搜索缓存共用数据目录，可通过环境变量 PLAYLIST_CONVERTER_DATA_DIR 修改
+DEFAULT_DATA_DIR = os.environ.get("PLAYLIST_CONVERTER_DATA_DIR", "data")
+
+MATCH_SOURCE_AUTO = "auto"
+MATCH_SOURCE_MANUAL = "manual"
+
+
+@dataclass
+class MatchRecord:
+    netease_id: int
+    storefront: str
+    song: AppleSong
+    source: str
+    confidence: float
+    updated_at: float
+
+
+class MatchStore:
+    """
+    网易云歌曲到 Apple Music 歌曲的匹配记录 (SQLite)。
+
+    以 (网易云歌曲ID, storefront) 为键保存最终选中的 AppleSong。
+    手动选择的记录优先级高于自动匹配，自动匹配不会覆盖手动选择。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS song_matches (
+                netease_id INTEGER NOT NULL,
+                storefront TEXT NOT NULL,
+                apple_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                source TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                album_id TEXT NOT NULL DEFAULT '',
+                duration INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (netease_id, storefront)
+            )
+        """)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """旧版本的表没有专辑ID和时长，补上这两列 (旧记录为空，下次匹配时补全)"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(song_matches)")}
+        if "album_id" not in columns:
+            self._conn.execute("ALTER TABLE song_matches ADD COLUMN album_id TEXT NOT NULL DEFAULT ''")
+        if "duration" not in columns:
+            self._conn.execute("ALTER TABLE song_matches ADD COLUMN duration INTEGER NOT NULL DEFAULT 0")
+
+    def get(self, netease_id: int, storefront: str) -> Optional[MatchRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT apple_id, name, artist, album, album_id, duration, source, confidence, updated_at "
+                "FROM song_matches "
+                "WHERE netease_id = ? AND storefront = ?",
+                (netease_id, storefront or "")
+            ).fetchone()
+        if row is None:
+            return None
+        apple_id, name, artist, album, album_id, duration, source, confidence, updated_at = row
+        return MatchRecord(netease_id=netease_id,
+                           storefront=storefront or "",
+                           song=AppleSong(id=apple_id, name=name, artist=artist, album=album,
+                                          duration=duration, album_id=album_id),
+                           source=source,
+                           confidence=confidence,
+                           updated_at=updated_at)
+
+    def put(self, netease_id: int, storefront: str, song: AppleSong,
+            source: str = MATCH_SOURCE_AUTO, confidence: float = 1.0) -> bool:
+        """
+        保存一条匹配记录。
+
+        返回:
+            bool: 是否写入；已有手动选择时自动匹配的结果会被忽略
+        """
+        with self._lock:
+            if source == MATCH_SOURCE_AUTO:
+                row = self._conn.execute(
+                    "SELECT source FROM song_matches WHERE netease_id = ? AND storefront = ?",
+                    (netease_id, storefront or "")
+                ).fetchone()
+                if row is not None and row[0] == MATCH_SOURCE_MANUAL:
+                    return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO song_matches "
+                "(netease_id, storefront, apple_id, name, artist, album, album_id, duration, "
+                "source, confidence, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (netease_id, storefront or "", song.id, song.name, song.artist, song.album,
+                 song.album_id, song.duration, source, confidence, time.time())
+            )
+            self._conn.commit()
+        return True
+
+    def delete(self, netease_id: int, storefront: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM song_matches WHERE netease_id = ? AND storefront = ?",
+                (netease_id, storefront or "")
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[MatchStore] = None
+
+
+def get_default_match_store() -> MatchStore:
+    """进程内共享的默认匹配记录，所有用户会话共用"""
+    global _default_store
+    if _default_store is None:
+        _default_store = MatchStore(os.path.join(DEFAULT_DATA_DIR, "matches.sqlite3"))
+    return _default_store
@@ -0,0 +1,202 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+
+# 自动接受和进入手动选择的默认分数阈值 (0~1)
+DEFAULT_AUTO_ACCEPT = 0.8
+DEFAULT_REVIEW = 0.35
+# 没有候选达到手动选择阈值时 (例如中文歌名对拼音歌名)，仍交给用户选择的最高分候选数
+DEFAULT_REVIEW_FALLBACK = 5
+
+# 名称、艺术家、专辑在总分中的权重
+NAME_WEIGHT = 0.5
+ARTIST_WEIGHT = 0.35
+ALBUM_WEIGHT = 0.15
+
+# 版本标记不一致 (例如一边是 Live 一边不是) 时每个标记的扣分
+VERSION_TAG_PENALTY = 0.25
+
+# 时长差在容差内视为强匹配信号；超过拒绝阈值 (取绝对值和相对比例中较大者) 视为不同版本
+DEFAULT_DURATION_TOLERANCE_MS = 3000
+DURATION_REJECT_MS = 15000
+DURATION_REJECT_RATIO = 0.1
+DURATION_BONUS = 0.2
+DURATION_PENALTY = 0.3
+
+# 括号里出现这些词时视为不同的版本，而不是歌名的一部分
+VERSION_TAGS = {
+    "live": "live", "现场": "live", "演唱会": "live", "ライブ": "live",
+    "remix": "remix", "mix": "remix", "混音": "remix",
+    "instrumental": "instrumental", "伴奏": "instrumental", "纯音乐": "instrumental", "inst": "instrumental",
+    "karaoke": "karaoke", "off vocal": "instrumental",
+    "acoustic": "acoustic", "不插电": "acoustic", "unplugged": "acoustic",
+    "demo": "demo", "cover": "cover", "翻唱": "cover",
+}
+
+_BRACKET_PATTERN = re.compile(r"[\(\[（【「](.*?)[\)\]）】」]")
+_DASH_SUFFIX_PATTERN = re.compile(r"\s+[-–—]\s+(.+)$")
+_FEAT_PATTERN = re.compile(r"\b(feat|ft|featuring)\b\.?")
+_ARTIST_SPLIT_PATTERN = re.compile(r"\s*(?:,|&|、|/|;|\bfeat\b\.?|\bft\b\.?|\bfeaturing\b|\bwith\b|\band\b)\s*")
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]|[^\W{_CJK}_]+")
+
+
+@dataclass(frozen=True)
+class NormalizedText:
+    core: str
+    tokens: FrozenSet[str]
+    tags: FrozenSet[str]
+
+
+@dataclass
+class ScoredCandidate:
+    song: object  # AppleSong
+    score: float
+    name_score: float
+    artist_score: float
+    album_score: float
+    duration_diff: Optional[int] = None  # 毫秒，任一方时长未知时为 None
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold().strip()
+
+
+def _tags_of(text: str) -> FrozenSet[str]:
+    tags = set()
+    for keyword, tag in VERSION_TAGS.items():
+        if re.search(rf"(?<![a-z]){re.escape(keyword)}(?![a-z])", text):
+            tags.add(tag)
+    return frozenset(tags)
+
+
+@lru_cache(maxsize=65536)
+def normalize_title(text: str) -> NormalizedText:
+    """
+    规范化歌名或专辑名：统一全角/半角和大小写，拆出括号和 " - " 后缀中的版本标记
+    (Live、Remix 等)，去掉 feat. 信息和标点后分词。中日韩文字按单字分词。
+    """
+    text = _fold(text)
+    extras = _BRACKET_PATTERN.findall(text)
+    text = _BRACKET_PATTERN.sub(" ", text)
+    dash = _DASH_SUFFIX_PATTERN.search(text)
+    if dash:
+        extras.append(dash.group(1))
+        text = text[:dash.start()]
+
+    tags = set()
+    for extra in extras:
+        if _FEAT_PATTERN.search(extra) or extra.startswith("with "):
+            continue
+        tags |= _tags_of(extra)
+    # 不带括号的 "feat. xxx" 同样去掉
+    text = _FEAT_PATTERN.split(text, maxsplit=1)[0]
+
+    tokens = _TOKEN_PATTERN.findall(text)
+    return NormalizedText(core="".join(tokens), tokens=frozenset(tokens), tags=frozenset(tags))
+
+
+@lru_cache(maxsize=65536)
+def normalize_artists(text: str) -> NormalizedText:
+    """规范化艺术家字符串，"A & B"、"A, B"、"A feat. B" 都拆成同一组词"""
+    names = [name for name in _ARTIST_SPLIT_PATTERN.split(_fold(text)) if name]
+    tokens = set()
+    for name in names:
+        tokens.update(_TOKEN_PATTERN.findall(name))
+    return NormalizedText(core="".join(sorted(tokens)), tokens=frozenset(tokens), tags=frozenset())
+
+
+def token_set_similarity(a: NormalizedText, b: NormalizedText) -> float:
+    """
+    词集合相似度：Dice 系数与包含度 (交集 / 较小集合) 的平均值。
+    一方完整包含另一方 (例如多了 "Remastered 2011") 时仍有较高分数。
+    """
+    if a.core and a.core == b.core:
+        return 1.0
+    if not a.tokens or not b.tokens:
+        return 0.0
+    inter = len(a.tokens & b.tokens)
+    if not inter:
+        return 0.0
+    dice = 2 * inter / (len(a.tokens) + len(b.tokens))
+    containment = inter / min(len(a.tokens), len(b.tokens))
+    return (dice + containment) / 2
+
+
+class SongMatcher:
+    """
+    为网易云歌曲的 Apple Music 搜索结果打分排序。
+
+    分数为名称、艺术家 (网易云全部艺术家与 Apple 艺术家字符串的词集合)、专辑相似度的
+    加权和，再减去版本标记不一致的惩罚。双方时长都已知时，时长差在 duration_tolerance_ms
+    以内加分，差距过大 (多为 Live、Remix 等其他版本) 则扣分。最高分达到 auto_accept
+    时自动匹配，否则达到 review 的候选进入手动选择列表；一个都没有达到 review 时
+    (跨语言的歌名、艺术家名得分很低) 取分数最高的 review_fallback 个交给用户选择。
+    """
+
+    def __init__(self, auto_accept: float = DEFAULT_AUTO_ACCEPT, review: float = DEFAULT_REVIEW,
+                 duration_tolerance_ms: int = DEFAULT_DURATION_TOLERANCE_MS,
+                 review_fallback: int = DEFAULT_REVIEW_FALLBACK):
+        self.auto_accept = auto_accept
+        self.review = review
+        self.review_fallback = review_fallback
+        self.duration_tolerance_ms = duration_tolerance_ms
+
+    def score(self, from_song, candidates: Sequence) -> List[ScoredCandidate]:
+        """
+        一次性为所有候选打分，源歌曲只规范化一次。
+
+        参数:
+            from_song (NeteaseSong): 源歌曲
+            candidates (Sequence[AppleSong]): 搜索结果
+
+        返回:
+            List[ScoredCandidate]: 按分数从高到低排序，同分保持搜索结果原顺序
+        """
+        name = normalize_title(from_song.name)
+        artists = normalize_artists(" & ".join(from_song.artists))
+        album = normalize_title(from_song.album)
+        duration = getattr(from_song, "duration", 0)
+        reject_ms = max(DURATION_REJECT_MS, duration * DURATION_REJECT_RATIO)
+
+        scored = []
+        for candidate in candidates:
+            c_name = normalize_title(candidate.name)
+            name_score = token_set_similarity(name, c_name)
+            artist_score = token_set_similarity(artists, normalize_artists(candidate.artist))
+            album_score = token_set_similarity(album, normalize_title(candidate.album))
+            penalty = VERSION_TAG_PENALTY * len(name.tags ^ c_name.tags)
+            score = NAME_WEIGHT * name_score + ARTIST_WEIGHT * artist_score + ALBUM_WEIGHT * album_score - penalty
+
+            duration_diff = None
+            candidate_duration = getattr(candidate, "duration", 0)
+            if duration and candidate_duration:
+                duration_diff = abs(duration - candidate_duration)
+                if duration_diff <= self.duration_tolerance_ms:
+                    score += DURATION_BONUS
+                elif duration_diff > reject_ms:
+                    score -= DURATION_PENALTY
+
+            scored.append(ScoredCandidate(song=candidate,
+                                          score=min(1.0, max(0.0, score)),
+                                          name_score=name_score,
+                                          artist_score=artist_score,
+                                          album_score=album_score,
+                                          duration_diff=duration_diff))
+        scored.sort(key=lambda c: c.score, reverse=True)
+        return scored
+
+    def classify(self, ranked: List[ScoredCandidate]) -> Tuple[bool, List[ScoredCandidate]]:
+        """
+        根据阈值划分打分结果。
+
+        返回:
+            Tuple[bool, List[ScoredCandidate]]: (是否自动接受, 达到自动接受阈值的候选；
+            否则为达到手动选择阈值的候选，没有时为分数最高的 review_fallback 个候选)
+        """
+        if ranked and ranked[0].score >= self.auto_accept:
+            return True, [c for c in ranked if c.score >= self.auto_accept]
+        review = [c for c in ranked if c.score >= self.review]
+        return False, review or ranked[:self.review_fallback]
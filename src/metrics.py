@@ -0,0 +1,241 @@
+import re
+import math
+import time
+import bisect
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认的延迟分桶 (秒)
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 转换耗时和等待用户选择的时间跨度更大
+LONG_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+_ID_SEGMENT = re.compile(r"^(?!v\d+$)(?:[a-z]\.[\w-]+|[\w-]*\d[\w-]*)$", re.IGNORECASE)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def endpoint_of(path: str) -> str:
+    """
+    把请求路径中的ID替换为占位符，避免标签数量随歌曲、歌单数量增长。
+    例如 /v1/catalog/cn/albums/123/tracks -> /v1/catalog/{storefront}/albums/{id}/tracks
+    """
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    for i, segment in enumerate(segments):
+        if i > 0 and segments[i - 1] == "catalog":
+            segments[i] = "{storefront}"
+        elif _ID_SEGMENT.match(segment):
+            segments[i] = "{id}"
+    return "/" + "/".join(segments)
+
+
+class Registry:
+    """保存所有指标，按 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值；也可以用 set_function 在输出时读取 (只支持无标签的指标)"""
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self, **labels) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """按分桶统计的分布，输出 _bucket (累计)、_sum 和 _count"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶的计数 (不累计, 最后一个是 +Inf), 总和]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+# 上游接口 (service 为 apple 或 netease)
+UPSTREAM_LATENCY = Histogram("playlist_converter_upstream_request_duration_seconds",
+                             "上游接口请求耗时", ["service", "endpoint"])
+UPSTREAM_RESPONSES = Counter("playlist_converter_upstream_responses_total",
+                             "上游接口响应数，status 为 HTTP 状态码、网易云返回的 code 或 error", ["service", "endpoint", "status"])
+UPSTREAM_IN_FLIGHT = Gauge("playlist_converter_upstream_in_flight",
+                           "正在进行的 Apple Music 请求数")
+UPSTREAM_RATE_LIMIT = Gauge("playlist_converter_upstream_rate_limit",
+                            "Apple Music 限流器当前允许的每秒请求数")
+
+# Apple Music 共享连接池
+HTTP_POOL_CONNECTIONS = Counter("playlist_converter_http_pool_connections_total",
+                                "连接池取得的连接数，event 为 created (新建) 或 reused (复用)", ["event"])
+HTTP_POOL_IN_USE = Gauge("playlist_converter_http_pool_in_use",
+                         "连接池中正在使用的连接数")
+HTTP_POOL_IDLE = Gauge("playlist_converter_http_pool_idle",
+                       "连接池中空闲的 keep-alive 连接数")
+DNS_CACHE_LOOKUPS = Counter("playlist_converter_dns_cache_lookups_total",
+                            "连接池 DNS 缓存查询次数，result 为 hit 或 miss", ["result"])
+
+# 网易云会话池
+NETEASE_SESSIONS = Gauge("playlist_converter_netease_sessions",
+                         "当前打开的网易云用户会话数")
+NETEASE_IN_FLIGHT = Gauge("playlist_converter_netease_in_flight",
+                          "正在进行的网易云请求数")
+
+# 搜索缓存
+SEARCH_CACHE_LOOKUPS = Counter("playlist_converter_search_cache_lookups_total",
+                               "搜索缓存查询次数，result 为 hit 或 miss", ["result"])
+
+# 转换
+SONGS_PROCESSED = Counter("playlist_converter_songs_processed_total",
+                          "已处理的歌曲数，result 为 auto、manual、skipped 或 failed；用 rate() 得到每秒处理数",
+                          ["result"])
+SONGS_WRITE_FAILED = Counter("playlist_converter_songs_write_failed_total",
+                             "已匹配但最终没有写入播放列表的歌曲数")
+MANUAL_SELECTION_WAIT = Histogram("playlist_converter_manual_selection_wait_seconds",
+                                  "等待用户手动选择的时间", buckets=LONG_BUCKETS)
+WRITE_QUEUE_DEPTH = Gauge("playlist_converter_write_queue_depth",
+                          "已匹配、等待写入播放列表的歌曲数")
+CONVERSIONS = Counter("playlist_converter_conversions_total",
+                      "完成的歌单转换数，status 为 success、empty、failed 或 cancelled", ["status"])
+CONVERSION_DURATION = Histogram("playlist_converter_conversion_duration_seconds",
+                                "单个歌单转换的总耗时", buckets=LONG_BUCKETS)
+ACTIVE_CONVERSIONS = Gauge("playlist_converter_active_conversions",
+                           "正在进行的歌单转换数")
+
+# 网页服务
+ACTIVE_SESSIONS = Gauge("playlist_converter_active_sessions",
+                        "当前的用户会话数")
+JOBS_QUEUED = Gauge("playlist_converter_jobs_queued",
+                    "排队等待运行的后台任务数")
+JOBS_RUNNING = Gauge("playlist_converter_jobs_running",
+                     "正在运行的后台任务数 (占用并发名额的)")
+JOBS_WAITING_INPUT = Gauge("playlist_converter_jobs_waiting_for_input",
+                           "等待用户手动选择、暂时不占并发名额的后台任务数")
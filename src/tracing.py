@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# 单次转换最多记录的事件数，超出后丢弃并计数
+DEFAULT_MAX_EVENTS = 200000
+
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("playlist_converter_tracer", default=None)
+
+
+class _NullSpan:
+    """未启用追踪时使用的空 span，进入和退出都不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "tid", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.tid = self.tracer._tid()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self, time.perf_counter())
+        return False
+
+    def set(self, **args):
+        """补充 span 的参数，例如请求返回后的状态码"""
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    记录一次转换中各阶段的耗时，导出为 Chrome trace-event JSON
+    (可在 chrome://tracing 或 https://ui.perfetto.dev 打开)。
+
+    每个 asyncio 任务显示为一条独立的轨道，并发的搜索和写入可以直接看出重叠情况。
+    """
+
+    def __init__(self, name: str = "", max_events: int = DEFAULT_MAX_EVENTS):
+        self.name = name
+        self.max_events = max_events
+        self.events: List[dict] = []
+        self.dropped = 0
+        self._origin = time.perf_counter()
+        self._tids: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._thread_names: Dict[int, str] = {}
+
+    def span(self, name: str, category: str = "converter", **args) -> _Span:
+        return _Span(self, name, category, args)
+
+    def _tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        tid = self._tids.get(task)
+        if tid is None:
+            tid = self._tids[task] = len(self._thread_names) + 1
+            self._thread_names[tid] = task.get_name()
+        return tid
+
+    def _record(self, span: _Span, end: float):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append({
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 1),
+            "dur": round((end - span.start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": span.tid,
+            "args": span.args,
+        })
+
+    def to_chrome_trace(self) -> dict:
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": self.name or "converter"}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self._thread_names.items()]
+        return {
+            "traceEvents": metadata + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+
+def span(name: str, category: str = "converter", **args):
+    """
+    在当前上下文启用了追踪时记录一个 span，否则返回空 span (几乎没有开销)。
+
+    用法: with tracing.span("apple.search", "apple", term=term) as s: ...
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, category, **args)
+
+
+@contextmanager
+def activate(tracer: Optional[Tracer]):
+    """
+    在 with 块内 (以及其中创建的任务中) 使用该 tracer 记录 span；tracer 为 None 时不启用追踪。
+    """
+    if tracer is None:
+        yield None
+        return
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
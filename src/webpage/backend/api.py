@@ -1,6 +1,6 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import json
@@ -31,8 +31,12 @@ logger.addHandler(ch)
 
 # 不再需要手动添加路径，因为我们已经在 PYTHONPATH 中设置了
 from Apple import apm
+from Apple.http_pool import close_default_http_pool
 from Netease import netease
 from converter import Converter
+import metrics
+import tracing
+import jobs
 from .get_dev_token import get_dev_token
 
 app = FastAPI()
@@ -54,6 +58,17 @@ class PlaylistConvert(BaseModel):
     target_playlist_id: str | None = None
     target_playlist_name: str | None = None
     mode: str = "new"  # "new" or "override"
+    trace: bool = False  # 记录本次转换的耗时分布，之后可通过 /api/jobs/{job_id}/trace 下载
+    resume: bool = False  # 从该歌单上次未完成转换的断点继续 (断点列表见 /api/checkpoints)
+
+class LibraryConvert(BaseModel):
+    session_id: str
+    playlist_ids: List[str | int] | None = None  # 为空时转换全部创建的歌单
+    target_name_prefix: str = ""  # 新建播放列表名称的前缀
+    trace: bool = False
+
+class JobCancel(BaseModel):
+    session_id: str
 
 class ManualSearch(BaseModel):
     keyword: str
@@ -75,11 +90,23 @@ class UserSession:
 
 # 全局会话存储
 sessions: Dict[str, UserSession] = {}
+metrics.ACTIVE_SESSIONS.set_function(lambda: len(sessions))
+
+# 后台转换任务，所有会话共享同一个并发上限
+job_manager = jobs.JobManager()
+metrics.JOBS_QUEUED.set_function(lambda: job_manager.stats()["queued"])
+metrics.JOBS_RUNNING.set_function(lambda: job_manager.stats()["running"])
+metrics.JOBS_WAITING_INPUT.set_function(lambda: job_manager.stats()["waiting_for_input"])
 
 @app.get("/")
 async def read_root():
     return FileResponse(str(Path(__file__).parent.parent / "static" / "index.html"))
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/api/login")
 async def login(token_input: TokenInput):
     try:
@@ -111,7 +138,7 @@ async def login(token_input: TokenInput):
             {
                 "id": p.id,
                 "name": p.name,
-                "trackCount": len(p.songs) if hasattr(p, 'songs') else 0
+                "trackCount": p.track_count
             }
             for p in netease_music.created_playlists
         ]
@@ -124,7 +151,17 @@ async def login(token_input: TokenInput):
         session.netease_music = netease_music
         session.apple_music = apple_music
         session.converter = Converter(netease_music, apple_music)
+        previous = sessions.get(session_id)
+        if previous is not None:
+            # 同一账号重新登录时先取消旧会话的任务 (转换的断点会保留，可以继续)，
+            # 它们使用的网易云会话和手动选择队列随旧会话一起失效
+            for job in job_manager.active(session_id):
+                await job_manager.cancel(job.id)
+                logger.info(f"重新登录，取消任务 {job.id}")
         sessions[session_id] = session
+        # 释放旧会话的网易云会话
+        if previous is not None and previous.netease_music is not None:
+            await previous.netease_music.close()
         
         logger.info(f"登录成功，创建会话: {session_id[:8]}...")
         return {"session_id": session_id, "playlists": playlists}
@@ -191,46 +228,168 @@ async def send_completed(session_id: str, success_songs: list, skip_songs: list,
         except:
             pass
 
+async def send_job_status(job: jobs.Job):
+    if job.owner in websocket_connections:
+        websocket: WebSocket = websocket_connections[job.owner]
+        try:
+            await websocket.send_json({
+                "type": "job",
+                "job_id": job.id,
+                "status": job.status,
+                "error": job.error
+            })
+        except:
+            pass
+
 @app.post("/api/convert_playlist")
 async def convert_playlist(playlist_data: PlaylistConvert):
+    """提交转换任务并立即返回任务ID，进度通过 WebSocket 推送，结果通过 /api/jobs/{job_id} 查询"""
     if playlist_data.session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
     session: UserSession = sessions[playlist_data.session_id]
-    
+
+    # 获取要转换的播放列表
+    playlist = None
+    for p in session.netease_music.created_playlists:
+        if p.id == playlist_data.playlist_id:
+            playlist = p
+            break
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+
+    # 手动选择队列属于会话，同一会话同时只能有一个转换任务
+    if job_manager.active(playlist_data.session_id):
+        raise HTTPException(status_code=409, detail="A conversion is already running for this session")
+
     # 创建一个异步队列用于手动选择
     session.manual_selection_queue = asyncio.Queue()
-    
-    try:
-        # 获取要转换的播放列表
-        playlist = None
-        for p in session.netease_music.created_playlists:
-            if p.id == playlist_data.playlist_id:
-                playlist = p
-                break
-        if not playlist:
-            raise HTTPException(status_code=404, detail="Playlist not found")
-        
-        # 获取播放列表中的歌曲
-        await session.netease_music.get_songs(playlist)
-        
-        # 开始转换
-        result = await session.converter.convert_play_list_web(
-            playlist,
-            progress_callback=lambda p, s, r=None: send_progress(playlist_data.session_id, p, s, r),
-            completed_callback=lambda success_count, skip_count, error_count: send_completed(playlist_data.session_id, success_count, skip_count, error_count),
-            manual_selection_callback=lambda song_info, matches: send_manual_selection(playlist_data.session_id, song_info, matches),
-            manual_selection_queue=session.manual_selection_queue,
-            target_playlist_id=playlist_data.target_playlist_id,
-            target_playlist_name=playlist_data.target_playlist_name,
-            mode=playlist_data.mode
-        )
-        
-        return {"status": "success", "result": result}
-    except Exception as e:
-        import traceback
-        logger.error(f"转换播放列表失败: {str(e)}\n{traceback.format_exc()}")
-        return {"error": str(e)}
+
+    tracer = tracing.Tracer(name=f"convert {playlist.name}") if playlist_data.trace else None
+
+    # 断点按网易云账号和歌单保存，重新登录或服务重启后仍可继续
+    checkpoint_key = f"{session.netease_music.uid}:{playlist.id}"
+
+    async def run(job: jobs.Job):
+        async def progress(p, s, r=None):
+            job.progress = p
+            await send_progress(playlist_data.session_id, p, s, r)
+
+        with tracing.activate(job.tracer):
+            # 获取播放列表中的歌曲
+            await session.netease_music.get_songs(playlist)
+
+            # 开始转换
+            result = await session.converter.convert_play_list_web(
+                playlist,
+                progress_callback=progress,
+                completed_callback=lambda success_count, skip_count, error_count: send_completed(playlist_data.session_id, success_count, skip_count, error_count),
+                manual_selection_callback=lambda song_info, matches: send_manual_selection(playlist_data.session_id, song_info, matches),
+                manual_selection_queue=session.manual_selection_queue,
+                target_playlist_id=playlist_data.target_playlist_id,
+                target_playlist_name=playlist_data.target_playlist_name,
+                mode=playlist_data.mode,
+                checkpoint_key=checkpoint_key,
+                resume=playlist_data.resume
+            )
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    job = job_manager.submit(run, kind="convert_playlist", owner=playlist_data.session_id,
+                             description=playlist.name, on_finished=send_job_status, tracer=tracer)
+    logger.info(f"提交转换任务 {job.id}: {playlist.name}")
+    return {"status": "accepted", "job_id": job.id}
+
+@app.post("/api/convert_library")
+async def convert_library(library_data: LibraryConvert):
+    """批量转换多个歌单 (默认全部创建的歌单)，重复的歌曲只匹配一次；与 /api/convert_playlist 一样作为后台任务运行"""
+    if library_data.session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    session: UserSession = sessions[library_data.session_id]
+
+    if library_data.playlist_ids is None:
+        playlists = list(session.netease_music.created_playlists)
+    else:
+        by_id = {p.id: p for p in session.netease_music.created_playlists}
+        missing = [playlist_id for playlist_id in library_data.playlist_ids if playlist_id not in by_id]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Playlist not found: {missing}")
+        playlists = [by_id[playlist_id] for playlist_id in dict.fromkeys(library_data.playlist_ids)]
+    if not playlists:
+        raise HTTPException(status_code=400, detail="No playlists to convert")
+
+    if job_manager.active(library_data.session_id):
+        raise HTTPException(status_code=409, detail="A conversion is already running for this session")
+
+    session.manual_selection_queue = asyncio.Queue()
+
+    tracer = tracing.Tracer(name=f"convert library ({len(playlists)} playlists)") if library_data.trace else None
+
+    async def run(job: jobs.Job):
+        async def progress(p, s, r=None):
+            job.progress = p
+            await send_progress(library_data.session_id, p, s, r)
+
+        with tracing.activate(job.tracer):
+            result = await session.converter.convert_library_web(
+                playlists,
+                progress_callback=progress,
+                completed_callback=lambda success_songs, skip_songs, failed_songs: send_completed(library_data.session_id, success_songs, skip_songs, failed_songs),
+                manual_selection_callback=lambda song_info, matches: send_manual_selection(library_data.session_id, song_info, matches),
+                manual_selection_queue=session.manual_selection_queue,
+                target_name_prefix=library_data.target_name_prefix
+            )
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    job = job_manager.submit(run, kind="convert_library", owner=library_data.session_id,
+                             description=f"{len(playlists)} 个歌单", on_finished=send_job_status, tracer=tracer)
+    logger.info(f"提交批量转换任务 {job.id}: {len(playlists)} 个歌单")
+    return {"status": "accepted", "job_id": job.id}
+
+@app.get("/api/checkpoints")
+async def list_checkpoints(session_id: str):
+    """该账号未完成、可以继续的转换"""
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    session = sessions[session_id]
+    return {"checkpoints": session.converter.checkpoint_store.list(f"{session.netease_music.uid}:")}
+
+def get_job_for_session(job_id: str, session_id: str) -> jobs.Job:
+    job = job_manager.get(job_id)
+    if job is None or job.owner != session_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs")
+async def list_jobs(session_id: str):
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"jobs": [job.to_dict() for job in job_manager.list(session_id)]}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, session_id: str):
+    """任务状态、进度，结束后包含转换结果或错误信息"""
+    return get_job_for_session(job_id, session_id).to_dict()
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, cancel_data: JobCancel):
+    """取消排队中或运行中的任务，正在进行的上游请求会被中止"""
+    get_job_for_session(job_id, cancel_data.session_id)
+    job = await job_manager.cancel(job_id)
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str, session_id: str):
+    """下载开启 trace 的任务的 Chrome trace-event JSON"""
+    job = get_job_for_session(job_id, session_id)
+    if job.tracer is None:
+        raise HTTPException(status_code=404, detail="No trace recorded")
+    return JSONResponse(job.tracer.to_chrome_trace(),
+                        headers={"Content-Disposition": f'attachment; filename="trace-{job.id[:8]}.json"'})
 
 @app.post("/api/select_song")
 async def select_song(selection: SongSelection):
@@ -293,9 +452,11 @@ async def get_apple_playlists(session_id: str):
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await job_manager.shutdown()
     # 清理所有会话
     for session in sessions.values():
         if session.netease_music:
             await session.netease_music.close()
         if session.apple_music:
-            await session.apple_music.close() 
\ No newline at end of file
+            await session.apple_music.close()
+    await close_default_http_pool() 
\ No newline at end of file
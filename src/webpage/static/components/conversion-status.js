@@ -27,6 +27,12 @@ app.component('conversion-status', {
     template: `
         <div v-if="isConverting" class="conversion-status">
             <el-progress :percentage="conversionProgress || 0" />
+
+            <div class="cancel-conversion" style="text-align: right; margin-top: 10px;">
+                <el-button type="danger" plain size="small" @click="$emit('cancel-conversion')">
+                    取消转换
+                </el-button>
+            </div>
             
             <div v-if="currentSong && currentSong.name" class="current-song">
                 <h3>正在处理</h3>
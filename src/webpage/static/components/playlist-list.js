@@ -17,10 +17,13 @@ app.component('playlist-list', {
             default: () => []
         }
     },
-    emits: ['convert-playlist', 'fetch-apple-playlists'],
+    emits: ['convert-playlist', 'convert-library', 'fetch-apple-playlists'],
     template: `
         <div v-if="isLoggedIn && !isConverting" class="playlist-list">
             <h2>选择要转换的歌单</h2>
+            <el-button type="success" @click="$emit('convert-library')" :disabled="!playlists.length">
+                转换全部歌单
+            </el-button>
             <el-table :data="playlists" style="width: 100%" max-height="400">
                 <el-table-column prop="name" label="歌单名称" min-width="180" show-overflow-tooltip />
                 <el-table-column prop="trackCount" label="歌曲数量" width="100" />
@@ -0,0 +1,85 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from aiohttp import web
+from src.Apple.apm import AppleMusic
+from src.Apple.search_cache import SearchCache
+from src.Apple.http_pool import HttpPool
+
+
+class TestSharedHttpPool(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.user_tokens = []
+        app = web.Application()
+        app.router.add_get('/v1/me/storefront', self.get_storefront)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.base_patch = patch('src.Apple.apm.LIBRARY_API_BASE', f'http://127.0.0.1:{port}')
+        self.base_patch.start()
+        self.cache = SearchCache(os.path.join(self.tmpdir.name, "cache.sqlite3"))
+        self.pool = HttpPool()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        await self.runner.cleanup()
+        self.base_patch.stop()
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    async def get_storefront(self, request):
+        self.user_tokens.append(request.headers['Music-User-Token'])
+        return web.json_response({'data': [{'id': 'cn'}]})
+
+    async def test_users_share_connections_but_not_tokens(self):
+        alice = AppleMusic("alice", "dev_token", search_cache=self.cache, http_pool=self.pool)
+        bob = AppleMusic("bob", "dev_token", search_cache=self.cache, http_pool=self.pool)
+        self.assertIs(alice.session, bob.session)
+
+        for _ in range(3):
+            await alice.get_user_storefront()
+            await bob.get_user_storefront()
+        await alice.close()
+
+        self.assertEqual(self.user_tokens, ["alice", "bob"] * 3)
+        stats = self.pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 5)
+        self.assertEqual(stats["idle"], 1)
+        # 关闭单个用户不会关闭共享连接池
+        self.assertFalse(bob.session.closed)
+
+    async def test_discards_session_of_stopped_loop(self):
+        url = f"{self.base_patch.new}/v1/me/storefront"
+
+        async def open_connection():
+            async with self.pool.session.get(url, headers={'Music-User-Token': 'alice'}) as r:
+                await r.read()
+            return self.pool.session
+
+        old_loop = asyncio.new_event_loop()
+        try:
+            # 在另一个事件循环中建立一个空闲连接，之后该循环停止但没有关闭
+            old_session = await asyncio.to_thread(old_loop.run_until_complete, open_connection())
+            old_connector = old_session.connector
+            self.assertEqual(self.pool.stats()["idle"], 1)
+
+            self.assertIsNot(self.pool.session, old_session)
+            self.assertTrue(old_session.closed)
+            self.assertTrue(old_connector.closed)
+            self.assertEqual(asyncio.all_tasks(old_loop), set())
+            # 连接的关闭回调在旧循环再次运行时执行
+            await asyncio.to_thread(old_loop.run_until_complete, asyncio.sleep(0))
+        finally:
+            old_loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
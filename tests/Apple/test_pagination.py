@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from aiohttp import web
+from src.Apple.apm import AppleMusic, ApplePlaylist, AppleSong
+from src.Apple.search_cache import SearchCache
+from src.Apple.http_pool import HttpPool
+
+PAGE_SIZE = 100
+
+class TestLibraryPagination(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = 0
+        self.tracks = [
+            {'id': f'i.{i}', 'attributes': {'name': f'Song{i}', 'artistName': 'Artist', 'albumName': 'Album',
+                                             'playParams': {'catalogId': str(i)}}}
+            for i in range(250)
+        ]
+        app = web.Application()
+        app.router.add_get('/v1/me/library/playlists/{id}/tracks', self.get_tracks)
+        app.router.add_post('/v1/me/library/playlists', self.create_playlist)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.base_patch = patch('src.Apple.apm.LIBRARY_API_BASE', f'http://127.0.0.1:{port}')
+        self.base_patch.start()
+        self.apple_music = AppleMusic("user_token", "dev_token",
+                                      search_cache=SearchCache(os.path.join(self.tmpdir.name, "cache.sqlite3")),
+                                      http_pool=HttpPool())
+
+    async def asyncTearDown(self):
+        await self.apple_music.close()
+        await self.apple_music.http_pool.close()
+        await self.runner.cleanup()
+        self.base_patch.stop()
+        self.apple_music.search_cache.close()
+        self.tmpdir.cleanup()
+
+    async def get_tracks(self, request):
+        self.requests += 1
+        offset = int(request.query.get('offset', 0))
+        page = {'data': self.tracks[offset:offset + PAGE_SIZE]}
+        if offset + PAGE_SIZE < len(self.tracks):
+            page['next'] = f"/v1/me/library/playlists/{request.match_info['id']}/tracks?offset={offset + PAGE_SIZE}"
+        return web.json_response(page)
+
+    async def create_playlist(self, request):
+        body = await request.json()
+        return web.json_response({'data': [{'id': 'p.new', 'type': 'library-playlists',
+                                            'attributes': {'name': body['attributes']['name']}}]}, status=201)
+
+    async def test_new_playlist_parses_created_playlist(self):
+        playlist = await self.apple_music.new_playlist('Converted')
+        self.assertEqual((playlist.id, playlist.name), ('p.new', 'Converted'))
+        self.assertIn(playlist, self.apple_music.playlists)
+
+    async def test_get_songs_reads_all_pages(self):
+        playlist = ApplePlaylist(id='p.1', name='Test Playlist', create_time='2023-01-01')
+        songs = await self.apple_music.get_songs(playlist)
+        self.assertEqual(len(songs), 250)
+        self.assertEqual(songs[-1].name, 'Song249')
+        self.assertEqual(self.requests, 3)
+
+    async def test_verify_reports_missing_songs_by_catalog_id(self):
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (1, 249, 999)]
+        with patch.object(self.apple_music, '_submit_tracks', return_value=False) as submit:
+            report = await self.apple_music.verify_playlist_songs('p.1', songs, max_attempts=2, base_delay=0)
+        self.assertTrue(report.checked)
+        self.assertFalse(report.ok)
+        self.assertEqual([song.id for song in report.missing], ['999'])
+        submit.assert_not_called()
+
+    async def test_verify_resubmits_still_missing_songs_only_once(self):
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (1, 999)]
+        with patch.object(self.apple_music, '_submit_tracks', return_value=True) as submit:
+            report = await self.apple_music.verify_playlist_songs('p.1', songs, max_attempts=4, base_delay=0)
+        submit.assert_called_once_with('p.1', [songs[1]])
+        self.assertEqual(report.resubmitted, 1)
+        self.assertEqual(report.attempts, 4)
+        self.assertEqual(report.missing_indices, [1])
+
+    async def test_verify_reports_missing_indices_for_repeated_songs(self):
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (1, 1, 999)]
+        with patch.object(self.apple_music, '_submit_tracks', return_value=False):
+            report = await self.apple_music.verify_playlist_songs('p.1', songs, max_attempts=1, base_delay=0)
+        self.assertEqual(report.missing_indices, [1, 2])
+
+    async def test_verify_ignores_songs_already_in_baseline(self):
+        # 歌曲 1 写入前就已经在播放列表中，追加失败时不应当算作已写入
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (1, 249)]
+        baseline = [str(i) for i in range(249)]
+        with patch.object(self.apple_music, '_submit_tracks', return_value=False):
+            report = await self.apple_music.verify_playlist_songs('p.1', songs, max_attempts=1, base_delay=0,
+                                                                  baseline=baseline)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.missing_indices, [0])
+
+    async def test_write_reports_failed_indices(self):
+        songs = [AppleSong(id='1', name='Song', artist='Artist', album='Album') for _ in range(5)]
+        with patch.object(self.apple_music, '_submit_tracks', side_effect=[True, False, True]):
+            report = await self.apple_music.write_songs('p.1', songs, chunk_size=2, max_chunk_retries=0)
+        self.assertEqual(report.written, 3)
+        self.assertEqual(report.failed_indices, [2, 3])
+
+    async def test_write_does_not_retry_chunk_that_landed(self):
+        # 播放列表 p.1 末尾是目录ID 248、249，模拟服务端已写入却返回失败
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (248, 249)]
+        with patch.object(self.apple_music, '_submit_tracks', return_value=False) as submit:
+            report = await self.apple_music.write_songs('p.1', songs, max_chunk_retries=2)
+        submit.assert_called_once()
+        self.assertEqual((report.written, report.failed), (2, []))
+
+    async def test_write_retries_chunk_missing_from_snapshot_diff(self):
+        songs = [AppleSong(id=str(i), name='Song', artist='Artist', album='Album') for i in (248, 249)]
+        baseline = [str(i) for i in range(250)]  # 这两首写入前就已经在播放列表中
+        with patch.object(self.apple_music, '_submit_tracks', side_effect=[False, True]) as submit, \
+                patch('src.Apple.apm.backoff_delay', return_value=0):
+            report = await self.apple_music.write_songs('p.1', songs, max_chunk_retries=2, baseline=baseline)
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(report.written, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from src.Apple.rate_limiter import AdaptiveRateLimiter, parse_retry_after, backoff_delay
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(10):
+            self.assertLessEqual(backoff_delay(attempt, base=0.5, cap=4), 4)
+
+    async def test_concurrency_limit(self):
+        limiter = AdaptiveRateLimiter(rate=1000, burst=1000, concurrency=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            await limiter.acquire()
+            try:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+            finally:
+                limiter.release()
+
+        await asyncio.gather(*(request() for _ in range(10)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_throttle_decreases_and_success_increases(self):
+        limiter = AdaptiveRateLimiter(rate=20, concurrency=8)
+        limiter.on_throttle()
+        limiter.on_throttle()  # 冷却期内只减小一次
+        self.assertEqual(limiter.stats()["limit"], 4)
+        self.assertEqual(limiter.rate, 10)
+        self.assertEqual(limiter.throttled, 2)
+        for _ in range(8):
+            limiter.on_success()
+        self.assertEqual(limiter.stats()["limit"], 5)
+
+    async def test_retry_after_pauses_requests(self):
+        limiter = AdaptiveRateLimiter(rate=1000, burst=1000)
+        limiter.on_throttle(retry_after=0.05)
+        start = asyncio.get_running_loop().time()
+        await limiter.acquire()
+        limiter.release()
+        self.assertGreaterEqual(asyncio.get_running_loop().time() - start, 0.04)
+
+if __name__ == '__main__':
+    unittest.main()
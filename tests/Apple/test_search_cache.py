@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.Apple.search_cache import SearchCache, normalize_term
+from src.Apple.apm_utils import AppleSong
+
+class TestSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SearchCache(os.path.join(self.tmpdir.name, "cache.sqlite3"), ttl=60, max_entries=2)
+        self.song = AppleSong(id="1", name="Song1", artist="Artist1", album="Album1")
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_normalize_term(self):
+        self.assertEqual(normalize_term("  Ｈｅｌｌｏ   World "), "hello world")
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get("cn", "Song1"))
+        self.cache.put("cn", "Song1", [self.song])
+        self.assertEqual(self.cache.get("cn", " song1 "), [self.song])
+        self.assertIsNone(self.cache.get("us", "Song1"))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_empty_result_is_cached(self):
+        self.cache.put("cn", "nothing", [])
+        self.assertEqual(self.cache.get("cn", "nothing"), [])
+
+    def test_ttl_expiry(self):
+        self.cache.put("cn", "Song1", [self.song])
+        with patch('src.Apple.search_cache.time.time', return_value=10**12):
+            self.assertIsNone(self.cache.get("cn", "Song1"))
+
+    def test_hit_does_not_write(self):
+        self.cache.put("cn", "Song1", [self.song])
+        changes = self.cache._conn.total_changes
+        for _ in range(3):
+            self.assertEqual(self.cache.get("cn", "Song1"), [self.song])
+        self.assertEqual(self.cache._conn.total_changes, changes)
+
+    def test_lru_eviction(self):
+        self.cache.ttl = float("inf")
+        with patch('src.Apple.search_cache.time.time', side_effect=[1, 2, 3, 4]):
+            self.cache.put("cn", "a", [self.song])
+            self.cache.put("cn", "b", [self.song])
+            self.cache.get("cn", "a")
+            self.cache.put("cn", "c", [self.song])
+        self.assertIsNotNone(self.cache.get("cn", "a"))
+        self.assertIsNone(self.cache.get("cn", "b"))
+        self.assertEqual(self.cache.stats()["size"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from src.Apple.singleflight import SingleFlight
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_request(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return ["song"]
+
+        results = await asyncio.gather(*(flight.do(("cn", "term"), fetch) for _ in range(5)))
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.shared, 4)
+        self.assertTrue(all(r == ["song"] for r in results))
+        self.assertEqual(flight.in_flight(), 0)
+
+    async def test_exception_is_shared(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 1
+
+        first = asyncio.create_task(flight.do("k", fetch))
+        second = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 1)
+
+if __name__ == '__main__':
+    unittest.main()
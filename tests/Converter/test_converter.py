@@ -0,0 +1,271 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from src import metrics
+from src.converter import Converter
+from src.match_store import MatchStore, MATCH_SOURCE_MANUAL
+from src.checkpoint_store import CheckpointStore
+from src.Apple.apm_utils import (AppleSong, ApplePlaylist, AppleMusicAPIError, PlaylistWriteReport,
+                                 PlaylistVerifyReport)
+from src.Netease.netease_utils import NeteaseSong, NeteasePlaylist
+
+class FakeAppleMusic:
+    """只实现转换器用到的接口，记录调用次数"""
+
+    def __init__(self):
+        self.storefront = "cn"
+        self.playlists = []
+        self.search_results = {}
+        self.albums = {}
+        self.search_calls = []
+        self.album_calls = []
+        self.library = []  # 资料库中的播放列表
+        self.created = []  # new_playlist 之后才出现在资料库中的播放列表
+        self.create_returns_playlist = True
+        self.failing_playlists = set()  # 写入时抛出异常的播放列表名
+        self.written = {}  # 播放列表ID -> 写入的歌曲ID
+        self.tracks = {}  # 播放列表ID -> 播放列表中的歌曲ID
+        self.write_gate = None  # 不为空时写入前等待它被设置
+
+    async def stupid_search(self, name, artist, album):
+        self.search_calls.append(name)
+        results = self.search_results.get(name, [])
+        if isinstance(results, Exception):
+            raise results
+        return results
+
+    async def get_album_songs(self, album_id):
+        self.album_calls.append(album_id)
+        return self.albums.get(album_id, [])
+
+    async def iter_playlists(self):
+        for playlist in self.library:
+            yield playlist
+
+    async def retrive_playlists(self):
+        self.playlists = list(self.library)
+
+    async def new_playlist(self, name):
+        if self.create_returns_playlist:
+            playlist = ApplePlaylist(id=f"p.{name}", name=name, create_time='')
+            self.library.append(playlist)
+            return playlist
+        # 创建成功但响应中没有播放列表信息
+        self.library.extend(self.created)
+        return None
+
+    async def write_songs(self, playlist_id, songs, replace=False, baseline=None, report=None):
+        if playlist_id[2:] in self.failing_playlists:
+            raise AppleMusicAPIError(503)
+        report = report if report is not None else PlaylistWriteReport()
+        if self.write_gate is not None:
+            await self.write_gate.wait()
+        if not hasattr(songs, '__aiter__'):
+            songs = FakeAppleMusic._aiter(songs)
+        async for song in songs:
+            # 与真实客户端一样，第一首写入成功的歌曲替换原有歌曲
+            if replace and report.written == 0:
+                self.tracks[playlist_id] = []
+            self.tracks.setdefault(playlist_id, []).append(song.id)
+            self.written.setdefault(playlist_id, []).append(song.id)
+            report.written += 1
+        return report
+
+    @staticmethod
+    async def _aiter(songs):
+        for song in songs:
+            yield song
+
+    async def get_playlist_catalog_ids(self, playlist_id):
+        return list(self.tracks.get(playlist_id, []))
+
+    async def verify_playlist_songs(self, playlist_id, songs, baseline=None):
+        return PlaylistVerifyReport(ok=True, checked=True, expected=len(songs), present=len(songs))
+
+class FakeNeteaseMusic:
+    async def get_songs(self, playlist):
+        pass
+
+class TestConverter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)  # Converter 在当前目录写 app.log
+        self.match_store = MatchStore(os.path.join(self.tmpdir.name, "matches.sqlite3"))
+        self.checkpoint_store = CheckpointStore(os.path.join(self.tmpdir.name, "checkpoints.sqlite3"))
+        self.apple_music = FakeAppleMusic()
+        self.converter = Converter(FakeNeteaseMusic(), self.apple_music, match_store=self.match_store,
+                                   checkpoint_store=self.checkpoint_store)
+
+    def tearDown(self):
+        for handler in self.converter.logger.handlers[:]:
+            handler.close()
+            self.converter.logger.removeHandler(handler)
+        self.match_store.close()
+        self.checkpoint_store.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def search(self, songs):
+        async def run():
+            return await asyncio.gather(*self.converter._schedule_searches(songs))
+        return asyncio.run(run())
+
+    def test_concurrent_search_respects_limit_and_keeps_order(self):
+        self.converter.search_concurrency = 3
+        songs = [NeteaseSong(id=i, name=f'Song {i}', artists=[f'Artist {i}'], album=f'Album {i}') for i in range(12)]
+        running = peak = 0
+
+        async def fake_search(song):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            # 越靠前的歌曲越晚完成，结果乱序返回
+            await asyncio.sleep(0.001 * (len(songs) - song.id))
+            running -= 1
+            return True, [AppleSong(id=str(song.id), name=song.name, artist=song.artists[0], album=song.album)]
+
+        with patch.object(self.converter, 'search_song_in_apm', side_effect=fake_search):
+            results = asyncio.run(self.converter._search_all_songs(songs))
+        self.assertEqual(peak, 3)
+        self.assertEqual([i for i, _, _, _ in results], list(range(12)))
+        self.assertEqual([matches[0].id for _, _, _, matches in results], [str(i) for i in range(12)])
+
+    def test_album_siblings_use_album_id_of_stored_leader(self):
+        leader = NeteaseSong(id=1, name='Song A', artists=['Artist'], album='Album', duration=200000)
+        sibling = NeteaseSong(id=2, name='Song B', artists=['Artist'], album='Album', duration=180000)
+        stored = AppleSong(id='a1', name='Song A', artist='Artist', album='Album', duration=200000, album_id='9')
+        self.match_store.put(leader.id, "cn", stored, MATCH_SOURCE_MANUAL)
+        self.apple_music.albums['9'] = [
+            stored,
+            AppleSong(id='a2', name='Song B', artist='Artist', album='Album', duration=180000, album_id='9'),
+        ]
+
+        (leader_ok, leader_matches), (sibling_ok, sibling_matches) = self.search([leader, sibling])
+        self.assertTrue(leader_ok)
+        self.assertEqual(leader_matches[0], stored)
+        self.assertTrue(sibling_ok)
+        self.assertEqual(sibling_matches[0].id, 'a2')
+        self.assertEqual(self.apple_music.album_calls, ['9'])
+        self.assertEqual(self.apple_music.search_calls, [])
+
+    def test_failed_search_does_not_abort_cli_conversion(self):
+        songs = [NeteaseSong(id=1, name='Song A', artists=['Artist A'], album='Album A'),
+                 NeteaseSong(id=2, name='Song B', artists=['Artist B'], album='Album B')]
+        self.apple_music.search_results['Song A'] = AppleMusicAPIError(429)
+        self.apple_music.search_results['Song B'] = [
+            AppleSong(id='b', name='Song B', artist='Artist B', album='Album B')]
+
+        results = asyncio.run(self.converter._search_all_songs(songs))
+        self.assertEqual([(i, success, matches) for i, _, success, matches in results],
+                         [(0, False, None), (1, True, self.apple_music.search_results['Song B'])])
+        song_results, manual = self.converter._process_search_results(results, skip=False)
+        self.assertEqual(song_results, [None, self.apple_music.search_results['Song B'][0]])
+        self.assertEqual(manual, [])
+
+    def test_create_playlist_fallback_skips_existing_playlist_with_same_name(self):
+        self.apple_music.create_returns_playlist = False
+        self.apple_music.library = [ApplePlaylist(id='p.old', name='Mix', create_time='')]
+        self.apple_music.created = [ApplePlaylist(id='p.new', name='Mix', create_time='')]
+        with patch('src.converter.PLAYLIST_POLL_BASE_DELAY', 0):
+            playlist = asyncio.run(self.converter._create_playlist('Mix'))
+        self.assertEqual(playlist.id, 'p.new')
+
+    def test_library_conversion_reports_each_song_once(self):
+        songs = [NeteaseSong(id=i, name=f'Song {i}', artists=[f'Artist {i}'], album=f'Album {i}') for i in range(4)]
+        for i in (0, 2):
+            self.apple_music.search_results[f'Song {i}'] = [
+                AppleSong(id=f'a{i}', name=f'Song {i}', artist=f'Artist {i}', album=f'Album {i}')]
+        # 只有匹配度不足的候选，又没有手动选择回调
+        self.apple_music.search_results['Song 1'] = [
+            AppleSong(id='x', name='Something Else', artist='Nobody', album='Other')]
+        first = NeteasePlaylist(name='First', id=1, creator_id=1, create_time=0, songs=songs[:3])
+        second = NeteasePlaylist(name='Second', id=2, creator_id=1, create_time=0, songs=songs[1:])
+        self.apple_music.failing_playlists.add('Second')
+        completed = []
+
+        async def on_completed(success, skipped, failed):
+            completed.append((success, skipped, failed))
+
+        result = asyncio.run(self.converter.convert_library_web([first, second], completed_callback=on_completed))
+        self.assertEqual((result['total_songs'], result['unique_songs']), (6, 4))
+        self.assertEqual(sorted(self.apple_music.search_calls), ['Song 0', 'Song 1', 'Song 2', 'Song 3'])
+        self.assertEqual(self.apple_music.written, {'p.First': ['a0', 'a2']})
+
+        success, skipped, failed = completed[0]
+        self.assertEqual([entry['originalName'] for entry in success], ['Song 0'])
+        self.assertEqual([entry['name'] for entry in skipped], ['Song 3'])
+        self.assertEqual([(entry['name'], entry['reason']) for entry in failed],
+                         [('Song 1', '匹配度不足，需要手动选择'), ('Song 2', '写入播放列表失败: Second')])
+
+    def test_library_conversion_fails_when_every_write_fails(self):
+        songs = [NeteaseSong(id=i, name=f'Song {i}', artists=[f'Artist {i}'], album=f'Album {i}') for i in range(2)]
+        self.apple_music.search_results['Song 0'] = [
+            AppleSong(id='a0', name='Song 0', artist='Artist 0', album='Album 0')]
+        playlists = [NeteasePlaylist(name='First', id=1, creator_id=1, create_time=0, songs=songs)]
+        self.apple_music.failing_playlists.add('First')
+        completed = []
+
+        async def on_completed(success, skipped, failed):
+            completed.append((success, skipped, failed))
+
+        failed_before = metrics.CONVERSIONS.get(status="failed")
+        result = asyncio.run(self.converter.convert_library_web(playlists, completed_callback=on_completed))
+        self.assertEqual(result, {"error": "写入播放列表失败: First"})
+        self.assertEqual(metrics.CONVERSIONS.get(status="failed"), failed_before + 1)
+        success, skipped, failed = completed[0]
+        self.assertEqual((success, [entry['name'] for entry in skipped]), ([], ['Song 1']))
+        self.assertEqual([(entry['name'], entry['reason']) for entry in failed], [('Song 0', '写入播放列表失败: First')])
+
+    def convert_with_interruption(self, block_writes):
+        """覆盖转换到第 4 首歌曲时取消，再以追加模式请求继续，返回中断后的断点"""
+        songs = [NeteaseSong(id=i, name=f'Song {i}', artists=[f'Artist {i}'], album=f'Album {i}') for i in range(6)]
+        for song in songs:
+            self.apple_music.search_results[song.name] = [
+                AppleSong(id=f'a{song.id}', name=song.name, artist=song.artists[0], album=song.album)]
+        self.apple_music.library = [ApplePlaylist(id='p.target', name='Target', create_time='')]
+        self.apple_music.tracks['p.target'] = ['old1', 'old2']
+        source = NeteasePlaylist(name='Source', id=1, creator_id=1, create_time=0, songs=songs)
+
+        async def interrupted():
+            async def progress(p, current_song, result=None):
+                if current_song['name'] == 'Song 3':
+                    await asyncio.sleep(0.01)  # 让写入任务写完已匹配的歌曲
+                    task.cancel()
+                    await asyncio.sleep(0)
+
+            if block_writes:
+                self.apple_music.write_gate = asyncio.Event()
+            task = asyncio.create_task(self.converter.convert_play_list_web(
+                source, progress_callback=progress, target_playlist_id='p.target', mode="override",
+                checkpoint_key="1:1"))
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.apple_music.write_gate = None
+
+        async def noop(*args):
+            pass
+
+        asyncio.run(interrupted())
+        checkpoint = self.checkpoint_store.load("1:1")
+        result = asyncio.run(self.converter.convert_play_list_web(
+            source, completed_callback=noop, mode="append", checkpoint_key="1:1", resume=True))
+        self.assertEqual(result['status'], 'success')
+        # 原有歌曲被替换，已处理的歌曲既不重复也不丢失
+        self.assertEqual(self.apple_music.tracks['p.target'], [f'a{i}' for i in range(6)])
+        self.assertIsNone(self.checkpoint_store.load("1:1"))
+        return checkpoint
+
+    def test_resume_replaces_playlist_when_interrupted_before_first_write(self):
+        checkpoint = self.convert_with_interruption(block_writes=True)
+        self.assertEqual((checkpoint.mode, checkpoint.replace_done, checkpoint.processed), ("override", False, 3))
+
+    def test_resume_appends_after_replacing_write(self):
+        checkpoint = self.convert_with_interruption(block_writes=False)
+        self.assertEqual((checkpoint.mode, checkpoint.replace_done, checkpoint.processed), ("override", True, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import asyncio
+import unittest
+from src import jobs, tracing
+
+class TestJobManager(unittest.IsolatedAsyncioTestCase):
+
+    async def test_runs_jobs_with_concurrency_cap(self):
+        manager = jobs.JobManager(max_concurrency=2)
+        running = peak = 0
+
+        async def work(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return job.description
+
+        submitted = [manager.submit(work, kind="test", owner="s", description=str(i)) for i in range(5)]
+        self.assertEqual(manager.stats()["queued"], 3)
+        while manager.active("s"):
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(peak, 2)
+        self.assertEqual([job.result for job in submitted], ["0", "1", "2", "3", "4"])
+        self.assertTrue(all(job.status == jobs.JOB_SUCCEEDED for job in submitted))
+
+    async def test_cancel_running_and_queued_jobs(self):
+        manager = jobs.JobManager(max_concurrency=1)
+        started = asyncio.Event()
+        finished = []
+
+        async def work(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        async def on_finished(job):
+            finished.append((job.id, job.status))
+
+        running = manager.submit(work, kind="test", owner="s", on_finished=on_finished)
+        queued = manager.submit(work, kind="test", owner="s", on_finished=on_finished)
+        await started.wait()
+
+        await manager.cancel(queued.id)
+        self.assertEqual(queued.status, jobs.JOB_CANCELLED)
+        self.assertIsNone(queued._task)
+
+        await manager.cancel(running.id)
+        self.assertEqual(running.status, jobs.JOB_CANCELLED)
+        self.assertEqual(finished, [(queued.id, jobs.JOB_CANCELLED), (running.id, jobs.JOB_CANCELLED)])
+        self.assertEqual(manager.stats()["running"], 0)
+
+    async def test_cancel_immediately_after_submit(self):
+        manager = jobs.JobManager(max_concurrency=1)
+        finished = []
+
+        async def work(job):
+            return "done"
+
+        async def on_finished(job):
+            finished.append(job.status)
+
+        first = manager.submit(work, kind="test", owner="s", on_finished=on_finished)
+        await manager.cancel(first.id)
+        self.assertEqual(first.status, jobs.JOB_CANCELLED)
+        self.assertEqual(finished, [jobs.JOB_CANCELLED])
+        self.assertEqual(manager.stats()["running"], 0)
+
+        second = manager.submit(work, kind="test", owner="s")
+        await second._task
+        self.assertEqual((second.status, second.result), (jobs.JOB_SUCCEEDED, "done"))
+
+    async def test_waiting_for_input_releases_slot(self):
+        manager = jobs.JobManager(max_concurrency=1)
+        selection = asyncio.Queue()
+        order = []
+
+        async def interactive(job):
+            order.append("interactive waiting")
+            async with jobs.waiting_for_input():
+                choice = await selection.get()
+            order.append(f"interactive got {choice}")
+            return choice
+
+        async def batch(job):
+            order.append("batch")
+            return "batch"
+
+        first = manager.submit(interactive, kind="test", owner="a")
+        second = manager.submit(batch, kind="test", owner="b")
+        while not second.finished:
+            await asyncio.sleep(0.001)
+        self.assertEqual(second.status, jobs.JOB_SUCCEEDED)
+        self.assertEqual(manager.stats()["waiting_for_input"], 1)
+        self.assertEqual(manager.stats()["running"], 0)
+
+        await selection.put("song")
+        await first._task
+        self.assertEqual(order, ["interactive waiting", "batch", "interactive got song"])
+        self.assertEqual(first.result, "song")
+        self.assertEqual(manager.stats()["running"], 0)
+
+    async def test_resumed_job_waits_for_a_slot(self):
+        manager = jobs.JobManager(max_concurrency=1)
+        selection = asyncio.Queue()
+        release_batch = asyncio.Event()
+
+        async def interactive(job):
+            async with jobs.waiting_for_input():
+                await selection.get()
+            return manager.stats()["running"]
+
+        async def batch(job):
+            await release_batch.wait()
+
+        first = manager.submit(interactive, kind="test", owner="a")
+        second = manager.submit(batch, kind="test", owner="b")
+        await asyncio.sleep(0)
+        await selection.put("song")
+        await asyncio.sleep(0.01)
+        self.assertFalse(first.finished)
+
+        release_batch.set()
+        await first._task
+        self.assertEqual(first.result, 1)
+        self.assertEqual(manager.stats()["running"], 0)
+
+    async def test_cancel_while_waiting_for_input(self):
+        manager = jobs.JobManager(max_concurrency=1)
+        waiting = asyncio.Event()
+
+        async def interactive(job):
+            async with jobs.waiting_for_input():
+                waiting.set()
+                await asyncio.sleep(60)
+
+        job = manager.submit(interactive, kind="test", owner="a")
+        await waiting.wait()
+        await manager.cancel(job.id)
+        self.assertEqual(job.status, jobs.JOB_CANCELLED)
+        self.assertEqual(manager.stats()["running"], 0)
+
+    async def test_failed_job_records_error(self):
+        manager = jobs.JobManager()
+
+        async def work(job):
+            job.progress = 40
+            raise RuntimeError("没有找到任何匹配的歌曲")
+
+        job = manager.submit(work, kind="test", owner="s")
+        await job._task
+        self.assertEqual((job.status, job.error, job.progress), (jobs.JOB_FAILED, "没有找到任何匹配的歌曲", 40))
+
+    async def test_each_job_keeps_its_own_trace(self):
+        manager = jobs.JobManager()
+
+        async def work(job):
+            with tracing.activate(job.tracer), tracing.span("work", job=job.description):
+                await asyncio.sleep(0)
+
+        first = manager.submit(work, kind="test", owner="s", description="1", tracer=tracing.Tracer("1"))
+        second = manager.submit(work, kind="test", owner="s", description="2", tracer=tracing.Tracer("2"))
+        untraced = manager.submit(work, kind="test", owner="s", description="3")
+        while manager.active("s"):
+            await asyncio.sleep(0.01)
+
+        self.assertEqual([e["args"]["job"] for e in first.tracer.events], ["1"])
+        self.assertEqual([e["args"]["job"] for e in second.tracer.events], ["2"])
+        self.assertEqual([job.to_dict()["has_trace"] for job in (first, second, untraced)], [True, True, False])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.match_store import MatchStore, MATCH_SOURCE_AUTO, MATCH_SOURCE_MANUAL
+from src.Apple.apm_utils import AppleSong
+
+class TestMatchStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = MatchStore(os.path.join(self.tmpdir.name, "matches.sqlite3"))
+        self.song = AppleSong(id="100", name="Song", artist="Artist", album="Album")
+        self.other = AppleSong(id="200", name="Other", artist="Artist", album="Album")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        self.assertIsNone(self.store.get(1, "cn"))
+        self.assertTrue(self.store.put(1, "cn", self.song, MATCH_SOURCE_AUTO, 0.9))
+        record = self.store.get(1, "cn")
+        self.assertEqual(record.song, self.song)
+        self.assertEqual(record.source, MATCH_SOURCE_AUTO)
+        self.assertAlmostEqual(record.confidence, 0.9)
+        self.assertIsNone(self.store.get(1, "us"))
+
+    def test_auto_does_not_overwrite_manual(self):
+        self.store.put(1, "cn", self.song, MATCH_SOURCE_MANUAL)
+        self.assertFalse(self.store.put(1, "cn", self.other, MATCH_SOURCE_AUTO, 0.99))
+        record = self.store.get(1, "cn")
+        self.assertEqual(record.song.id, "100")
+        self.assertEqual(record.source, MATCH_SOURCE_MANUAL)
+        self.assertEqual(record.confidence, 1.0)
+
+    def test_manual_overwrites_auto_and_manual(self):
+        self.store.put(1, "cn", self.song, MATCH_SOURCE_AUTO, 0.8)
+        self.assertTrue(self.store.put(1, "cn", self.other, MATCH_SOURCE_MANUAL))
+        self.assertEqual(self.store.get(1, "cn").song.id, "200")
+        self.assertTrue(self.store.put(1, "cn", self.song, MATCH_SOURCE_MANUAL))
+        self.assertEqual(self.store.get(1, "cn").song.id, "100")
+
+    def test_auto_overwrites_auto_and_delete(self):
+        self.store.put(1, "cn", self.song, MATCH_SOURCE_AUTO, 0.8)
+        self.store.put(1, "cn", self.other, MATCH_SOURCE_AUTO, 0.95)
+        record = self.store.get(1, "cn")
+        self.assertEqual(record.song.id, "200")
+        self.assertAlmostEqual(record.confidence, 0.95)
+        self.store.delete(1, "cn")
+        self.assertIsNone(self.store.get(1, "cn"))
+
+    def test_album_id_and_duration_round_trip(self):
+        song = AppleSong(id="100", name="Song", artist="Artist", album="Album", duration=215000, album_id="9")
+        self.store.put(1, "cn", song)
+        self.assertEqual(self.store.get(1, "cn").song, song)
+
+    def test_migrates_old_schema(self):
+        path = os.path.join(self.tmpdir.name, "old.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE song_matches (netease_id INTEGER NOT NULL, storefront TEXT NOT NULL, "
+                     "apple_id TEXT NOT NULL, name TEXT NOT NULL, artist TEXT NOT NULL, album TEXT NOT NULL, "
+                     "source TEXT NOT NULL, confidence REAL NOT NULL, updated_at REAL NOT NULL, "
+                     "PRIMARY KEY (netease_id, storefront))")
+        conn.execute("INSERT INTO song_matches VALUES (1, 'cn', '100', 'Song', 'Artist', 'Album', 'manual', 1.0, 0)")
+        conn.commit()
+        conn.close()
+
+        store = MatchStore(path)
+        try:
+            self.assertEqual(store.get(1, "cn").song, self.song)
+            song = AppleSong(id="200", name="Other", artist="Artist", album="Album", duration=1000, album_id="9")
+            store.put(2, "cn", song)
+            self.assertEqual(store.get(2, "cn").song, song)
+        finally:
+            store.close()
+
+    def test_persists_across_instances(self):
+        self.store.put(1, "cn", self.song, MATCH_SOURCE_MANUAL)
+        self.store.close()
+        self.store = MatchStore(os.path.join(self.tmpdir.name, "matches.sqlite3"))
+        self.assertEqual(self.store.get(1, "cn").song, self.song)
+
+if __name__ == '__main__':
+    unittest.main()
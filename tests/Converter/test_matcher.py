@@ -0,0 +1,67 @@
+import unittest
+from src.matcher import SongMatcher, normalize_title, normalize_artists
+from src.Apple.apm_utils import AppleSong
+from src.Netease.netease_utils import NeteaseSong
+
+class TestSongMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = SongMatcher()
+        self.song = NeteaseSong(id=1, name='Shape of You', artists=['Ed Sheeran'], album='÷ (Deluxe)')
+
+    def test_normalize_title(self):
+        normalized = normalize_title('ＳＨＡＰＥ ＯＦ ＹＯＵ (Live)')
+        self.assertEqual(normalized.core, 'shapeofyou')
+        self.assertEqual(normalized.tags, frozenset({'live'}))
+        self.assertEqual(normalize_title('Song (feat. Someone)').tags, frozenset())
+        self.assertEqual(normalize_title('晴天').tokens, frozenset({'晴', '天'}))
+
+    def test_normalize_artists(self):
+        self.assertEqual(normalize_artists('A, B & C').tokens, normalize_artists('C feat. B & A').tokens)
+
+    def test_exact_match_is_accepted_first(self):
+        candidates = [
+            AppleSong(id='2', name='Shape of You (Live)', artist='Ed Sheeran', album='Live'),
+            AppleSong(id='1', name='Shape Of You', artist='Ed Sheeran', album='÷ (Deluxe)'),
+        ]
+        accepted, ranked = self.matcher.classify(self.matcher.score(self.song, candidates))
+        self.assertTrue(accepted)
+        self.assertEqual([c.song.id for c in ranked], ['1'])
+
+    def test_featured_artist_and_width_variation(self):
+        candidates = [AppleSong(id='1', name='Ｓｈａｐｅ ｏｆ Ｙｏｕ', artist='Ed Sheeran & Stormzy', album='÷')]
+        accepted, _ = self.matcher.classify(self.matcher.score(self.song, candidates))
+        self.assertTrue(accepted)
+
+    def test_low_scoring_candidates_are_dropped_when_others_qualify(self):
+        candidates = [
+            AppleSong(id='1', name='Something Else', artist='Nobody', album='Other'),
+            AppleSong(id='2', name='Shape of You (Live)', artist='Ed Sheeran', album='Live'),
+        ]
+        accepted, ranked = self.matcher.classify(self.matcher.score(self.song, candidates))
+        self.assertFalse(accepted)
+        self.assertEqual([c.song.id for c in ranked], ['2'])
+
+    def test_cross_language_candidates_fall_back_to_review(self):
+        song = NeteaseSong(id=2, name='晴天', artists=['周杰伦'], album='叶惠美')
+        candidates = [AppleSong(id=str(i), name='Qing Tian', artist='Jay Chou', album='Ye Hui Mei')
+                      for i in range(8)]
+        accepted, ranked = self.matcher.classify(self.matcher.score(song, candidates))
+        self.assertFalse(accepted)
+        self.assertEqual(len(ranked), self.matcher.review_fallback)
+
+    def test_duration_within_tolerance_is_accepted(self):
+        song = NeteaseSong(id=2, name='晴天', artists=['周杰伦'], album='叶惠美', duration=269000)
+        candidates = [AppleSong(id='1', name='晴天', artist='Jay Chou', album='叶惠美', duration=269500)]
+        accepted, ranked = self.matcher.classify(self.matcher.score(song, candidates))
+        self.assertTrue(accepted)
+        self.assertEqual(ranked[0].duration_diff, 500)
+
+    def test_duration_mismatch_is_rejected(self):
+        song = NeteaseSong(id=1, name='Shape of You', artists=['Ed Sheeran'], album='÷', duration=233000)
+        candidates = [AppleSong(id='1', name='Shape of You', artist='Ed Sheeran', album='Live Session', duration=320000)]
+        accepted, _ = self.matcher.classify(self.matcher.score(song, candidates))
+        self.assertFalse(accepted)
+
+if __name__ == '__main__':
+    unittest.main()
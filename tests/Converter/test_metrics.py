@@ -0,0 +1,40 @@
+import unittest
+from src.metrics import Registry, Counter, Gauge, Histogram, endpoint_of
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_render_prometheus_text(self):
+        counter = Counter("songs_total", "songs", ["result"], registry=self.registry)
+        gauge = Gauge("sessions", "sessions", registry=self.registry)
+        histogram = Histogram("latency_seconds", "latency", ["service"], buckets=(0.1, 1.0), registry=self.registry)
+        counter.inc(result="auto")
+        counter.inc(2, result="auto")
+        gauge.set_function(lambda: 3)
+        histogram.observe(0.1, service="apple")
+        histogram.observe(5, service="apple")
+
+        text = self.registry.render()
+        self.assertIn('# TYPE songs_total counter\nsongs_total{result="auto"} 3.0\n', text)
+        self.assertIn('sessions 3.0\n', text)
+        self.assertIn('latency_seconds_bucket{service="apple",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{service="apple",le="1.0"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{service="apple",le="+Inf"} 2\n', text)
+        self.assertIn('latency_seconds_count{service="apple"} 2\n', text)
+
+    def test_labels_must_match(self):
+        counter = Counter("songs_total", "songs", ["result"], registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.inc(status="auto")
+
+    def test_endpoint_of_replaces_ids(self):
+        self.assertEqual(endpoint_of('/v1/catalog/cn/albums/1440857781/tracks'),
+                         '/v1/catalog/{storefront}/albums/{id}/tracks')
+        self.assertEqual(endpoint_of('/v1/me/library/playlists/p.AbCdEf/tracks?offset=100'),
+                         '/v1/me/library/playlists/{id}/tracks')
+        self.assertEqual(endpoint_of('/v1/me/storefront'), '/v1/me/storefront')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import asyncio
+import unittest
+from src import tracing
+
+class TestTracing(unittest.IsolatedAsyncioTestCase):
+
+    async def test_disabled_span_records_nothing(self):
+        with tracing.span("search", song="a") as span:
+            span.set(status=200)
+        self.assertIs(span, tracing._NULL_SPAN)
+
+    async def test_spans_follow_tasks(self):
+        tracer = tracing.Tracer("test")
+
+        async def search(i):
+            with tracing.span("search", index=i):
+                await asyncio.sleep(0)
+
+        with tracing.activate(tracer):
+            with tracing.span("convert"):
+                await asyncio.gather(asyncio.create_task(search(0), name="search-0"),
+                                     asyncio.create_task(search(1), name="search-1"))
+        # 退出 activate 后不再记录
+        with tracing.span("after"):
+            pass
+
+        trace = json.loads(json.dumps(tracer.to_chrome_trace()))
+        spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(sorted(e["name"] for e in spans), ["convert", "search", "search"])
+        self.assertEqual(len({e["tid"] for e in spans}), 3)
+        thread_names = {e["args"]["name"] for e in trace["traceEvents"] if e["name"] == "thread_name"}
+        self.assertTrue({"search-0", "search-1"} <= thread_names)
+
+    async def test_span_records_error(self):
+        tracer = tracing.Tracer()
+        with tracing.activate(tracer):
+            with self.assertRaises(ValueError):
+                with tracing.span("write"):
+                    raise ValueError()
+        self.assertEqual(tracer.events[0]["args"]["error"], "ValueError")
+
+if __name__ == '__main__':
+    unittest.main()
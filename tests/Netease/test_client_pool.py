@@ -0,0 +1,80 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock
+from src.Netease import NeteaseMusic, NeteaseClientPool
+from src.Netease.library_store import LibraryStore
+
+
+class FakeSession:
+    """只有 Cookie 的 pyncm 会话"""
+
+    def __init__(self):
+        self.cookies = {}
+
+    async def aclose(self):
+        pass
+
+
+class TestClientPool(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.Netease.apis.user.GetUserPlaylists', new_callable=AsyncMock)
+    @patch('src.Netease.login.LoginViaCookie', new_callable=AsyncMock)
+    @patch('src.Netease.login.GetCurrentLoginStatus', new_callable=AsyncMock)
+    @patch('src.Netease.client_pool.CreateNewSession')
+    async def test_users_get_isolated_sessions(self, mock_create_session, mock_status, mock_login_via_cookie,
+                                               mock_playlists):
+        global_session = FakeSession()
+        mock_create_session.side_effect = FakeSession
+        # 与 pyncm 一样，LoginViaCookie 把 Cookie 写入全局会话
+        mock_login_via_cookie.side_effect = lambda MUSIC_U="", **kwargs: global_session.cookies.update(
+            {"MUSIC_U": MUSIC_U, **kwargs})
+        # 登录状态由请求所用会话的 Cookie 决定
+        mock_status.side_effect = lambda session: {
+            'code': 200, 'profile': {'userId': session.cookies['MUSIC_U'], 'nickname': session.cookies['MUSIC_U']}}
+        mock_playlists.return_value = {'playlist': []}
+        pool = NeteaseClientPool()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = LibraryStore(os.path.join(tmpdir, "library.sqlite3"))
+            alice = NeteaseMusic(client_pool=pool, library_store=store)
+            bob = NeteaseMusic(client_pool=pool, library_store=store)
+
+            with patch('builtins.open'):
+                await asyncio.gather(alice.login("alice"), bob.login("bob"))
+
+            self.assertIsNot(alice.session, bob.session)
+            self.assertEqual((alice.uid, bob.uid), ("alice", "bob"))
+            self.assertEqual(alice.session.cookies, {"MUSIC_U": "alice"})
+            self.assertEqual(bob.session.cookies, {"MUSIC_U": "bob"})
+            self.assertTrue(alice.session.login_info["success"])
+            self.assertEqual(global_session.cookies, {})
+            self.assertFalse(hasattr(global_session, "login_info"))
+            self.assertEqual(pool.stats()["sessions"], 2)
+
+            await alice.close()
+            await bob.close()
+            store.close()
+        self.assertEqual(pool.stats()["sessions"], 0)
+
+    async def test_limits_concurrent_requests(self):
+        pool = NeteaseClientPool(max_concurrency=2)
+        ncm = NeteaseMusic(client_pool=pool)
+        running = peak = 0
+
+        async def request(session):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {'code': 200}
+
+        await asyncio.gather(*(ncm._call_api("track_detail", request) for _ in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(pool.in_flight, 0)
+        await ncm.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
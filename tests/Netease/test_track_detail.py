@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock
+from src.Netease import NeteaseMusic, NeteasePlaylist
+from src.Netease import netease as netease_module
+from src.Netease.library_store import LibraryStore
+
+def make_track(track_id):
+    return {'id': track_id, 'name': f'Song{track_id}', 'ar': [{'name': 'Artist'}], 'al': {'name': 'Album'}, 'dt': 1000}
+
+def make_playlist_info(playlist_id, update_time, track_count, user_id=12345):
+    return {'name': f'Playlist{playlist_id}', 'id': playlist_id, 'userId': user_id, 'createTime': 1609459200000,
+            'updateTime': update_time, 'trackCount': track_count}
+
+class TestTrackDetail(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = LibraryStore(os.path.join(self.tmpdir.name, "library.sqlite3"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    @patch.object(netease_module, 'TRACK_DETAIL_BATCH_SIZE', 2)
+    @patch('src.Netease.apis.track.GetTrackDetail', new_callable=AsyncMock)
+    @patch('src.Netease.apis.playlist.GetPlaylistInfo', new_callable=AsyncMock)
+    async def test_get_songs_uses_track_ids(self, mock_info, mock_detail):
+        mock_info.return_value = {
+            'playlist': {
+                'trackIds': [{'id': i} for i in range(1, 7)],
+                'tracks': [make_track(1), make_track(2)]
+            }
+        }
+        # 第 5 首没有详情 (例如已下架)
+        mock_detail.side_effect = lambda ids, session=None: {'songs': [make_track(i) for i in reversed(ids) if i != 5]}
+
+        playlist = NeteasePlaylist(name='Playlist1', id=1, creator_id=12345, create_time=1609459200000)
+        await NeteaseMusic(library_store=self.store).get_songs(playlist)
+
+        self.assertEqual([song.id for song in playlist.songs], [1, 2, 3, 4, 6])
+        self.assertEqual(playlist.songs[0].duration, 1000)
+        self.assertEqual(mock_detail.await_count, 2)
+
+    @patch('src.Netease.apis.playlist.GetPlaylistInfo', new_callable=AsyncMock)
+    @patch('src.Netease.apis.user.GetUserPlaylists', new_callable=AsyncMock)
+    async def test_refresh_uses_snapshot_for_unchanged_playlists(self, mock_playlists, mock_info):
+        mock_playlists.return_value = {'playlist': [make_playlist_info(1, 100, 2), make_playlist_info(2, 100, 1, user_id=1)]}
+        mock_info.side_effect = lambda playlist_id, session=None: {
+            'playlist': {'trackIds': [{'id': 10}, {'id': 11}], 'tracks': [make_track(10), make_track(11)]}
+        }
+
+        ncm = NeteaseMusic(library_store=self.store)
+        ncm.uid = 12345
+        await ncm.retrive_playlists()
+        await ncm.get_songs(ncm.created_playlists[0])
+        # 重复刷新不会追加重复的歌单
+        await ncm.retrive_playlists()
+        self.assertEqual([p.id for p in ncm.created_playlists], [1])
+        self.assertEqual([p.id for p in ncm.subscribed_playlists], [2])
+        self.assertTrue(ncm.created_playlists[0].songs_loaded)
+
+        # 新会话中未变化的歌单直接使用快照，变化的歌单重新获取
+        mock_playlists.return_value = {'playlist': [make_playlist_info(1, 100, 2), make_playlist_info(2, 200, 2, user_id=1)]}
+        mock_info.reset_mock()
+        other = NeteaseMusic(library_store=self.store)
+        other.uid = 12345
+        await other.retrive_playlists()
+        await other.get_songs(other.created_playlists[0])
+        await other.get_songs(other.subscribed_playlists[0])
+        self.assertEqual([song.id for song in other.created_playlists[0].songs], [10, 11])
+        mock_info.assert_awaited_once_with(2, session=other.session)
+
+if __name__ == '__main__':
+    unittest.main()